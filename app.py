@@ -1,18 +1,75 @@
 ﻿import streamlit as st
 import pandas as pd
+import csv
 import json
+import hashlib
 import os
 import re
 import math
 import requests
+import subprocess
+import sys
+import tempfile
 import time
 import threading
 import uuid
+import weakref
 import plotly.express as px
 import plotly.io as pio
 from passlib.hash import pbkdf2_sha256
+from collections import OrderedDict
 from datetime import datetime, UTC
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from audit_writer import get_audit_writer
+from sync_job_store import SYNC_JOB_STORE
+
+from beacon_sync import (
+    SyncCancelledError,
+    backfill_funder_columns,
+    build_beacon_url,
+    build_organisation_name_lookup,
+    clean_ts,
+    coerce_money,
+    extract_entity,
+    extract_funder_name,
+    extract_linked_id,
+    extract_page_progress,
+    extract_region_tags,
+    extract_result_list,
+    extract_total_count,
+    fetch_beacon_entities,
+    funder_columns,
+    get_row_value,
+    norm_key,
+    refresh_funder_income_rollups,
+    run_beacon_sync,
+    upsert_in_batches,
+    upsert_org_names,
+)
+from kpi_state import (
+    BID_STAGE_TOKENS,
+    KPI_CUBE_TABLE,
+    KPI_REGIONS,
+    SHARED_REGION,
+    build_event_attendee_records,
+    compute_kpis as _compute_kpi_figures,
+    extract_linked_event_ids,
+    extract_participant_refs,
+    kpi_summary,
+    load_event_joins,
+    normalize_gender,
+    refresh_kpi_state,
+    rows_to_payloads,
+)
+from beacon_utils import (
+    CompactRecord,
+    CoordinateFinder,
+    LinkedIdCollector,
+    PostcodeFinder,
+    RecordSchema,
+    entity_ref_key,
+    walk_payload,
+)
 
 # --- SUPABASE SETUP ---
 from supabase import create_client, Client
@@ -433,12 +490,8 @@ def get_db_connection():
 
 DB_TYPE, DB_CLIENT = get_db_connection()
 SYNC_EXECUTOR = ThreadPoolExecutor(max_workers=1)
-SYNC_JOBS = {}
-SYNC_JOBS_LOCK = threading.Lock()
+SYNC_PROGRESS_REFRESH_SECONDS = 1
 APP_ROLE_NAMES = ["Admin", "Manager", "RPL", "ML", "Funder"]
-
-class SyncCancelledError(Exception):
-    pass
 
 def get_admin_client():
     if "supabase" not in st.secrets:
@@ -472,16 +525,24 @@ def _get_openrouteservice_api_key():
     return ""
 
 # --- AUDIT LOGGING HELPER ---
-def log_audit_event(action, details=None):
-    """Utility to record administrative actions to the audit log."""
+def log_audit_event(action, details=None, flush=False):
+    """Utility to record administrative actions to the audit log.
+
+    Rows are buffered and inserted in batches by a background writer; pass
+    flush=True when the row is read back straight away.
+    """
     if DB_TYPE == 'supabase':
         try:
-            DB_CLIENT.table("audit_logs").insert({
-                "user_email": st.session_state.get("email", "System"),
-                "action": action,
-                "details": details or {},
-                "region": st.session_state.get("region", "Global")
-            }).execute()
+            # The writer is shared by every session, so it gets its own client:
+            # DB_CLIENT carries whichever user signed in last.
+            writer = get_audit_writer("app", get_admin_client)
+            if writer:
+                writer.write({
+                    "user_email": st.session_state.get("email", "System"),
+                    "action": action,
+                    "details": details or {},
+                    "region": st.session_state.get("region", "Global")
+                }, flush=flush)
         except Exception as e:
             # We print instead of st.error to avoid UI clutter on background ops
             print(f"Audit Log Error: {e}")
@@ -598,12 +659,6 @@ def audit_user_interactions(current_view=None):
     )
 
 # --- DATA HELPERS ---
-def _clean_ts(value):
-    if value is None:
-        return None
-    s = str(value).strip()
-    return s if s else None
-
 def _to_list(value):
     if value is None:
         return []
@@ -619,46 +674,6 @@ def _to_list(value):
         return []
     parts = [p.strip() for p in s.split(",") if p.strip()]
     return parts if parts else [s]
-
-def _sanitize(obj):
-    if isinstance(obj, dict):
-        return {k: _sanitize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_sanitize(v) for v in obj]
-    try:
-        if pd.isna(obj):
-            return None
-    except Exception:
-        pass
-    return obj
-
-def _coerce_money(value):
-    if value is None:
-        return 0.0
-    if isinstance(value, (int, float)):
-        return float(value)
-    if isinstance(value, dict):
-        for key in ("value", "amount", "total", "gross", "net"):
-            if key in value:
-                coerced = _coerce_money(value.get(key))
-                if coerced != 0.0:
-                    return coerced
-        for nested in value.values():
-            coerced = _coerce_money(nested)
-            if coerced != 0.0:
-                return coerced
-        return 0.0
-    if isinstance(value, (list, tuple, set)):
-        for item in value:
-            coerced = _coerce_money(item)
-            if coerced != 0.0:
-                return coerced
-        return 0.0
-    s = str(value).replace("£", "").replace(",", "").strip()
-    try:
-        return float(s)
-    except Exception:
-        return 0.0
 
 def _coerce_int(value):
     if value is None:
@@ -724,18 +739,99 @@ def _format_display_date(value):
     except Exception:
         return None
 
+_PLAIN_SCALAR_TYPES = (int, float, bool)
+_DISPLAY_DATE_PREFIX = r"^\d{4}-\d{2}-\d{2}"
+
+def _format_text_cells(values):
+    out = values.copy()
+    stripped = values.str.strip()
+    date_like = stripped.str.match(_DISPLAY_DATE_PREFIX).fillna(False).astype(bool)
+    if not date_like.any():
+        return out
+    candidates = stripped[date_like]
+    try:
+        formatted = pd.to_datetime(candidates, errors="coerce", format="ISO8601").dt.strftime("%d/%m/%Y")
+    except Exception:
+        # Mixed UTC offsets can't share one datetime dtype; parse those one by one.
+        formatted = candidates.map(_format_display_date)
+    else:
+        # Cells ISO8601 rejects (e.g. "2024-01-02 10:00 BST") get the lenient
+        # per-value parse they always had.
+        missed = formatted.isna()
+        if missed.any():
+            formatted[missed] = candidates[missed].map(_format_display_date)
+    formatted = formatted.dropna()
+    out[formatted.index] = formatted
+    return out
+
+def _format_object_column(series):
+    # Group cells by type once and convert each group in a single pass; only
+    # cells that aren't plain text/numbers go through _format_dataframe_cell.
+    values = pd.Series(series.to_numpy(dtype=object), dtype=object)
+    present = ~values.isna()
+    kinds = values.map(type)
+    is_text = present & (kinds == str)
+    is_plain = present & kinds.isin(_PLAIN_SCALAR_TYPES)
+    rest = present & ~is_text & ~is_plain
+    out = pd.Series("", index=values.index, dtype=object)
+    if is_text.any():
+        out[is_text] = _format_text_cells(values[is_text])
+    if is_plain.any():
+        out[is_plain] = values[is_plain].map(str)
+    if rest.any():
+        out[rest] = values[rest].map(_format_dataframe_cell)
+    return pd.Series(out.to_numpy(), index=series.index, name=series.name, dtype=object)
+
+# Converted views keyed by the source frame's identity, shape and columns.
+# Frames served from the shared dashboard store are read-only, so a rerun that
+# renders the same frame again reuses the converted view. Held in
+# st.cache_resource because module globals are rebuilt on every rerun.
+DF_VIEW_CACHE_MAX = 32
+
+@st.cache_resource(show_spinner=False)
+def _df_view_cache():
+    return {"views": OrderedDict(), "lock": threading.Lock()}
+
+def _cached_df_view(kind, df, build):
+    cache = _df_view_cache()
+    key = (kind, id(df), df.shape, tuple(str(c) for c in df.columns))
+    with cache["lock"]:
+        hit = cache["views"].get(key)
+        if hit is not None and hit[0]() is df:
+            cache["views"].move_to_end(key)
+            return hit[1]
+    view = build(df)
+    try:
+        ref = weakref.ref(df)
+    except TypeError:
+        return view
+    with cache["lock"]:
+        for dead in [k for k, (r, _) in cache["views"].items() if r() is None]:
+            del cache["views"][dead]
+        cache["views"][key] = (ref, view)
+        while len(cache["views"]) > DF_VIEW_CACHE_MAX:
+            cache["views"].popitem(last=False)
+    return view
+
+def _build_arrow_compatible_df(df):
+    safe_df = df.copy()
+    for idx, dtype in enumerate(safe_df.dtypes):
+        if pd.api.types.is_object_dtype(dtype):
+            safe_df.isetitem(idx, _format_object_column(safe_df.iloc[:, idx]))
+    return safe_df
+
 def _make_arrow_compatible_df(df):
     if df is None:
         return df
-    safe_df = df.copy()
-    for col in safe_df.columns:
-        if not pd.api.types.is_object_dtype(safe_df[col]):
-            continue
-        safe_df[col] = safe_df[col].map(_format_dataframe_cell)
-    return safe_df
+    return _cached_df_view("arrow", df, _build_arrow_compatible_df)
 
-def _safe_dataframe(df, **kwargs):
-    st.dataframe(_make_arrow_compatible_df(df), **kwargs)
+def _safe_dataframe(df, cache_view=True, **kwargs):
+    # cache_view=False for throwaway frames (e.g. one page of a larger table),
+    # which would only push reusable views out of the cache.
+    if cache_view:
+        st.dataframe(_make_arrow_compatible_df(df), **kwargs)
+    else:
+        st.dataframe(_build_arrow_compatible_df(df), **kwargs)
 
 def _pretty_field_name(name):
     return str(name).replace("_", " ").strip().title()
@@ -751,8 +847,18 @@ def render_plot_with_export(fig, export_name, key_prefix):
         "displaylogo": False,
     }
     st.plotly_chart(fig, width="stretch", config=plot_config)
+    # PNG export goes through kaleido, which is slow, so it only runs when
+    # asked for and the bytes are cached by figure spec for every session.
     try:
-        img_bytes = pio.to_image(fig, format="png", width=1400, height=900, scale=2)
+        spec_hash = _chart_spec_hash(fig)
+    except Exception:
+        st.caption("Use the camera icon on the chart to download PNG.")
+        return
+    img_bytes = _cached_chart_png(spec_hash)
+    if img_bytes is None and st.button("Prepare PNG download", key=f"{key_prefix}_png_prepare"):
+        with st.spinner("Rendering chart image..."):
+            img_bytes = _render_chart_png(fig, spec_hash)
+    if img_bytes:
         st.download_button(
             "Download chart as PNG",
             data=img_bytes,
@@ -760,267 +866,106 @@ def render_plot_with_export(fig, export_name, key_prefix):
             mime="image/png",
             key=f"{key_prefix}_png_download",
         )
-    except Exception:
+    elif img_bytes is not None:
         st.caption("Use the camera icon on the chart to download PNG.")
-
-def _norm_key(value):
-    if value is None:
-        return ""
-    return "".join(ch for ch in str(value).lower() if ch.isalnum())
-
-def _entity_ref_key(value):
-    if value is None:
-        return ""
-    s = str(value).strip().lower()
-    if not s:
-        return ""
-    if "/" in s:
-        s = s.rstrip("/").split("/")[-1]
-    if ":" in s:
-        s = s.split(":")[-1]
-    digits = "".join(ch for ch in s if ch.isdigit())
-    if len(digits) >= 4:
-        return digits
-    return "".join(ch for ch in s if ch.isalnum())
-
-POSTCODE_RE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2})\b", re.IGNORECASE)
-
-def _get_row_value(row, *keys):
-    if not row or not keys:
-        return None
-    try:
-        if any(k in row for k in keys):
-            for k in keys:
-                if k in row and row.get(k) not in [None, ""]:
-                    return row.get(k)
-    except Exception:
-        pass
-
-    normalized = {}
-    for k, v in row.items():
-        nk = _norm_key(k)
-        if nk and nk not in normalized:
-            normalized[nk] = v
-
-    for k in keys:
-        nk = _norm_key(k)
-        if nk in normalized and normalized[nk] not in [None, ""]:
-            return normalized[nk]
-    return None
-
-def _extract_participant_refs(event_row, people_name_by_id=None):
-    people_name_by_id = people_name_by_id or {}
-    participant_keys = (
-        "participant_list",
-        "participants_list",
-        "participants",
-        "attendees",
-        "attendee_list",
-        "attendees_list",
-        "people",
-        "participant_names",
-        "attendee_names",
-        "contacts",
-        "relationships",
-    )
-    found_names = []
-    found_ids = []
-    seen_names = set()
-    seen_ids = set()
-    context_tokens = ("participant", "attendee", "people", "contact", "person", "member")
-    id_keys = ("id", "person_id", "contact_id", "participant_id", "attendee_id")
-
-    def _add_name(value):
-        candidate = str(value).strip()
-        if not candidate:
-            return
-        key = candidate.lower()
-        if key in seen_names:
-            return
-        seen_names.add(key)
-        found_names.append(candidate)
-
-    def _add_id(value):
-        candidate = str(value).strip()
-        if not candidate or candidate in seen_ids:
-            return
-        seen_ids.add(candidate)
-        found_ids.append(candidate)
-
-    def _looks_like_context(path):
-        path_l = str(path).lower()
-        return any(t in path_l for t in context_tokens)
-
-    def _walk(value, path=""):
-        if value is None:
-            return
-        if isinstance(value, dict):
-            local_name = value.get("name") or value.get("full_name") or value.get("display_name")
-            if local_name:
-                _add_name(local_name)
-            if value.get("email"):
-                _add_name(value.get("email"))
-            for id_key in id_keys:
-                if value.get(id_key) is not None and _looks_like_context(path):
-                    _add_id(value.get(id_key))
-            for k, v in value.items():
-                next_path = f"{path}.{k}" if path else str(k)
-                _walk(v, next_path)
-            return
-        if isinstance(value, list):
-            for idx, item in enumerate(value):
-                next_path = f"{path}[{idx}]"
-                _walk(item, next_path)
-            return
-        if isinstance(value, str) and _looks_like_context(path):
-            raw = [x.strip() for x in value.replace("\n", ",").replace(";", ",").split(",")]
-            for token in raw:
-                if token:
-                    _add_name(token)
-
-    for key in participant_keys:
-        val = event_row.get(key)
-        if val is not None:
-            _walk(val, key)
-
-    for pid in found_ids:
-        mapped_name = people_name_by_id.get(_entity_ref_key(pid))
-        if mapped_name:
-            _add_name(mapped_name)
-    return found_names, found_ids
-
-def _extract_linked_event_ids_from_person(person_row):
-    linked_ids = set()
-    context_tokens = ("event", "attend", "session", "activity", "retreat", "walk", "booking")
-    id_keys = ("id", "event_id", "activity_id", "session_id")
-
-    def _in_context(path):
-        p = str(path).lower()
-        return any(t in p for t in context_tokens)
-
-    def _walk(value, path=""):
-        if value is None:
-            return
-        if isinstance(value, dict):
-            for k, v in value.items():
-                next_path = f"{path}.{k}" if path else str(k)
-                if k in id_keys and _in_context(path) and v is not None and str(v).strip():
-                    linked_ids.add(str(v).strip())
-                _walk(v, next_path)
-            return
-        if isinstance(value, list):
-            for idx, item in enumerate(value):
-                _walk(item, f"{path}[{idx}]")
-            return
-        if isinstance(value, str) and _in_context(path):
-            for token in re.split(r"[,;\n]", value):
-                token = token.strip()
-                if token:
-                    linked_ids.add(token)
 
-    _walk(person_row)
-    return linked_ids
+CHART_PNG_WIDTH = 1400
+CHART_PNG_HEIGHT = 900
+CHART_PNG_SCALE = 2
+CHART_PNG_CACHE_MAX = 64
+CHART_PNG_TIMEOUT_SECONDS = 60
+
+@st.cache_resource(show_spinner=False)
+def _chart_export_state():
+    # One kaleido worker per process; futures are shared so concurrent requests
+    # for the same chart wait on a single render. Only successful renders stay
+    # cached: a failed one is dropped so the next request tries again.
+    return {"executor": ThreadPoolExecutor(max_workers=1), "images": OrderedDict(), "lock": threading.Lock()}
+
+def _chart_spec_hash(fig):
+    spec = f"{fig.to_json()}|{CHART_PNG_WIDTH}x{CHART_PNG_HEIGHT}@{CHART_PNG_SCALE}"
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+def _cached_chart_png(spec_hash):
+    state = _chart_export_state()
+    with state["lock"]:
+        entry = state["images"].get(spec_hash)
+        if entry is None:
+            return None
+        state["images"].move_to_end(spec_hash)
+    if not entry.done():
+        return None
+    return _chart_png_result(state, spec_hash, entry) or None
 
-def _walk_nested_values(value):
-    if value is None:
-        return
-    if isinstance(value, dict):
-        for v in value.values():
-            yield from _walk_nested_values(v)
-        return
-    if isinstance(value, (list, tuple, set)):
-        for item in value:
-            yield from _walk_nested_values(item)
-        return
-    yield value
+def _chart_png_result(state, spec_hash, entry, timeout=None):
+    # A timed-out render keeps running and stays cached for the next request.
+    try:
+        img_bytes = entry.result(timeout=timeout)
+    except FutureTimeoutError:
+        return b""
+    except Exception as e:
+        print(f"Chart Export Error: {e}")
+        img_bytes = b""
+    if not img_bytes:
+        with state["lock"]:
+            if state["images"].get(spec_hash) is entry:
+                del state["images"][spec_hash]
+    return img_bytes
+
+def _to_png_bytes(fig):
+    return pio.to_image(fig, format="png", width=CHART_PNG_WIDTH, height=CHART_PNG_HEIGHT, scale=CHART_PNG_SCALE)
+
+def _render_chart_png(fig, spec_hash):
+    state = _chart_export_state()
+    with state["lock"]:
+        entry = state["images"].get(spec_hash)
+        if entry is None:
+            entry = state["executor"].submit(_to_png_bytes, fig)
+            state["images"][spec_hash] = entry
+            while len(state["images"]) > CHART_PNG_CACHE_MAX:
+                state["images"].popitem(last=False)
+    return _chart_png_result(state, spec_hash, entry, timeout=CHART_PNG_TIMEOUT_SECONDS)
+
+# Single memoised id normaliser shared with the sync/import scripts.
+_entity_ref_key = entity_ref_key
+
+# Beacon/payload helpers live in the shared sync engine.
+_clean_ts = clean_ts
+_norm_key = norm_key
+_get_row_value = get_row_value
+_extract_linked_id = extract_linked_id
+_extract_region_tags = extract_region_tags
+_build_beacon_url = build_beacon_url
+_extract_result_list = extract_result_list
+_extract_total_count = extract_total_count
+_extract_page_progress = extract_page_progress
+_extract_entity = extract_entity
+_fetch_beacon_entities = fetch_beacon_entities
+_upsert_in_batches = upsert_in_batches
+_extract_funder_name = extract_funder_name
+_coerce_money = coerce_money
+
+# KPI record rules are shared with the incremental KPI state.
+_extract_participant_refs = extract_participant_refs
+_extract_linked_event_ids_from_person = extract_linked_event_ids
+_normalize_gender = normalize_gender
+_rows_to_payloads = rows_to_payloads
+_build_event_attendee_records = build_event_attendee_records
 
 def _extract_postcode_from_value(value):
-    for item in _walk_nested_values(value):
-        if isinstance(item, bytes):
-            try:
-                item = item.decode("utf-8")
-            except Exception:
-                item = str(item)
-        text = str(item).strip()
-        if not text:
-            continue
-        match = POSTCODE_RE.search(text.upper())
-        if match:
-            postcode = re.sub(r"\s+", "", match.group(1).upper())
-            return f"{postcode[:-3]} {postcode[-3:]}" if len(postcode) > 3 else postcode
-    return None
+    finder = PostcodeFinder()
+    walk_payload(value, [finder])
+    return finder.postcode
 
 def _normalize_person_lookup(value):
     return "".join(ch for ch in str(value or "").strip().lower() if ch.isalnum())
 
-def _normalize_gender(value):
-    raw = str(value or "").strip().lower()
-    if not raw:
-        return "Unknown / Not provided"
-    if raw in {"prefer not to say", "prefer not say", "prefer not", "pn ts", "n/a", "na"}:
-        return "Prefer not to say"
-    if any(token in raw for token in ["trans", "non-binary", "non binary", "nonbinary", "gender diverse", "genderqueer", "agender"]):
-        return "Trans / Non-binary / Gender diverse"
-    if raw in {"m", "male", "man", "men"}:
-        return "Men"
-    if raw in {"f", "female", "woman", "women"}:
-        return "Women"
-    if raw in {"unknown", "not provided", "unspecified"}:
-        return "Unknown / Not provided"
-    return "Trans / Non-binary / Gender diverse"
-
-def _extract_linked_id(value):
-    if isinstance(value, list):
-        for item in value:
-            extracted = _extract_linked_id(item)
-            if extracted not in [None, ""]:
-                return extracted
-        return None
-    if isinstance(value, dict):
-        for key in ("id", "record_id", "value"):
-            if value.get(key) not in [None, ""]:
-                return value.get(key)
-        return None
-    return value
-
 def _extract_coords_from_record(record):
     if not isinstance(record, dict):
         return None, None
-
-    def _to_float_or_none(value):
-        try:
-            return float(value)
-        except Exception:
-            return None
-
-    def _walk(value):
-        if isinstance(value, dict):
-            lat = None
-            lon = None
-            for lat_key in ("lat", "latitude", "y"):
-                if lat_key in value:
-                    lat = _to_float_or_none(value.get(lat_key))
-                    if lat is not None:
-                        break
-            for lon_key in ("lon", "lng", "long", "longitude", "x"):
-                if lon_key in value:
-                    lon = _to_float_or_none(value.get(lon_key))
-                    if lon is not None:
-                        break
-            if lat is not None and lon is not None:
-                return lat, lon
-            for nested in value.values():
-                found = _walk(nested)
-                if found != (None, None):
-                    return found
-        elif isinstance(value, (list, tuple, set)):
-            for item in value:
-                found = _walk(item)
-                if found != (None, None):
-                    return found
-        return (None, None)
-
-    return _walk(record)
+    finder = CoordinateFinder()
+    walk_payload(record, [finder])
+    return finder.lat, finder.lon
 
 def _extract_location_label(record):
     if not isinstance(record, dict):
@@ -1057,9 +1002,13 @@ def _lookup_postcode_coordinates(postcode):
     except Exception:
         return None
 
-def _resolve_record_location(record):
-    lat, lon = _extract_coords_from_record(record)
-    postcode = _extract_postcode_from_value(record)
+def _resolve_record_location(record, extra_visitors=()):
+    # Coordinates, postcode and any caller-supplied extractors share one walk.
+    coords = CoordinateFinder()
+    postcode_finder = PostcodeFinder()
+    walk_payload(record, [coords, postcode_finder, *extra_visitors])
+    lat, lon = coords.lat, coords.lon
+    postcode = postcode_finder.postcode
     if lat is not None and lon is not None:
         return {"postcode": postcode or "", "lat": lat, "lon": lon}
     if postcode:
@@ -1141,7 +1090,8 @@ def fetch_distance_analysis_data(region="Global", start_date=None, end_date=None
         person_id = payload.get("id")
         person_name = str(_get_row_value(payload, "name", "full_name", "Display Name", "email") or person_id or "").strip()
         person_email = str(_get_row_value(payload, "email", "Email") or "").strip()
-        person_loc = _resolve_record_location(payload)
+        linked_events = LinkedIdCollector()
+        person_loc = _resolve_record_location(payload, extra_visitors=[linked_events])
         person_entry = {
             "person_id": str(person_id or ""),
             "participant": person_name or str(person_id or "Participant"),
@@ -1155,7 +1105,7 @@ def fetch_distance_analysis_data(region="Global", start_date=None, end_date=None
             key = _normalize_person_lookup(candidate)
             if key:
                 people_by_name[key] = person_entry
-        for event_id in _extract_linked_event_ids_from_person(payload):
+        for event_id in linked_events.ids:
             linked_people_by_event.setdefault(_entity_ref_key(event_id), []).append(person_entry)
 
     analysis_rows = []
@@ -1320,11 +1270,57 @@ def get_assigned_funder_names(max_rows=3000):
                 funders.add(funder_name)
     return sorted(funders, key=lambda x: x.lower())
 
-@st.cache_data(show_spinner=False, ttl=300)
-def get_organisation_name_lookup(max_rows=3000):
+@st.cache_data(show_spinner=False, ttl=60)
+def _org_names_version():
+    # Newest org_names.updated_at; None when the table isn't there yet,
+    # "" while it is still empty.
+    try:
+        rows = DB_CLIENT.table("org_names").select("updated_at").order("updated_at", desc=True).limit(1).execute().data or []
+    except Exception as e:
+        print(f"Org Names Error: {e}")
+        return None
+    return rows[0].get("updated_at") if rows else ""
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _org_names_lookup_store(version, data_version):
+    # Reloaded only when the org_names version or the dashboard data version
+    # changes. Shared between sessions: callers must not modify it.
+    if not version:
+        return None
     lookup = {}
+    batch_size = 1000
+    offset = 0
+    try:
+        while True:
+            rows = (
+                DB_CLIENT.table("org_names")
+                .select("ref_key, name")
+                .range(offset, offset + batch_size - 1)
+                .execute()
+                .data
+                or []
+            )
+            lookup.update((r["ref_key"], r["name"]) for r in rows if r.get("ref_key") and r.get("name"))
+            if len(rows) < batch_size:
+                break
+            offset += batch_size
+    except Exception as e:
+        print(f"Org Names Error: {e}")
+        return None
+    return lookup
+
+def get_organisation_name_lookup():
     if DB_TYPE != "supabase":
-        return lookup
+        return {}
+    lookup = _org_names_lookup_store(_org_names_version(), get_dashboard_data_version())
+    if lookup is None:
+        lookup = _organisation_name_lookup_from_payloads()
+    return lookup
+
+@st.cache_data(show_spinner=False, ttl=300)
+def _organisation_name_lookup_from_payloads(max_rows=3000):
+    # Used until sql/org_names.sql has been applied.
+    lookup = {}
     try:
         batch_size = 1000
         fetched = 0
@@ -1341,15 +1337,7 @@ def get_organisation_name_lookup(max_rows=3000):
             )
             if not rows:
                 break
-            for r in rows:
-                payload = r.get("payload") or {}
-                org_id = payload.get("id")
-                org_name = _get_row_value(payload, "name", "Organisation", "Organization", "Display Name")
-                if org_id is None or not org_name:
-                    continue
-                key = _entity_ref_key(org_id)
-                if key:
-                    lookup[key] = str(org_name).strip()
+            lookup.update(build_organisation_name_lookup(r.get("payload") or {} for r in rows))
             fetched += len(rows)
             if len(rows) < batch_size:
                 break
@@ -1358,66 +1346,43 @@ def get_organisation_name_lookup(max_rows=3000):
         return {}
     return lookup
 
-def _extract_funder_name(row, org_name_lookup=None):
-    name = _get_row_value(
-        row,
-        "funder",
-        "funder_name",
-        "funding_body",
-        "funding_body_name",
-        "donor",
-        "donor_name",
-        "sponsor",
-        "sponsor_name",
-        "organisation",
-        "organization",
-        "organisation_name",
-        "organization_name",
-        "grantor",
-        "grantor_name",
-    )
-    if isinstance(name, dict):
-        display = _get_row_value(name, "name", "title", "display_name")
-        if display:
-            name = display
-        else:
-            ref_id = name.get("id")
-            resolved = None
-            if org_name_lookup and ref_id is not None:
-                resolved = org_name_lookup.get(_entity_ref_key(ref_id))
-            name = resolved or ""
-    if isinstance(name, list):
-        name = ", ".join(str(x) for x in name if str(x).strip())
-    value = str(name or "").strip()
-    if not value:
-        # Common fallback: organization field carries only an id reference.
-        ref = _get_row_value(row, "organization", "organisation", "organisation_id", "organization_id")
-        if isinstance(ref, dict):
-            ref = ref.get("id")
-        if org_name_lookup and ref is not None:
-            mapped = org_name_lookup.get(_entity_ref_key(ref))
-            if mapped:
-                return mapped
-        return "Unknown / Not tagged"
-    # If value itself looks like an ID and can be resolved, prefer the readable name.
-    if org_name_lookup:
-        mapped = org_name_lookup.get(_entity_ref_key(value))
-        if mapped:
-            return mapped
-    # Do not expose unresolved ID-like tokens in the dashboard.
-    key_like = _entity_ref_key(value)
-    if key_like and (value.isdigit() or len(value) <= 16):
-        return "Unknown / Not tagged"
-    return value
+@st.cache_data(show_spinner=False, ttl=300)
+def _funder_keys_filled():
+    # False while payments or grants stored before sql/funder_index.sql are
+    # still waiting for backfill_funder_columns (or the column is missing).
+    try:
+        for table in ("beacon_payments", "beacon_grants"):
+            if DB_CLIENT.table(table).select("id").is_("funder_key", "null").limit(1).execute().data:
+                return False
+    except Exception as e:
+        print(f"Funder Index Error: {e}")
+        return False
+    return True
+
+@st.cache_data(show_spinner=False, ttl=300)
+def get_funder_index():
+    # Distinct funder names from the beacon_funders view (sql/funder_index.sql),
+    # or None when it hasn't been created or filled in yet.
+    if DB_TYPE != "supabase" or not _funder_keys_filled():
+        return None
+    try:
+        rows = _fetch_supabase_rows("beacon_funders", "funder_name")
+    except Exception as e:
+        print(f"Funder Index Error: {e}")
+        return None
+    return sorted({r["funder_name"] for r in rows if r.get("funder_name")}, key=lambda x: x.lower())
 
 @st.cache_data(show_spinner=False, ttl=300)
 def get_available_funders(max_rows=2000):
     funders = set()
-    org_name_lookup = get_organisation_name_lookup()
     for name in get_assigned_funder_names():
         if name:
             funders.add(name)
-    if DB_TYPE == "supabase":
+    indexed = get_funder_index()
+    if indexed is not None:
+        funders.update(indexed)
+    elif DB_TYPE == "supabase":
+        org_name_lookup = get_organisation_name_lookup()
         try:
             pay_rows = DB_CLIENT.table("beacon_payments").select("payload").limit(max_rows).execute().data or []
             grant_rows = DB_CLIENT.table("beacon_grants").select("payload").limit(max_rows).execute().data or []
@@ -1430,147 +1395,356 @@ def get_available_funders(max_rows=2000):
             pass
     return sorted(funders, key=lambda x: x.lower())
 
-def _read_uploaded_csv(uploaded_file):
-    if uploaded_file is None:
-        return []
+CSV_UPLOAD_CHUNK_ROWS = 5000
+CSV_UPLOAD_WORKERS = 5
+CSV_SNIFF_BYTES = 65536
+_REGION_ALIASES = ("Region", "Location (region)", "Location (Region)", "Location Region", "Region (region)", "Region (Region)")
+_ID_ALIASES = ("Record ID", "ID", "Id")
+
+# One entry per upload slot: target table, the canonical payload fields with
+# the export headers that can supply them (first non-empty wins), which
+# fields are timestamps or comma lists, the dated column on the table,
+# whether rows carry funder_name/funder_key and whether they feed org_names.
+BEACON_UPLOAD_SPECS = {
+    "people": {
+        "table": "beacon_people",
+        "result_key": "people",
+        "fields": {
+            "id": _ID_ALIASES,
+            "created_at": ("Created date", "Created", "Created at"),
+            "type": ("Type", "Person type", "Role", "Roles", "Tags", "Category"),
+            "c_region": _REGION_ALIASES,
+        },
+        "timestamps": ("created_at",),
+        "lists": ("type", "c_region"),
+        "date_column": "created_at",
+    },
+    "organization": {
+        "table": "beacon_organisations",
+        "result_key": "organisations",
+        "fields": {
+            "id": _ID_ALIASES,
+            "created_at": ("Created date", "Created", "Created at"),
+            "type": ("Type", "Organisation type", "Organization type", "Category"),
+            "c_region": _REGION_ALIASES,
+        },
+        "timestamps": ("created_at",),
+        "lists": ("c_region",),
+        "date_column": "created_at",
+        "org_names": True,
+    },
+    "event": {
+        "table": "beacon_events",
+        "result_key": "events",
+        "fields": {
+            "id": _ID_ALIASES,
+            "start_date": ("Start date", "Start", "Date", "Event date"),
+            "type": ("Type", "Event type", "Activity type", "Category"),
+            "c_region": ("Location (region)", "Location (Region)", "Location Region", "Region", "Region (region)", "Region (Region)"),
+            "number_of_attendees": ("Number of attendees", "Attendees", "Participants", "Total participants", "Participant count"),
+        },
+        "timestamps": ("start_date",),
+        "lists": ("c_region",),
+        "date_column": "start_date",
+    },
+    "payment": {
+        "table": "beacon_payments",
+        "result_key": "payments",
+        "fields": {
+            "id": _ID_ALIASES,
+            "payment_date": ("Payment date", "Date", "Received date"),
+            "amount": ("Amount (value)", "Amount", "Value"),
+        },
+        "timestamps": ("payment_date",),
+        "lists": (),
+        "date_column": "payment_date",
+        "funder_columns": True,
+    },
+    "grant": {
+        "table": "beacon_grants",
+        "result_key": "grants",
+        "fields": {
+            "id": _ID_ALIASES,
+            "close_date": ("Award date", "Close date", "Decision date"),
+            "amount": ("Amount granted (value)", "Amount requested (value)", "Value (value)", "Amount", "Value"),
+            "stage": ("Stage", "Status", "Grant stage"),
+        },
+        "timestamps": ("close_date",),
+        "lists": (),
+        "date_column": "close_date",
+        "funder_columns": True,
+    },
+}
+
+def _sniff_csv_delimiter(uploaded_file):
+    uploaded_file.seek(0)
+    sample = uploaded_file.read(CSV_SNIFF_BYTES)
+    uploaded_file.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode("utf-8-sig", errors="replace")
     try:
-        df = pd.read_csv(uploaded_file)
-    except Exception:
-        df = pd.read_csv(uploaded_file, sep="\t")
-    df = df.where(pd.notnull(df), None)
-    return df.to_dict(orient="records")
-
-def _upsert_in_batches(
-    admin_client,
-    table,
-    rows,
-    on_conflict="id",
-    default_chunk_size=200,
-    min_chunk_size=25,
-    batch_progress_callback=None,
-    should_cancel=None,
-):
-    if not rows:
-        return 0
-    total = len(rows)
-    index = 0
-    while index < total:
-        if should_cancel and should_cancel():
-            raise SyncCancelledError("Manual sync cancelled by user.")
-        chunk_size = min(default_chunk_size, total - index)
-        while True:
-            if should_cancel and should_cancel():
-                raise SyncCancelledError("Manual sync cancelled by user.")
-            chunk = rows[index:index + chunk_size]
-            try:
-                admin_client.table(table).upsert(chunk, on_conflict=on_conflict).execute()
-                index += len(chunk)
-                if batch_progress_callback:
-                    try:
-                        batch_progress_callback(index, total)
-                    except Exception:
-                        pass
-                break
-            except Exception as e:
-                msg = str(e).lower()
-                is_timeout = "statement timeout" in msg or "57014" in msg
-                if is_timeout and chunk_size > min_chunk_size:
-                    chunk_size = max(min_chunk_size, chunk_size // 2)
-                    time.sleep(1)
-                    continue
-                if is_timeout:
-                    time.sleep(2)
-                raise
-    return total
-
-def import_beacon_uploads(admin_client, uploads):
-    now_iso = datetime.now(UTC).isoformat().replace("+00:00", "Z")
+        return csv.Sniffer().sniff(sample, delimiters=",\t;|").delimiter
+    except csv.Error:
+        return "\t" if sample.count("\t") > sample.count(",") else ","
+
+def _read_upload_header(uploaded_file):
+    delimiter = _sniff_csv_delimiter(uploaded_file)
+    header = tuple(pd.read_csv(uploaded_file, sep=delimiter, nrows=0, encoding="utf-8-sig").columns)
+    uploaded_file.seek(0)
+    return delimiter, header
+
+def _resolve_columns(columns, aliases):
+    # Same precedence as _get_row_value, worked out once per file: exact
+    # header matches in alias order, then punctuation/case-insensitive ones.
+    resolved = [a for a in aliases if a in columns]
+    by_norm = {}
+    for col in columns:
+        by_norm.setdefault(_norm_key(col), col)
+    for alias in aliases:
+        col = by_norm.get(_norm_key(alias))
+        if col is not None and col not in resolved:
+            resolved.append(col)
+    return resolved
+
+@st.cache_data(show_spinner=False)
+def resolve_upload_mapping(kind, header):
+    # Maps an export's headers to the canonical payload fields, once per
+    # distinct header. Fields with a single source column are applied as a
+    # rename; fields several columns could supply are coalesced per row and
+    # reported as ambiguous, along with fields no column supplies.
+    spec = BEACON_UPLOAD_SPECS[kind]
+    header = list(header)
+    columns = {field: _resolve_columns(header, aliases) for field, aliases in spec["fields"].items()}
+    sources = {}
+    for field, cols in columns.items():
+        for col in cols:
+            sources.setdefault(col, []).append(field)
+    rename = {}
+    coalesce = {}
+    for field, cols in columns.items():
+        if len(cols) == 1 and len(sources[cols[0]]) == 1:
+            rename[cols[0]] = field
+        elif cols:
+            coalesce[field] = cols
+    # Headers that only differ by case/punctuation from a mapped one are
+    # never read; flag them too.
+    mapped_norms = {_norm_key(col): field for col, fields in sources.items() for field in fields}
+    ambiguous = {field: list(cols) for field, cols in coalesce.items()}
+    for col in header:
+        field = mapped_norms.get(_norm_key(col))
+        if field and col not in sources:
+            ambiguous.setdefault(field, list(columns[field])).append(col)
+    return {
+        "columns": columns,
+        "rename": rename,
+        "coalesce": coalesce,
+        "missing": [field for field, cols in columns.items() if not cols],
+        "ambiguous": ambiguous,
+        "unmapped": [col for col in header if col not in sources and _norm_key(col) not in mapped_norms],
+    }
 
-    people_rows = []
-    people_seen = {}
-    for r in uploads.get("people", []):
-        payload = _sanitize(dict(r))
-        payload["id"] = _get_row_value(r, "Record ID", "ID", "Id")
-        payload["created_at"] = _clean_ts(_get_row_value(r, "Created date", "Created", "Created at"))
-        payload["type"] = _to_list(_get_row_value(r, "Type", "Person type", "Role", "Roles", "Tags", "Category"))
-        payload["c_region"] = _to_list(_get_row_value(r, "Region", "Location (region)", "Location (Region)", "Location Region", "Region (region)", "Region (Region)"))
-        if payload.get("id"):
-            people_seen[payload["id"]] = {"id": payload["id"], "payload": payload, "created_at": payload.get("created_at"), "updated_at": now_iso}
-
-    org_rows = []
-    org_seen = {}
-    for r in uploads.get("organization", []):
-        payload = _sanitize(dict(r))
-        payload["id"] = _get_row_value(r, "Record ID", "ID", "Id")
-        payload["created_at"] = _clean_ts(_get_row_value(r, "Created date", "Created", "Created at"))
-        payload["type"] = _get_row_value(r, "Type", "Organisation type", "Organization type", "Category")
-        payload["c_region"] = _to_list(_get_row_value(r, "Region", "Location (region)", "Location (Region)", "Location Region", "Region (region)", "Region (Region)"))
-        if payload.get("id"):
-            org_seen[payload["id"]] = {"id": payload["id"], "payload": payload, "created_at": payload.get("created_at"), "updated_at": now_iso}
-
-    event_rows = []
-    event_seen = {}
-    for r in uploads.get("event", []):
-        payload = _sanitize(dict(r))
-        payload["id"] = _get_row_value(r, "Record ID", "ID", "Id")
-        payload["start_date"] = _clean_ts(_get_row_value(r, "Start date", "Start", "Date", "Event date"))
-        payload["type"] = _get_row_value(r, "Type", "Event type", "Activity type", "Category")
-        payload["c_region"] = _to_list(_get_row_value(r, "Location (region)", "Location (Region)", "Location Region", "Region", "Region (region)", "Region (Region)"))
-        payload["number_of_attendees"] = _get_row_value(r, "Number of attendees", "Attendees", "Participants", "Total participants", "Participant count")
-        if payload.get("id"):
-            event_seen[payload["id"]] = {
-                "id": payload["id"],
-                "payload": payload,
-                "start_date": payload.get("start_date"),
-                "region": (payload.get("c_region") or [None])[0],
-                "updated_at": now_iso
-            }
+def _object_column(df, col):
+    values = df[col].astype(object)
+    return values.where(values.notna(), None)
+
+def _coalesce_columns(df, columns):
+    if not columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    out = _object_column(df, columns[0])
+    for col in columns[1:]:
+        out = out.where(out.notna() & (out != ""), _object_column(df, col))
+    return out.where(out.notna() & (out != ""), None)
+
+def _clean_ts_series(values):
+    text = values.astype("string").str.strip()
+    return text.where(text.str.len() > 0).astype(object).where(lambda s: s.notna(), None)
+
+def _iter_uploaded_csv_chunks(uploaded_file, delimiter, mapping, chunk_rows=CSV_UPLOAD_CHUNK_ROWS):
+    # Ids are read as text so "00123" and ids in sparse columns don't turn into floats.
+    id_dtypes = {col: "string" for col in mapping["columns"]["id"]}
+    uploaded_file.seek(0)
+    reader = pd.read_csv(
+        uploaded_file,
+        sep=delimiter,
+        chunksize=chunk_rows,
+        dtype=id_dtypes,
+        encoding="utf-8-sig",
+    )
+    yield from reader
+
+def _normalise_upload_chunk(df, spec, mapping, now_iso, org_name_lookup=None):
+    rename = mapping["rename"]
+    canonical = df[list(rename)].rename(columns=rename).astype(object)
+    canonical = canonical.where(canonical.notna(), None)
+    canonical = canonical.where(canonical != "", None)
+    values = {}
+    for field in spec["fields"]:
+        if field in canonical.columns:
+            series = canonical[field]
+        else:
+            series = _coalesce_columns(df, mapping["coalesce"].get(field, []))
+        if field in spec["timestamps"]:
+            series = _clean_ts_series(series)
+        values[field] = series.tolist()
+    for field in spec["lists"]:
+        values[field] = [_to_list(v) for v in values[field]]
+
+    records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    date_column = spec["date_column"]
+    rows = {}
+    for i, payload in enumerate(records):
+        for field, field_values in values.items():
+            payload[field] = field_values[i]
+        rec_id = payload.get("id")
+        if not rec_id:
+            continue
+        row = {"id": rec_id, "payload": payload, date_column: payload.get(date_column), "updated_at": now_iso}
+        if spec["table"] == "beacon_events":
+            row["region"] = (payload.get("c_region") or [None])[0]
+        if spec.get("funder_columns"):
+            row.update(funder_columns(payload, org_name_lookup))
+        rows[rec_id] = row
+    return list(rows.values())
+
+def _upload_size(uploaded_file):
+    size = getattr(uploaded_file, "size", None)
+    if size is None:
+        uploaded_file.seek(0, os.SEEK_END)
+        size = uploaded_file.tell()
+        uploaded_file.seek(0)
+    return size or 0
+
+def _import_upload_file(admin_client, kind, uploaded_file, delimiter, mapping, now_iso, org_name_lookup, on_progress, seen_ids):
+    # seen_ids collects the ids written, including those of a file that fails
+    # part way, for the KPI refresh. The organisations file adds its names to
+    # org_name_lookup for the payments and grants imported after it.
+    spec = BEACON_UPLOAD_SPECS[kind]
+    for chunk in _iter_uploaded_csv_chunks(uploaded_file, delimiter, mapping):
+        rows = _normalise_upload_chunk(chunk, spec, mapping, now_iso, org_name_lookup)
+        if rows:
+            _upsert_in_batches(admin_client, spec["table"], rows, on_conflict="id")
+            seen_ids.update(row["id"] for row in rows)
+            if spec.get("org_names"):
+                names = build_organisation_name_lookup(row["payload"] for row in rows)
+                upsert_org_names(admin_client, names, now_iso)
+                org_name_lookup.update(names)
+        on_progress(kind, uploaded_file.tell())
+    return len(seen_ids)
+
+def import_beacon_uploads(admin_client, uploads, progress_callback=None):
+    # uploads maps upload slot ("people", "organization", ...) to a file-like
+    # CSV (or None). Files are imported concurrently, each read and upserted
+    # chunk by chunk; a file that fails is reported in errors without
+    # stopping the others. Returns (row counts, {slot: error}).
+    now_iso = datetime.now(UTC).isoformat().replace("+00:00", "Z")
+    result = {spec["result_key"]: 0 for spec in BEACON_UPLOAD_SPECS.values()}
+    errors = {}
+    jobs = {}
+    # Headers are read here: resolve_upload_mapping is a Streamlit cache and
+    # is called from the script thread only.
+    for kind in BEACON_UPLOAD_SPECS:
+        uploaded_file = uploads.get(kind)
+        if uploaded_file is None:
+            continue
+        try:
+            delimiter, header = _read_upload_header(uploaded_file)
+        except Exception as e:
+            errors[kind] = f"Could not read CSV header: {e}"
+            continue
+        mapping = resolve_upload_mapping(kind, header)
+        if "id" in mapping["missing"]:
+            errors[kind] = "No Record ID column found."
+            continue
+        jobs[kind] = (uploaded_file, delimiter, mapping)
+    if not jobs:
+        return result, errors
+    # Funder names resolve against the organisations already stored and the
+    # ones in this upload: payments and grants start once the organisations
+    # file is in.
+    org_name_lookup = {}
+    deferred = {}
+    if any(BEACON_UPLOAD_SPECS[kind].get("funder_columns") for kind in jobs):
+        org_name_lookup = dict(get_organisation_name_lookup())
+        if any(BEACON_UPLOAD_SPECS[kind].get("org_names") for kind in jobs):
+            deferred = {kind: job for kind, job in jobs.items() if BEACON_UPLOAD_SPECS[kind].get("funder_columns")}
+
+    sizes = {kind: _upload_size(job[0]) for kind, job in jobs.items()}
+    total_bytes = sum(sizes.values())
+    done = {kind: 0 for kind in jobs}
+    done_lock = threading.Lock()
+    written = {kind: set() for kind in jobs}
+
+    def _on_progress(kind, position):
+        with done_lock:
+            done[kind] = min(position, sizes[kind])
 
-    payment_rows = []
-    payment_seen = {}
-    for r in uploads.get("payment", []):
-        payload = _sanitize(dict(r))
-        payload["id"] = _get_row_value(r, "Record ID", "ID", "Id")
-        payload["payment_date"] = _clean_ts(_get_row_value(r, "Payment date", "Date", "Received date"))
-        payload["amount"] = _get_row_value(r, "Amount (value)", "Amount", "Value")
-        if payload.get("id"):
-            payment_seen[payload["id"]] = {"id": payload["id"], "payload": payload, "payment_date": payload.get("payment_date"), "updated_at": now_iso}
-
-    grant_rows = []
-    grant_seen = {}
-    for r in uploads.get("grant", []):
-        payload = _sanitize(dict(r))
-        payload["id"] = _get_row_value(r, "Record ID", "ID", "Id")
-        payload["close_date"] = _clean_ts(_get_row_value(r, "Award date", "Close date", "Decision date"))
-        payload["amount"] = _get_row_value(r, "Amount granted (value)", "Amount requested (value)", "Value (value)", "Amount", "Value")
-        payload["stage"] = _get_row_value(r, "Stage", "Status", "Grant stage")
-        if payload.get("id"):
-            grant_seen[payload["id"]] = {"id": payload["id"], "payload": payload, "close_date": payload.get("close_date"), "updated_at": now_iso}
-
-    people_rows = list(people_seen.values())
-    org_rows = list(org_seen.values())
-    event_rows = list(event_seen.values())
-    payment_rows = list(payment_seen.values())
-    grant_rows = list(grant_seen.values())
-
-    if people_rows:
-        _upsert_in_batches(admin_client, "beacon_people", people_rows, on_conflict="id")
-    if org_rows:
-        _upsert_in_batches(admin_client, "beacon_organisations", org_rows, on_conflict="id")
-    if event_rows:
-        _upsert_in_batches(admin_client, "beacon_events", event_rows, on_conflict="id")
-    if payment_rows:
-        _upsert_in_batches(admin_client, "beacon_payments", payment_rows, on_conflict="id")
-    if grant_rows:
-        _upsert_in_batches(admin_client, "beacon_grants", grant_rows, on_conflict="id")
+    if progress_callback:
+        progress_callback(0, f"Importing {len(jobs)} file(s)...")
+    # Worker threads only record how far they have read; progress is reported
+    # from this thread because Streamlit widgets can't be updated elsewhere.
+    with ThreadPoolExecutor(max_workers=min(CSV_UPLOAD_WORKERS, len(jobs))) as pool:
+        futures = {}
+
+        def _submit(kind, job):
+            future = pool.submit(
+                _import_upload_file, admin_client, kind, *job, now_iso, org_name_lookup, _on_progress, written[kind]
+            )
+            futures[future] = kind
+            return future
+
+        pending = {_submit(kind, job) for kind, job in jobs.items() if kind not in deferred}
+        files_done = 0
+        while pending:
+            finished, pending = wait(pending, timeout=0.5)
+            for future in finished:
+                kind = futures[future]
+                try:
+                    result[BEACON_UPLOAD_SPECS[kind]["result_key"]] = future.result()
+                except Exception as e:
+                    print(f"CSV Upload Error ({kind}): {e}")
+                    errors[kind] = str(e)
+                _on_progress(kind, sizes[kind])
+                files_done += 1
+                if BEACON_UPLOAD_SPECS[kind].get("org_names") and deferred:
+                    pending |= {_submit(k, job) for k, job in deferred.items()}
+                    deferred = {}
+            if progress_callback:
+                with done_lock:
+                    bytes_done = sum(done.values())
+                if total_bytes:
+                    pct = int(99 * min(1.0, bytes_done / total_bytes))
+                else:
+                    pct = int(99 * files_done / len(jobs))
+                progress_callback(pct, f"Importing... {files_done} of {len(jobs)} file(s) done.")
+    if any(BEACON_UPLOAD_SPECS[kind].get("funder_columns") and kind not in errors for kind in jobs):
+        if progress_callback:
+            progress_callback(99, "Refreshing funder income rollups...")
+        backfill_funder_columns(admin_client, org_name_lookup)
+        refresh_funder_income_rollups(admin_client, org_name_lookup)
+    if any(written.values()):
+        if progress_callback:
+            progress_callback(99, "Updating KPI state...")
+        refresh_kpi_state(admin_client, {BEACON_UPLOAD_SPECS[kind]["table"]: ids for kind, ids in written.items()})
+    if progress_callback:
+        progress_callback(100, f"Imported {sum(result.values())} rows from {len(jobs)} file(s).")
+    return result, errors
 
-    return {
-        "people": len(people_rows),
-        "organisations": len(org_rows),
-        "events": len(event_rows),
-        "payments": len(payment_rows),
-        "grants": len(grant_rows),
-    }
+def render_upload_mapping(kind, uploaded_file):
+    try:
+        _, header = _read_upload_header(uploaded_file)
+    except Exception as e:
+        st.error(f"Could not read CSV header: {e}")
+        return
+    mapping = resolve_upload_mapping(kind, header)
+    if "id" in mapping["missing"]:
+        st.error("No Record ID column found. This file will be skipped.")
+    missing = [field for field in mapping["missing"] if field != "id"]
+    if missing:
+        st.warning(f"No column found for: {', '.join(missing)}")
+    for field, cols in mapping["ambiguous"].items():
+        st.caption(f"{field}: first non-empty of {', '.join(cols)}")
+    if mapping["unmapped"]:
+        st.caption(f"{len(mapping['unmapped'])} other column(s) kept in the payload only.")
 
 def _get_secret_or_env(key, default=None):
     try:
@@ -1579,75 +1753,6 @@ def _get_secret_or_env(key, default=None):
     except Exception:
         pass
     return os.getenv(key, default)
-
-def _build_beacon_url(base_url, account_id, endpoint):
-    base = (base_url or "").strip()
-    if not base:
-        base = "https://api.beaconcrm.org/v1/account/{account_id}"
-    if "{account_id}" in base:
-        if not account_id:
-            raise ValueError("Missing BEACON_ACCOUNT_ID for base URL template.")
-        base = base.format(account_id=account_id)
-    base = base.rstrip("/")
-    if endpoint.startswith("/"):
-        return f"{base}{endpoint}"
-    if base.endswith("/entities"):
-        return f"{base}/{endpoint}"
-    return f"{base}/entities/{endpoint}"
-
-def _extract_result_list(response_json):
-    if isinstance(response_json, list):
-        return response_json
-    if not isinstance(response_json, dict):
-        return []
-    if isinstance(response_json.get("results"), list):
-        return response_json.get("results") or []
-    if isinstance(response_json.get("data"), list):
-        return response_json.get("data") or []
-    return []
-
-def _extract_total_count(response_json):
-    if not isinstance(response_json, dict):
-        return None
-    meta = response_json.get("meta")
-    if isinstance(meta, dict):
-        total = meta.get("total")
-        if isinstance(total, int):
-            return total
-    total = response_json.get("total")
-    if isinstance(total, int):
-        return total
-    return None
-
-def _extract_page_progress(response_json):
-    if not isinstance(response_json, dict):
-        return None, None
-    meta = response_json.get("meta")
-    if isinstance(meta, dict):
-        current_page = meta.get("current_page")
-        total_pages = meta.get("total_pages")
-        if isinstance(current_page, int) and isinstance(total_pages, int):
-            return current_page, total_pages
-    current_page = response_json.get("current_page")
-    total_pages = response_json.get("total_pages")
-    if isinstance(current_page, int) and isinstance(total_pages, int):
-        return current_page, total_pages
-    return None, None
-
-def _extract_entity(record):
-    if not isinstance(record, dict):
-        return {}
-    if isinstance(record.get("entity"), dict):
-        entity = dict(record.get("entity") or {})
-        # Preserve wrapper metadata/relationships when Beacon sends related data
-        # outside entity (common for participant links on events).
-        for k, v in record.items():
-            if k == "entity":
-                continue
-            if k not in entity:
-                entity[k] = v
-        return entity
-    return record
 
 @st.cache_data(show_spinner=False, ttl=300)
 def fetch_live_event_attendees(event_id):
@@ -1661,22 +1766,7 @@ def fetch_live_event_attendees(event_id):
     if not beacon_key:
         return {"names": [], "ids": [], "endpoint": None}
 
-    def _id_key(value):
-        if value is None:
-            return ""
-        s = str(value).strip().lower()
-        if not s:
-            return ""
-        if "/" in s:
-            s = s.rstrip("/").split("/")[-1]
-        if ":" in s:
-            s = s.split(":")[-1]
-        digits = "".join(ch for ch in s if ch.isdigit())
-        if len(digits) >= 4:
-            return digits
-        return "".join(ch for ch in s if ch.isalnum())
-
-    target_key = _id_key(target)
+    target_key = _entity_ref_key(target)
     headers = {
         "Authorization": f"Bearer {beacon_key}",
         "Content-Type": "application/json",
@@ -1759,7 +1849,7 @@ def fetch_live_event_attendees(event_id):
                 for raw in rows:
                     att = _extract_entity(raw)
                     att_event_id = _attendee_event_id(att)
-                    if _id_key(att_event_id) != target_key:
+                    if _entity_ref_key(att_event_id) != target_key:
                         continue
                     pid = _extract_linked_id(_get_row_value(att, "person_id", "participant_id", "contact_id", "person", "participant", "contact"))
                     if pid is not None:
@@ -1782,86 +1872,6 @@ def fetch_live_event_attendees(event_id):
 
     return {"names": found_names, "ids": found_ids, "endpoint": None}
 
-def _extract_region_tags(record):
-    candidates = []
-    for key in (
-        "c_region",
-        "region",
-        "Region",
-        "location_region",
-        "location",
-        "Location (region)",
-        "Location Region",
-    ):
-        if key in record and record.get(key) not in [None, ""]:
-            candidates.extend(_to_list(record.get(key)))
-    if isinstance(record.get("address"), list):
-        for addr in record.get("address"):
-            if isinstance(addr, dict):
-                if addr.get("region"):
-                    candidates.extend(_to_list(addr.get("region")))
-                if addr.get("country"):
-                    candidates.extend(_to_list(addr.get("country")))
-    seen = set()
-    out = []
-    for item in candidates:
-        s = str(item).strip()
-        if s and s.lower() not in seen:
-            seen.add(s.lower())
-            out.append(s)
-    return out
-
-def _fetch_beacon_entities(base_url, api_key, account_id, endpoint, per_page=50, max_pages=200, should_cancel=None):
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Beacon-Application": "developer_api",
-    }
-    all_rows = []
-    page = 1
-    while page <= max_pages:
-        if should_cancel and should_cancel():
-            raise SyncCancelledError("Manual sync cancelled by user.")
-        url = _build_beacon_url(base_url, account_id, endpoint)
-        params = {
-            "page": page,
-            "per_page": per_page,
-            "sort_by": "created_at",
-            "sort_direction": "desc",
-        }
-        resp = None
-        for attempt in range(4):
-            if should_cancel and should_cancel():
-                raise SyncCancelledError("Manual sync cancelled by user.")
-            resp = requests.get(url, headers=headers, params=params, timeout=45)
-            if resp.status_code not in (429, 500, 502, 503, 504):
-                break
-            if attempt < 3:
-                time.sleep(2 ** attempt)
-        if resp is None:
-            raise RuntimeError(f"Beacon API request failed for {endpoint}: no response")
-        if resp.status_code >= 400:
-            try:
-                details = resp.json()
-            except Exception:
-                details = resp.text[:500]
-            raise RuntimeError(f"Beacon API error {resp.status_code} for {endpoint}: {details}")
-        payload = resp.json()
-        rows = _extract_result_list(payload)
-        if not rows:
-            break
-        all_rows.extend(rows)
-        if len(rows) < per_page:
-            break
-        total = _extract_total_count(payload)
-        if isinstance(total, int) and len(all_rows) >= total:
-            break
-        current_page, total_pages = _extract_page_progress(payload)
-        if isinstance(current_page, int) and isinstance(total_pages, int) and current_page >= total_pages:
-            break
-        page += 1
-    return all_rows
-
 def run_beacon_api_smoke_test():
     beacon_key = _get_secret_or_env("BEACON_API_KEY")
     beacon_base_url = _get_secret_or_env("BEACON_BASE_URL")
@@ -1947,349 +1957,19 @@ def run_beacon_api_smoke_test():
     }
 
 def sync_beacon_api_to_supabase(admin_client, progress_callback=None, should_cancel=None):
-    def _status_text(progress, message):
-        return f"{int(progress)}% | {message}"
-
-    def _report(progress, message):
-        if should_cancel and should_cancel():
-            raise SyncCancelledError("Manual sync cancelled by user.")
-        if progress_callback:
-            progress_callback(progress, _status_text(progress, message))
-
-    def _check_cancel():
-        if should_cancel and should_cancel():
-            raise SyncCancelledError("Manual sync cancelled by user.")
-
-    total_started = time.time()
-    now_iso = datetime.now(UTC).isoformat().replace("+00:00", "Z")
     beacon_key = _get_secret_or_env("BEACON_API_KEY")
-    beacon_base_url = _get_secret_or_env("BEACON_BASE_URL")
-    beacon_account_id = _get_secret_or_env("BEACON_ACCOUNT_ID")
     if not beacon_key:
         raise RuntimeError("Missing BEACON_API_KEY in Streamlit secrets or environment.")
-
-    fetch_plan = [
-        ("people", "person", "people"),
-        ("organisations", "organization", "organisations"),
-        ("events", "event", "events"),
-        ("payments", "payment", "payments"),
-        ("subscriptions", "subscription", "subscriptions"),
-        ("grants", "grant", "grants"),
-    ]
-    datasets = {}
-    fetch_breakdown_ms = {}
-    fetch_started = time.time()
-    _report(5, "Starting Beacon API sync...")
-    for idx, (dataset_key, endpoint, label) in enumerate(fetch_plan):
-        _check_cancel()
-        fetch_start = 5 + int((idx / len(fetch_plan)) * 45)
-        fetch_end = 5 + int(((idx + 1) / len(fetch_plan)) * 45)
-        _report(fetch_start, f"Fetching Beacon {label} ({idx + 1} of {len(fetch_plan)} datasets)...")
-        endpoint_started = time.time()
-        datasets[dataset_key] = _fetch_beacon_entities(
-            beacon_base_url, beacon_key, beacon_account_id, endpoint, should_cancel=should_cancel
-        )
-        fetch_breakdown_ms[dataset_key] = int((time.time() - endpoint_started) * 1000)
-        _report(fetch_end, f"Fetched Beacon {label}: {len(datasets[dataset_key])} records.")
-
-    # Optional direct attendee source (preferred for participant drill-down).
-    configured_attendee_endpoint = _get_secret_or_env("BEACON_EVENT_ATTENDEES_ENDPOINT")
-    attendee_endpoint_candidates = [
-        (configured_attendee_endpoint, "event attendees"),
-        ("event_attendee", "event attendees"),
-        ("event_attendees", "event attendees"),
-        ("event_attendance", "event attendance"),
-        ("event_attendances", "event attendance"),
-        ("attendance", "attendance"),
-        ("attendees", "attendees"),
-        ("event_registration", "event registrations"),
-        ("event_registrations", "event registrations"),
-    ]
-    datasets["event_attendees"] = []
-    attendee_fetch_started = time.time()
-    for endpoint, label in attendee_endpoint_candidates:
-        _check_cancel()
-        if not endpoint:
-            continue
-        try:
-            rows = _fetch_beacon_entities(
-                beacon_base_url, beacon_key, beacon_account_id, endpoint, should_cancel=should_cancel
-            )
-            datasets["event_attendees"] = rows
-            _report(50, f"Fetched Beacon {label}: {len(rows)} records from endpoint '{endpoint}'.")
-            break
-        except Exception:
-            continue
-    fetch_breakdown_ms["event_attendees"] = int((time.time() - attendee_fetch_started) * 1000)
-    fetch_duration_ms = int((time.time() - fetch_started) * 1000)
-
-    _report(55, "Transforming Beacon records...")
-    _check_cancel()
-    transform_started = time.time()
-
-    people_seen = {}
-    for row in datasets["people"]:
-        entity = _sanitize(_extract_entity(row))
-        rec_id = entity.get("id")
-        if not rec_id:
-            continue
-        entity["id"] = rec_id
-        entity["created_at"] = _clean_ts(entity.get("created_at"))
-        entity["type"] = _to_list(entity.get("type"))
-        if not entity.get("c_region"):
-            entity["c_region"] = _extract_region_tags(entity)
-        people_seen[rec_id] = {"id": rec_id, "payload": entity, "created_at": entity.get("created_at"), "updated_at": now_iso}
-
-    people_name_by_id = {}
-    for p_id, p_row in people_seen.items():
-        p_payload = p_row.get("payload") or {}
-        p_name = _get_row_value(p_payload, "name", "full_name", "Display Name", "email") or p_id
-        people_name_by_id[_entity_ref_key(p_id)] = str(p_name).strip()
-
-    org_seen = {}
-    for row in datasets["organisations"]:
-        entity = _sanitize(_extract_entity(row))
-        rec_id = entity.get("id")
-        if not rec_id:
-            continue
-        entity["id"] = rec_id
-        entity["created_at"] = _clean_ts(entity.get("created_at"))
-        if isinstance(entity.get("type"), list):
-            entity["type"] = ", ".join([str(v) for v in entity.get("type") if str(v).strip()])
-        if not entity.get("c_region"):
-            entity["c_region"] = _extract_region_tags(entity)
-        org_seen[rec_id] = {"id": rec_id, "payload": entity, "created_at": entity.get("created_at"), "updated_at": now_iso}
-
-    attendee_map = {}
-
-    def _attendee_event_id(att):
-        direct = _get_row_value(att, "event_id", "eventId", "event")
-        direct = _extract_linked_id(direct)
-        if direct not in [None, ""]:
-            return str(direct)
-        for key in ("event", "activity", "session"):
-            ref = att.get(key)
-            if isinstance(ref, dict) and ref.get("id") not in [None, ""]:
-                return str(ref.get("id"))
-        rel = att.get("relationships")
-        if isinstance(rel, dict):
-            for key in ("event", "events", "activity", "session"):
-                ref = rel.get(key)
-                if isinstance(ref, dict):
-                    if isinstance(ref.get("data"), dict) and ref["data"].get("id") not in [None, ""]:
-                        return str(ref["data"]["id"])
-                    if ref.get("id") not in [None, ""]:
-                        return str(ref.get("id"))
-                    if isinstance(ref.get("data"), list) and ref["data"]:
-                        first = ref["data"][0]
-                        if isinstance(first, dict) and first.get("id") not in [None, ""]:
-                            return str(first.get("id"))
-        return None
-
-    def _attendee_person_id(att):
-        direct = _get_row_value(att, "person_id", "contact_id", "participant_id", "person", "contact", "participant")
-        direct = _extract_linked_id(direct)
-        if direct not in [None, ""]:
-            return str(direct)
-        rel = att.get("relationships")
-        if isinstance(rel, dict):
-            for key in ("person", "people", "contact", "participant"):
-                ref = rel.get(key)
-                if isinstance(ref, dict):
-                    if isinstance(ref.get("data"), dict) and ref["data"].get("id") not in [None, ""]:
-                        return str(ref["data"]["id"])
-                    if ref.get("id") not in [None, ""]:
-                        return str(ref.get("id"))
-        return None
-
-    def _attendee_name(att):
-        return _get_row_value(
-            att,
-            "name",
-            "full_name",
-            "display_name",
-            "participant_name",
-            "attendee_name",
-            "person_name",
-            "contact_name",
-            "email",
-        )
-
-    event_attendee_records = {}
-    attendee_seen = {}
-    for row in datasets.get("event_attendees") or []:
-        att = _sanitize(_extract_entity(row))
-        rec_id = att.get("id") or _get_row_value(att, "Record ID", "ID", "Id")
-        if not rec_id:
-            continue
-        att["id"] = str(rec_id)
-        att["created_at"] = _clean_ts(att.get("created_at") or _get_row_value(att, "Created date", "Created", "Created at"))
-        event_id = _attendee_event_id(att)
-        if not event_id:
-            continue
-        person_id = _attendee_person_id(att)
-        if person_id:
-            att["person_id"] = str(person_id)
-        att["event_id"] = str(event_id)
-        name = _attendee_name(att)
-        if (not name) and person_id:
-            name = people_name_by_id.get(_entity_ref_key(person_id))
-        bucket = attendee_map.setdefault(event_id, {"names": set(), "ids": set()})
-        if person_id:
-            bucket["ids"].add(str(person_id))
-        if name:
-            bucket["names"].add(str(name).strip())
-        norm_event_id = _entity_ref_key(event_id)
-        records_bucket = event_attendee_records.setdefault(event_id, [])
-        records_bucket.append(att)
-        if norm_event_id and norm_event_id != event_id:
-            event_attendee_records.setdefault(norm_event_id, []).append(att)
-        attendee_seen[str(rec_id)] = {
-            "id": str(rec_id),
-            "event_id": str(event_id),
-            "person_id": str(person_id) if person_id else None,
-            "created_at": att.get("created_at"),
-            "updated_at": now_iso,
-            "payload": att,
-        }
-
-    event_seen = {}
-    for row in datasets["events"]:
-        entity = _sanitize(_extract_entity(row))
-        rec_id = entity.get("id")
-        if not rec_id:
-            continue
-        entity["id"] = rec_id
-        entity["start_date"] = _clean_ts(entity.get("start_date") or entity.get("date") or entity.get("created_at"))
-        if not entity.get("c_region"):
-            entity["c_region"] = _extract_region_tags(entity)
-        entity["type"] = entity.get("type") or entity.get("event_type") or entity.get("category")
-        attendee_bucket = attendee_map.get(str(rec_id), {"names": set(), "ids": set()})
-        direct_names = sorted([n for n in attendee_bucket["names"] if n])
-        direct_ids = sorted([i for i in attendee_bucket["ids"] if i])
-        if direct_names:
-            entity["participant_list"] = direct_names
-        if direct_ids:
-            entity["participant_ids"] = direct_ids
-        direct_count = max(len(direct_names), len(direct_ids))
-        existing_count = entity.get("number_of_attendees") or entity.get("attendees") or entity.get("participant_count")
-        if existing_count in [None, ""] and direct_count > 0:
-            entity["number_of_attendees"] = direct_count
-        else:
-            entity["number_of_attendees"] = existing_count
-        attendee_records_for_event = event_attendee_records.get(str(rec_id)) or event_attendee_records.get(_entity_ref_key(rec_id)) or []
-        event_seen[rec_id] = {
-            "id": rec_id,
-            "payload": entity,
-            "start_date": entity.get("start_date"),
-            "region": (entity.get("c_region") or [None])[0],
-            "updated_at": now_iso,
-        }
-
-    payment_seen = {}
-    for row in datasets["payments"] + datasets["subscriptions"]:
-        entity = _sanitize(_extract_entity(row))
-        rec_id = entity.get("id")
-        if not rec_id:
-            continue
-        if rec_id in payment_seen:
-            continue
-        entity["id"] = rec_id
-        entity["payment_date"] = _clean_ts(entity.get("payment_date") or entity.get("date") or entity.get("created_at"))
-        entity["amount"] = entity.get("amount") or entity.get("value")
-        payment_seen[rec_id] = {"id": rec_id, "payload": entity, "payment_date": entity.get("payment_date"), "updated_at": now_iso}
-
-    grant_seen = {}
-    for row in datasets["grants"]:
-        entity = _sanitize(_extract_entity(row))
-        rec_id = entity.get("id")
-        if not rec_id:
-            continue
-        entity["id"] = rec_id
-        entity["close_date"] = _clean_ts(entity.get("close_date") or entity.get("award_date") or entity.get("created_at"))
-        entity["amount"] = entity.get("amount") or entity.get("amount_granted") or entity.get("value")
-        entity["stage"] = entity.get("stage") or entity.get("status")
-        grant_seen[rec_id] = {"id": rec_id, "payload": entity, "close_date": entity.get("close_date"), "updated_at": now_iso}
-
-    people_rows = list(people_seen.values())
-    org_rows = list(org_seen.values())
-    event_rows = list(event_seen.values())
-    attendee_rows = list(attendee_seen.values())
-    payment_rows = list(payment_seen.values())
-    grant_rows = list(grant_seen.values())
-    transform_duration_ms = int((time.time() - transform_started) * 1000)
-
-    total_records = len(people_rows) + len(org_rows) + len(event_rows) + len(attendee_rows) + len(payment_rows) + len(grant_rows)
-    synced_records = 0
-
-    def _upsert_with_progress(table_name, rows, start_pct, end_pct, label):
-        if not rows:
-            return 0
-
-        def _on_batch(done, total):
-            if total <= 0:
-                frac = 1.0
-            else:
-                frac = max(0.0, min(1.0, done / total))
-            pct = start_pct + int((end_pct - start_pct) * frac)
-            overall_synced = synced_records + done
-            _report(pct, f"Upserting {label}... {overall_synced} out of {total_records} records synced.")
-
-        _check_cancel()
-        _upsert_in_batches(
-            admin_client,
-            table_name,
-            rows,
-            on_conflict="id",
-            batch_progress_callback=_on_batch,
-            should_cancel=should_cancel,
-        )
-        return len(rows)
-
-    upsert_started = time.time()
-    _report(68, f"Preparing import: {synced_records} out of {total_records} records synced.")
-    _report(72, f"Upserting people ({len(people_rows)}) and organisations ({len(org_rows)})...")
-    if people_rows:
-        synced_records += _upsert_with_progress("beacon_people", people_rows, 72, 76, "people")
-        _report(76, f"People upserted: {synced_records} out of {total_records} records synced.")
-    if org_rows:
-        synced_records += _upsert_with_progress("beacon_organisations", org_rows, 76, 80, "organisations")
-        _report(80, f"Organisations upserted: {synced_records} out of {total_records} records synced.")
-
-    _report(84, f"Upserting events ({len(event_rows)}), attendees ({len(attendee_rows)}) and payments ({len(payment_rows)})...")
-    if event_rows:
-        synced_records += _upsert_with_progress("beacon_events", event_rows, 84, 87, "events")
-        _report(87, f"Events upserted: {synced_records} out of {total_records} records synced.")
-    if attendee_rows:
-        synced_records += _upsert_with_progress("beacon_event_attendees", attendee_rows, 87, 90, "event attendees")
-        _report(90, f"Event attendees upserted: {synced_records} out of {total_records} records synced.")
-    if payment_rows:
-        synced_records += _upsert_with_progress("beacon_payments", payment_rows, 90, 94, "payments")
-        _report(92, f"Payments upserted: {synced_records} out of {total_records} records synced.")
-
-    _report(94, f"Upserting grants ({len(grant_rows)})...")
-    if grant_rows:
-        synced_records += _upsert_with_progress("beacon_grants", grant_rows, 94, 97, "grants")
-        _report(97, f"Grants upserted: {synced_records} out of {total_records} records synced.")
-    upsert_duration_ms = int((time.time() - upsert_started) * 1000)
-
-    _report(100, f"Beacon API sync complete. {synced_records} out of {total_records} records synced.")
-    total_duration_ms = int((time.time() - total_started) * 1000)
-
-    return {
-        "people": len(people_rows),
-        "organisations": len(org_rows),
-        "events": len(event_rows),
-        "event_attendees": len(attendee_rows),
-        "payments": len(payment_rows),
-        "grants": len(grant_rows),
-        "synced_at": now_iso,
-        "fetch_duration_ms": fetch_duration_ms,
-        "transform_duration_ms": transform_duration_ms,
-        "upsert_duration_ms": upsert_duration_ms,
-        "total_duration_ms": total_duration_ms,
-        "fetch_breakdown_ms": fetch_breakdown_ms,
-    }
+    return run_beacon_sync(
+        admin_client,
+        beacon_key,
+        beacon_base_url=_get_secret_or_env("BEACON_BASE_URL"),
+        beacon_account_id=_get_secret_or_env("BEACON_ACCOUNT_ID"),
+        attendee_endpoint=_get_secret_or_env("BEACON_EVENT_ATTENDEES_ENDPOINT"),
+        progress_callback=progress_callback,
+        should_cancel=should_cancel,
+        kpi_refresh=lambda rows: refresh_kpi_state(admin_client, rows),
+    )
 
 # --- LOCAL FILE HELPERS (Fallback) ---
 
@@ -3079,536 +2759,23 @@ def get_case_studies(region_filter=None, start_date=None, end_date=None):
 
 # --- BEACON CRM INTEGRATION (LIVE) ---
 
-def compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records=None):
-    if event_attendee_records is None:
-        event_attendee_records = {}
-    # 2. Filter Helpers
-    def get_region_tags(record):
-        return _to_list(record.get('c_region'))
-
-    def is_in_region(record):
-        if region == "Global":
-            return True
-        tags = get_region_tags(record)
-        if not tags and record.get("region"):
-            tags = _to_list(record.get("region"))
-        return any(region.lower() in str(t).lower() for t in tags)
-
-    # 3. Process People (Governance)
-    region_people = [p for p in people if is_in_region(p)]
-    
-    # Fuzzy match for volunteers
-    volunteers = []
-    for p in region_people:
-        p_types = [str(t).lower() for t in _to_list(p.get('type'))]
-        if any('volunteer' in t for t in p_types):
-            volunteers.append(p)
-
-    steering_volunteers = []
-    for v in volunteers:
-        # Check if they are part of a steering group (often a specific type or tag)
-        v_types = [str(t).lower() for t in _to_list(v.get('type'))]
-        if any('steering' in t or 'committee' in t for t in v_types):
-            steering_volunteers.append(v)
-            
-    # Proxy: If no specific "steering" tag found, fallback to total or mock logic
-    steering_group_proxy = len(steering_volunteers) if steering_volunteers else len(volunteers)
-
-    # 4. Process Organisations (Partnerships)
-    region_orgs = [o for o in organisations if is_in_region(o)]
-    all_orgs = list(organisations or [])
-    org_id_to_region = {o.get('id'): True for o in region_orgs if o.get('id') is not None}
-    
-    lsp_counts = {}
-    ldp_counts = {}
-    corporate_orgs = []
-    
-    for org in region_orgs:
-        org_type = str(org.get('type') or "").strip()
-        if not org_type:
-            continue
-        
-        # Determine strategic vs delivery
-        if any(x in org_type.lower() for x in ["university", "trust", "political", "parliamentary", "media", "nhs", "prescriber"]):
-            lsp_counts[org_type] = lsp_counts.get(org_type, 0) + 1
-        else:
-            ldp_counts[org_type] = ldp_counts.get(org_type, 0) + 1
-            
-    for org in all_orgs:
-        org_type = str(org.get('type') or "").strip().lower()
-        if "business" in org_type or "corporate" in org_type:
-            corporate_orgs.append(org)
-
-    corporate_count = len(corporate_orgs)
-
-    # 5. Process Income
-    global_grants = []
-    for g in grants:
-        org_link = g.get('organization')
-        linked_id = None
-        if isinstance(org_link, dict): linked_id = org_link.get('id')
-        elif isinstance(org_link, str): linked_id = org_link
-        
-        if linked_id and linked_id in org_id_to_region:
-            global_grants.append(g)
-        elif region == "Global":
-            global_grants.append(g)
-
-    if region != "Global":
-        global_grants = list(grants or [])
-            
-    # Fuzzy match for grant stages
-    bids_submitted = sum(1 for g in global_grants if any(x in str(g.get('stage')).lower() for x in ['submitted', 'review', 'pending']))
-    funds_raised_grants = sum(_coerce_money(g.get('amount')) for g in global_grants if str(g.get('stage')).lower() == 'won')
-    
-    def _payment_in_region(payment):
-        if region == "Global":
-            return True
-        if is_in_region(payment):
-            return True
-        return False
-
-    global_payments = [p for p in payments if _payment_in_region(p)]
-    if region != "Global":
-        global_payments = list(payments or [])
-    total_payments = sum(_coerce_money(p.get('amount')) for p in global_payments)
-    
-    total_funds = funds_raised_grants + total_payments
-
-    # 6. Process Delivery (Events)
-    region_events = [e for e in events if is_in_region(e)]
-
-    def _to_int(value):
-        if value is None:
-            return 0
-        s = str(value).strip().replace(",", "")
-        if not s:
-            return 0
-        try:
-            return int(float(s))
-        except ValueError:
-            return 0
-
-    def _event_type(event_row):
-        for key in ("type", "Type", "Event type", "Activity type", "Category"):
-            val = event_row.get(key)
-            if val is not None and str(val).strip():
-                return str(val).lower()
-        return ""
-
-    def _event_attendees(event_row):
-        for key in (
-            "number_of_attendees",
-            "Number of attendees",
-            "Attendees",
-            "Participants",
-            "Total participants",
-            "Participant count",
-            "Number attending",
-        ):
-            val = event_row.get(key)
-            if val is not None and str(val).strip():
-                if isinstance(val, list):
-                    return len(val)
-                if isinstance(val, dict):
-                    for count_key in ("count", "total", "value", "participants", "attendees"):
-                        if val.get(count_key) is not None and str(val.get(count_key)).strip():
-                            return _to_int(val.get(count_key))
-                return _to_int(val)
-        return 0
-
-    def _id_key(value):
-        if value is None:
-            return ""
-        s = str(value).strip().lower()
-        if not s:
-            return ""
-        if "/" in s:
-            s = s.rstrip("/").split("/")[-1]
-        if ":" in s:
-            s = s.split(":")[-1]
-        digits = "".join(ch for ch in s if ch.isdigit())
-        if len(digits) >= 4:
-            return digits
-        return "".join(ch for ch in s if ch.isalnum())
-
-    people_name_by_id = {}
-    people_age_by_id = {}
-    for person_row in people:
-        pid = person_row.get("id")
-        person_key = _id_key(pid) if pid is not None else ""
-        p_name = _get_row_value(person_row, "name", "full_name", "Display Name", "email") or pid
-        if person_key:
-            people_name_by_id[person_key] = str(p_name).strip()
-        for age_key in ("c_age", "age", "Age", "participant_age", "age_years", "Age (years)"):
-            age_val = person_row.get(age_key)
-            if age_val is not None and str(age_val).strip():
-                if person_key:
-                    people_age_by_id[person_key] = age_val
-                break
-        if person_key and person_key not in people_age_by_id:
-            for dob_key in ("dob", "date_of_birth", "Date of Birth", "Birth date", "birth_date"):
-                dob_val = person_row.get(dob_key)
-                if dob_val is not None and str(dob_val).strip():
-                    people_age_by_id[person_key] = dob_val
-                    break
-
-    def _extract_participant_refs(event_row):
-        participant_keys = (
-            "participant_list",
-            "participants_list",
-            "participants",
-            "attendees",
-            "attendee_list",
-            "attendees_list",
-            "people",
-            "participant_names",
-            "attendee_names",
-            "contacts",
-            "relationships",
-        )
-        found_names = []
-        found_ids = []
-        seen_names = set()
-        seen_ids = set()
-        context_tokens = ("participant", "attendee", "people", "contact", "person", "member")
-        id_keys = ("id", "person_id", "contact_id", "participant_id", "attendee_id")
-
-        def _add_name(value):
-            candidate = str(value).strip()
-            if not candidate:
-                return
-            key = candidate.lower()
-            if key in seen_names:
-                return
-            seen_names.add(key)
-            found_names.append(candidate)
-
-        def _add_id(value):
-            candidate = str(value).strip()
-            if not candidate:
-                return
-            if candidate in seen_ids:
-                return
-            seen_ids.add(candidate)
-            found_ids.append(candidate)
-
-        def _looks_like_context(path):
-            path_l = str(path).lower()
-            return any(t in path_l for t in context_tokens)
-
-        def _walk(value, path=""):
-            if value is None:
-                return
-            if isinstance(value, dict):
-                local_name = value.get("name") or value.get("full_name") or value.get("display_name")
-                if local_name:
-                    _add_name(local_name)
-                if value.get("email"):
-                    _add_name(value.get("email"))
-                for id_key in id_keys:
-                    if value.get(id_key) is not None and _looks_like_context(path):
-                        _add_id(value.get(id_key))
-                for k, v in value.items():
-                    next_path = f"{path}.{k}" if path else str(k)
-                    _walk(v, next_path)
-                return
-            if isinstance(value, list):
-                for idx, item in enumerate(value):
-                    next_path = f"{path}[{idx}]"
-                    _walk(item, next_path)
-                return
-            if isinstance(value, str):
-                if _looks_like_context(path):
-                    raw = [x.strip() for x in value.replace("\n", ",").replace(";", ",").split(",")]
-                    for token in raw:
-                        if token:
-                            _add_name(token)
-
-        for key in participant_keys:
-            val = event_row.get(key)
-            if val is None:
-                continue
-            _walk(val, key)
-
-        if found_ids:
-            for pid in found_ids:
-                mapped_name = people_name_by_id.get(_id_key(pid))
-                if mapped_name:
-                    _add_name(mapped_name)
-        return found_names, found_ids
-
-    def _extract_linked_event_ids_from_person(person_row):
-        linked_ids = set()
-        context_tokens = ("event", "attend", "session", "activity", "retreat", "walk", "booking")
-        id_keys = ("id", "event_id", "activity_id", "session_id")
-
-        def _in_context(path):
-            p = str(path).lower()
-            return any(t in p for t in context_tokens)
-
-        def _walk(value, path=""):
-            if value is None:
-                return
-            if isinstance(value, dict):
-                for k, v in value.items():
-                    next_path = f"{path}.{k}" if path else str(k)
-                    if k in id_keys and _in_context(path):
-                        if v is not None and str(v).strip():
-                            linked_ids.add(str(v).strip())
-                    _walk(v, next_path)
-                return
-            if isinstance(value, list):
-                for idx, item in enumerate(value):
-                    _walk(item, f"{path}[{idx}]")
-                return
-            if isinstance(value, (int, float)):
-                if _in_context(path):
-                    linked_ids.add(str(int(value)))
-                return
-            if isinstance(value, str):
-                if _in_context(path):
-                    parts = [x.strip() for x in value.replace("\n", ",").replace(";", ",").split(",")]
-                    for part in parts:
-                        if part:
-                            linked_ids.add(part)
-
-        _walk(person_row)
-        return linked_ids
-    
-    walks_delivered = 0
-    participants = 0
-    delivery_event_count = 0
-    delivery_events = []
-    event_type_counts = {}
-    people_by_event_id = {}
-    for p in region_people:
-        p_name = _get_row_value(p, "name", "full_name", "Display Name", "email") or p.get("id")
-        if not p_name:
-            continue
-        linked_event_ids = _extract_linked_event_ids_from_person(p)
-        for linked_id in linked_event_ids:
-            key = _id_key(linked_id)
-            if key not in people_by_event_id:
-                people_by_event_id[key] = []
-            if str(p_name) not in people_by_event_id[key]:
-                people_by_event_id[key].append(str(p_name))
-    for e in region_events:
-        e_type = _event_type(e)
-        if any(x in e_type for x in ['walk', 'retreat', 'delivery', 'session', 'hike', 'trek']):
-            walks_delivered += 1
-            delivery_event_count += 1
-            participant_list, participant_ids = _extract_participant_refs(e)
-            event_id = str(e.get("id")) if e.get("id") is not None else ""
-            linked_people = people_by_event_id.get(_id_key(event_id), [])
-            if linked_people:
-                seen_names = set(str(x).strip().lower() for x in participant_list)
-                for lp in linked_people:
-                    lp_norm = str(lp).strip().lower()
-                    if lp_norm and lp_norm not in seen_names:
-                        participant_list.append(lp)
-                        seen_names.add(lp_norm)
-            event_participants = max(_event_attendees(e), len(participant_list), len(participant_ids))
-            participants += event_participants
-            event_type_label = e_type.title() if e_type else "Unknown Event Type"
-            event_type_counts[event_type_label] = event_type_counts.get(event_type_label, 0) + 1
-            delivery_events.append({
-                "id": e.get("id"),
-                "type": e_type,
-                "participants": event_participants,
-                "date": e.get("start_date") or e.get("date") or e.get("created_at"),
-                "name": _get_row_value(e, "name", "title", "Event name", "Description") or e.get("id"),
-                "region": ", ".join(_to_list(e.get("c_region"))),
-                "participant_list": participant_list,
-                "participant_ids": participant_ids,
-                "attendee_records": event_attendee_records.get(str(event_id)) or event_attendee_records.get(_id_key(event_id)) or [],
-                "raw_event": e,
-            })
-
-    # Fallback: if event labels are inconsistent, treat all region events as delivered.
-    if walks_delivered == 0 and region_events:
-        walks_delivered = len(region_events)
-        participants = sum(_event_attendees(e) for e in region_events)
-
-    age_bucket_order = ["18-30", "30-40", "40-45", "45-65", "65-75", "75+"]
-
-    def _coerce_age_years(value):
-        if value is None:
-            return None
-        if isinstance(value, (int, float)) and not pd.isna(value):
-            age_num = int(float(value))
-            return age_num if 0 <= age_num <= 120 else None
-        text = str(value).strip()
-        if not text:
-            return None
-        match = re.search(r"(\d{1,3})", text)
-        if match:
-            age_num = int(match.group(1))
-            return age_num if 0 <= age_num <= 120 else None
-        dob = pd.to_datetime(text, errors="coerce", dayfirst=True)
-        if pd.isna(dob):
-            dob = pd.to_datetime(text, errors="coerce")
-        if pd.isna(dob):
-            return None
-        today = pd.Timestamp.now(tz=dob.tz) if getattr(dob, "tzinfo", None) else pd.Timestamp.now()
-        age_num = int((today - dob).days // 365.25)
-        return age_num if 0 <= age_num <= 120 else None
-
-    def _age_bucket_for(value):
-        age_num = _coerce_age_years(value)
-        if age_num is None or age_num < 18:
-            return None
-        if age_num < 30:
-            return "18-30"
-        if age_num < 40:
-            return "30-40"
-        if age_num < 45:
-            return "40-45"
-        if age_num < 65:
-            return "45-65"
-        if age_num < 75:
-            return "65-75"
-        return "75+"
-
-    def _extract_attendee_age_bucket(attendee):
-        for key in ("c_age", "age", "Age", "participant_age", "age_years", "Age (years)"):
-            bucket = _age_bucket_for(_get_row_value(attendee, key))
-            if bucket:
-                return bucket
-        for key in ("dob", "date_of_birth", "Date of Birth", "Birth date", "birth_date"):
-            bucket = _age_bucket_for(_get_row_value(attendee, key))
-            if bucket:
-                return bucket
-        person_key = _id_key(attendee.get("person_id"))
-        if person_key and person_key in people_age_by_id:
-            return _age_bucket_for(people_age_by_id.get(person_key))
-        return None
-
-    attendee_gender_demographics = {}
-    attendee_age_demographics = {}
-    seen_attendees = set()
-    for event in region_events:
-        event_id = str(event.get("id") or "")
-        attendee_rows = event_attendee_records.get(event_id) or event_attendee_records.get(_id_key(event_id)) or []
-        for attendee in attendee_rows:
-            if not isinstance(attendee, dict):
-                continue
-            attendee_key = str(attendee.get("id") or f"{event_id}:{attendee.get('person_id') or attendee.get('name') or attendee.get('email') or ''}").strip()
-            if attendee_key in seen_attendees:
-                continue
-            seen_attendees.add(attendee_key)
-            label = _normalize_gender(_get_row_value(attendee, "c_gender", "Gender", "gender"))
-            attendee_gender_demographics[label] = attendee_gender_demographics.get(label, 0) + 1
-            age_bucket = _extract_attendee_age_bucket(attendee)
-            if age_bucket:
-                attendee_age_demographics[age_bucket] = attendee_age_demographics.get(age_bucket, 0) + 1
-
-    # Delivery demographics from currently available fields.
-    # Priority 1: event attendee gender
-    # Priority 2: people type tags
-    # Priority 3: event type split
-    demographic_keyword_map = {
-        "Men": ["men", "male"],
-        "Women": ["women", "female"],
-        "Young Adults": ["young adult", "young people", "youth"],
-        "Carers": ["carer", "caregiver"],
-        "Veterans": ["veteran"],
-        "Ethnic Minorities": ["ethnic minority", "minority ethnic", "bame", "global majority"],
-        "Parents": ["parent", "mum", "dad"],
-    }
-    people_tag_demographics = {}
-    for p in region_people:
-        person_tags = [str(t).lower() for t in _to_list(p.get("type"))]
-        if not person_tags:
-            continue
-        person_text = " | ".join(person_tags)
-        for label, keywords in demographic_keyword_map.items():
-            if any(k in person_text for k in keywords):
-                people_tag_demographics[label] = people_tag_demographics.get(label, 0) + 1
-
-    if attendee_gender_demographics or attendee_age_demographics:
-        delivery_demographics = {}
-        for label, count in attendee_gender_demographics.items():
-            delivery_demographics[label] = count
-        for label in age_bucket_order:
-            if attendee_age_demographics.get(label):
-                delivery_demographics[label] = attendee_age_demographics[label]
-        unknown_age_count = max(0, len(seen_attendees) - sum(attendee_age_demographics.values()))
-        if unknown_age_count:
-            delivery_demographics["Unknown Age"] = unknown_age_count
-        delivery_demographics_source = "event_attendee_demographics"
-    elif people_tag_demographics:
-        delivery_demographics = people_tag_demographics
-        delivery_demographics_source = "people_type_tags"
-    elif event_type_counts:
-        delivery_demographics = event_type_counts
-        delivery_demographics_source = "event_type_split"
-    else:
-        delivery_demographics = {"Unknown": participants if participants > 0 else 0}
-        delivery_demographics_source = "unknown"
-
-    return {
-        "region": region,
-        "last_updated": datetime.now().strftime("%H:%M:%S"),
-        "governance": {
-            "steering_group_active": steering_group_proxy > 0, 
-            "steering_members": steering_group_proxy,
-            "volunteers_new": len(volunteers) 
-        },
-        "partnerships": {
-            "LSP": lsp_counts if lsp_counts else {"None": 0},
-            "LDP": ldp_counts if ldp_counts else {"None": 0},
-            "active_referrals": len(region_orgs),
-            "networks_sat_on": 0 
-        },
-        "delivery": {
-            "walks_delivered": walks_delivered, 
-            "participants": participants,
-            "bursary_participants": 0, 
-            "wellbeing_change_score": 0,
-            "demographics": delivery_demographics,
-            "demographics_source": delivery_demographics_source,
-        },
-        "income": {
-            "bids_submitted": bids_submitted,
-            "total_funds_raised": total_funds,
-            "corporate_partners": corporate_count,
-            "in_kind_value": 0 
-        },
-        "comms": {
-            "press_releases": 0,
-            "media_coverage": 0,
-            "newsletters_sent": 0,
-            "open_rate": 0
-        },
-        "_debug": {
-            "region_people": len(region_people),
-            "volunteers": len(volunteers),
-            "steering_volunteers": len(steering_volunteers),
-            "region_events": len(region_events),
-            "walk_events": walks_delivered,
-            "participants": participants,
-            "region_grants": len(global_grants),
-            "bids_submitted": bids_submitted,
-            "delivery_events_tagged": delivery_event_count
-        },
-        "_raw_income": {
-            "payments": global_payments,
-            "grants": global_grants
-        },
-        "_raw_kpi": {
-            "region_people": region_people,
-            "volunteers": volunteers,
-            "steering_volunteers": steering_volunteers,
-            "region_orgs": region_orgs,
-            "corporate_orgs": corporate_orgs,
-            "region_events": region_events,
-            "delivery_events": delivery_events,
-            "region_grants": global_grants,
-            "region_payments": global_payments,
-            "event_attendee_records": event_attendee_records,
-        }
-    }
+def compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records=None, include_details=True, linked_people=None):
+    # kpi_state computes the figures; drill-down rows are compacted here for
+    # the shared KPI store.
+    result = _compute_kpi_figures(
+        region,
+        people,
+        organisations,
+        events,
+        payments,
+        grants,
+        event_attendee_records=event_attendee_records,
+        include_details=include_details,
+        linked_people=linked_people,
+    )
+    if include_details:
+        result["_raw_kpi"] = _compact_raw_kpi(**result["_raw_kpi"])
+    return result
 
 
 def get_mock_data(region):
@@ -3647,8 +2814,28 @@ def get_mock_data(region):
         }
     }
 
+# KPI results and report frames are large. st.cache_data pickles them on store
+# and unpickles a fresh copy on every rerun, so they are held once per process
+# with st.cache_resource and handed out by reference: treat them as read-only.
+# Entries are keyed by the dashboard data version, which is bumped whenever the
+# Beacon tables are rewritten (sync, CSV import, reset).
+DASHBOARD_STORE_MAX_ENTRIES = 48
+
+@st.cache_resource(show_spinner=False)
+def _dashboard_data_version_state():
+    return {"version": 0, "lock": threading.Lock()}
+
+def get_dashboard_data_version():
+    return _dashboard_data_version_state()["version"]
+
+def bump_dashboard_data_version():
+    state = _dashboard_data_version_state()
+    with state["lock"]:
+        state["version"] += 1
+        return state["version"]
+
 @st.cache_data(show_spinner=False, ttl=300)
-def _fetch_supabase_rows(table, columns, date_field=None, start_iso=None, end_iso=None, batch_size=1000, max_retries=4):
+def _fetch_supabase_rows(table, columns, date_field=None, start_iso=None, end_iso=None, batch_size=1000, max_retries=4, filters=None):
     if DB_TYPE != 'supabase':
         return []
     rows = []
@@ -3662,6 +2849,8 @@ def _fetch_supabase_rows(table, columns, date_field=None, start_iso=None, end_is
                     q = q.gte(date_field, start_iso)
                 if date_field and end_iso:
                     q = q.lte(date_field, end_iso)
+                for column, value in (filters or {}).items():
+                    q = q.eq(column, value)
                 chunk = q.range(offset, offset + batch_size - 1).execute().data or []
                 break
             except Exception as e:
@@ -3689,43 +2878,191 @@ def _fetch_supabase_rows(table, columns, date_field=None, start_iso=None, end_is
         offset += batch_size
     return rows
 
-def _rows_to_payloads(rows, date_field=None, region_field=None):
-    payloads = []
-    for row in rows:
-        payload = row.get("payload") or {}
-        if date_field and row.get(date_field) and not payload.get(date_field):
-            payload[date_field] = row.get(date_field)
-        if region_field and row.get(region_field) and not payload.get("c_region"):
-            payload["c_region"] = [row.get(region_field)]
-        payloads.append(payload)
-    return payloads
-
-def _build_event_attendee_records(attendee_rows):
-    event_attendee_records = {}
-    for row in attendee_rows:
-        payload = row.get("payload") or {}
-        event_id = payload.get("event_id") or row.get("event_id")
-        person_id = payload.get("person_id") or row.get("person_id")
-        if person_id and not payload.get("person_id"):
-            payload["person_id"] = person_id
-        if event_id and not payload.get("event_id"):
-            payload["event_id"] = event_id
-        if row.get("created_at") and not payload.get("created_at"):
-            payload["created_at"] = row.get("created_at")
-        if not event_id:
-            continue
-        event_attendee_records.setdefault(str(event_id), []).append(payload)
-        norm_event_id = _entity_ref_key(event_id)
-        if norm_event_id and norm_event_id != str(event_id):
-            event_attendee_records.setdefault(norm_event_id, []).append(payload)
-    return event_attendee_records
+# Cached KPI results keep compact rows for drill-downs instead of full Beacon
+# payloads; the complete record is fetched by id only when a row is opened.
+COMPACT_RECORD_SCHEMAS = {
+    "beacon_people": RecordSchema(
+        "beacon_people",
+        ("id", "name", "full_name", "Display Name", "email", "type", "c_region", "created_at"),
+    ),
+    "beacon_organisations": RecordSchema(
+        "beacon_organisations",
+        ("id", "name", "Organisation", "Organization", "Display Name", "type", "c_region", "created_at"),
+    ),
+    "beacon_events": RecordSchema(
+        "beacon_events",
+        ("id", "name", "title", "event_name", "Display Name", "type", "start_date", "date", "created_at", "c_region", "region", "number_of_attendees"),
+    ),
+    "beacon_event_attendees": RecordSchema(
+        "beacon_event_attendees",
+        (
+            "id", "event_id", "person_id", "contact_id", "participant_id", "attendee_id",
+            "name", "full_name", "display_name", "participant_name", "attendee_name",
+            "person_name", "contact_name", "email", "created_at",
+        ),
+    ),
+}
+
+ENTITY_PAYLOAD_COLUMNS = {
+    "beacon_people": ("payload, created_at", "created_at", None),
+    "beacon_organisations": ("payload, created_at", "created_at", None),
+    "beacon_events": ("payload, start_date, region", "start_date", "region"),
+    "beacon_event_attendees": ("id, payload, event_id, person_id, created_at", None, None),
+}
+
+def _compact_record(table, record):
+    if not isinstance(record, dict):
+        return record
+    schema = COMPACT_RECORD_SCHEMAS[table]
+    values = []
+    normalized = None
+    for field in schema.fields:
+        if field in record:
+            values.append(record.get(field))
+            continue
+        # Same normalised-key fallback as _get_row_value ("Display Name" vs display_name).
+        if normalized is None:
+            normalized = {}
+            for k, v in record.items():
+                nk = _norm_key(k)
+                if nk and nk not in normalized:
+                    normalized[nk] = v
+        values.append(normalized.get(_norm_key(field)))
+    return CompactRecord(schema, values, _extract_region_tags(record))
+
+def _compact_records(table, records, memo=None):
+    # memo shares one compact row between lists holding the same payload
+    # (e.g. a steering volunteer is also in volunteers and region_people).
+    if memo is None:
+        memo = {}
+    out = []
+    for record in records or []:
+        key = (table, id(record))
+        compact = memo.get(key)
+        if compact is None:
+            compact = _compact_record(table, record)
+            memo[key] = compact
+        out.append(compact)
+    return out
+
+@st.cache_data(show_spinner=False, ttl=300)
+def fetch_entity_payload(table, record_id):
+    if DB_TYPE != 'supabase' or record_id in (None, "") or table not in ENTITY_PAYLOAD_COLUMNS:
+        return None
+    columns, date_field, region_field = ENTITY_PAYLOAD_COLUMNS[table]
+    try:
+        rows = DB_CLIENT.table(table).select(columns).eq("id", record_id).limit(1).execute().data or []
+    except Exception:
+        return None
+    if not rows:
+        return None
+    if table == "beacon_event_attendees":
+        for records in _build_event_attendee_records(rows).values():
+            return records[0]
+        return rows[0].get("payload") or None
+    return _rows_to_payloads(rows, date_field=date_field, region_field=region_field)[0]
+
+def _compact_raw_kpi(region_people, volunteers, steering_volunteers, region_orgs, corporate_orgs, region_events, delivery_events, region_grants, region_payments):
+    memo = {}
+    for event in delivery_events:
+        event["attendee_records"] = _compact_records("beacon_event_attendees", event.get("attendee_records"), memo)
+    return {
+        "region_people": _compact_records("beacon_people", region_people, memo),
+        "volunteers": _compact_records("beacon_people", volunteers, memo),
+        "steering_volunteers": _compact_records("beacon_people", steering_volunteers, memo),
+        "region_orgs": _compact_records("beacon_organisations", region_orgs, memo),
+        "corporate_orgs": _compact_records("beacon_organisations", corporate_orgs, memo),
+        "region_events": _compact_records("beacon_events", region_events, memo),
+        "delivery_events": delivery_events,
+        # Income rows stay whole: they are the same objects as _raw_income, which
+        # funder attribution reads field-by-field.
+        "region_grants": region_grants,
+        "region_payments": region_payments,
+    }
+
+def _expand_compact_record(record):
+    # Full payload for a single drill-down row; falls back to the compact fields.
+    if isinstance(record, CompactRecord):
+        return fetch_entity_payload(record.table, record.get("id")) or record.to_dict()
+    if isinstance(record, dict):
+        expanded = {}
+        for k, v in record.items():
+            if isinstance(v, CompactRecord):
+                v = v.to_dict()
+            elif isinstance(v, list) and any(isinstance(item, CompactRecord) for item in v):
+                v = [item.to_dict() if isinstance(item, CompactRecord) else item for item in v]
+            expanded[k] = v
+        return expanded
+    return record
+
+@st.cache_data(show_spinner=False, ttl=300)
+def _kpi_cube_ready():
+    # True once kpi_cube exists and a sync/import has filled it.
+    try:
+        rows = DB_CLIENT.table(KPI_CUBE_TABLE).select("measure").limit(1).execute().data or []
+    except Exception as e:
+        print(f"KPI Cube Error: {e}")
+        return False
+    return bool(rows)
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _kpi_cube_summary_store(region, start_day, end_day, data_version):
+    try:
+        rows = DB_CLIENT.rpc("kpi_cube_totals", {"p_region": region, "p_start": start_day, "p_end": end_day}).execute().data or []
+        # Income is only shown for Global; its chart needs the daily totals.
+        income_rows = []
+        if region == "Global":
+            for measure in ("payments_amount", "grants_amount"):
+                income_rows += _fetch_supabase_rows(
+                    KPI_CUBE_TABLE,
+                    "measure, day, value",
+                    "day",
+                    start_day,
+                    end_day,
+                    filters={"region": SHARED_REGION, "measure": measure},
+                )
+    except Exception as e:
+        print(f"KPI Cube Error: {e}")
+        return None
+    result = kpi_summary(rows, region, income_rows)
+    result["_source"] = "kpi_cube"
+    return result
+
+def _kpi_range_bounds(start_date, end_date):
+    # Whole-day bounds for the raw-row fetches, matching the kpi_cube day
+    # buckets the headline tiles are summed from.
+    start_iso = start_date.date().isoformat() if start_date else None
+    end_iso = f"{end_date.date().isoformat()}T23:59:59.999999" if end_date else None
+    return start_iso, end_iso
+
+def _kpi_range_joins(region, start_date, end_date, event_rows):
+    # For a date range whose tiles come from kpi_cube: the attendees of the
+    # events in range and everyone those events and attendees join on,
+    # whatever their own dates, so drill-down counts match the tiles. None
+    # when the tiles are computed from these raw rows too.
+    if not (start_date or end_date) or region not in KPI_REGIONS or not _kpi_cube_ready():
+        return None
+    try:
+        return load_event_joins(DB_CLIENT, event_rows)
+    except Exception as e:
+        print(f"KPI Joins Error: {e}")
+        return None
 
-@st.cache_data(show_spinner=False, ttl=300)
-def fetch_supabase_data(region, start_date=None, end_date=None):
+def fetch_kpi_state_summary(region, start_date=None, end_date=None):
+    # Headline KPIs for any date range by summing the kpi_cube day buckets
+    # (sql/kpi_state.sql), which the sync and imports keep up to date. None
+    # until the cube is built, in which case callers compute from raw rows.
+    if DB_TYPE != 'supabase' or region not in KPI_REGIONS or not _kpi_cube_ready():
+        return None
+    start_day = start_date.date().isoformat() if start_date is not None else None
+    end_day = end_date.date().isoformat() if end_date is not None else None
+    return _kpi_cube_summary_store(region, start_day, end_day, get_dashboard_data_version())
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_supabase_data_store(region, start_date, end_date, include_details, data_version):
     if DB_TYPE != 'supabase':
         return None
-    start_iso = start_date.isoformat() if start_date else None
-    end_iso = end_date.isoformat() if end_date else None
+    start_iso, end_iso = _kpi_range_bounds(start_date, end_date)
 
     fetch_errors = []
     def _safe_fetch(table, columns, date_field):
@@ -3739,7 +3076,12 @@ def fetch_supabase_data(region, start_date=None, end_date=None):
     org_rows = _safe_fetch("beacon_organisations", "payload, created_at", "created_at")
     # For events, we need the region column as well to ensure robust mapping.
     event_rows = _safe_fetch("beacon_events", "payload, start_date, region", "start_date")
-    attendee_rows = _safe_fetch("beacon_event_attendees", "payload, event_id, person_id, created_at", "created_at")
+    joins = _kpi_range_joins(region, start_date, end_date, event_rows)
+    if joins is None:
+        attendee_rows = _safe_fetch("beacon_event_attendees", "payload, event_id, person_id, created_at", "created_at")
+        linked_people_rows = []
+    else:
+        attendee_rows, linked_people_rows = joins
     payment_rows = _safe_fetch("beacon_payments", "payload, payment_date", "payment_date")
     grant_rows = _safe_fetch("beacon_grants", "payload, close_date", "close_date")
 
@@ -3758,13 +3100,31 @@ def fetch_supabase_data(region, start_date=None, end_date=None):
     payments = _rows_to_payloads(payment_rows, date_field="payment_date")
     grants = _rows_to_payloads(grant_rows, date_field="close_date")
     event_attendee_records = _build_event_attendee_records(attendee_rows)
+    linked_people = _rows_to_payloads(linked_people_rows, date_field="created_at")
 
-    result = compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records=event_attendee_records)
+    result = compute_kpis(
+        region,
+        people,
+        organisations,
+        events,
+        payments,
+        grants,
+        event_attendee_records=event_attendee_records,
+        include_details=include_details,
+        linked_people=linked_people,
+    )
     result["_source"] = "supabase"
     return result
 
-@st.cache_data(show_spinner=False, ttl=300)
-def fetch_ml_dashboard_data(region, start_date=None, end_date=None):
+def fetch_supabase_data(region, start_date=None, end_date=None, include_details=True):
+    if not include_details:
+        summary = fetch_kpi_state_summary(region, start_date, end_date)
+        if summary is not None:
+            return summary
+    return _fetch_supabase_data_store(region, start_date, end_date, include_details, get_dashboard_data_version())
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_ml_dashboard_data_store(region, start_date, end_date, data_version):
     if DB_TYPE != 'supabase':
         return None
     start_iso = start_date.isoformat() if start_date else None
@@ -3794,8 +3154,11 @@ def fetch_ml_dashboard_data(region, start_date=None, end_date=None):
     result["_source"] = "supabase_ml"
     return result
 
-@st.cache_data(show_spinner=False, ttl=300)
-def fetch_funder_dashboard_data(region, start_date=None, end_date=None, include_summary=True):
+def fetch_ml_dashboard_data(region, start_date=None, end_date=None):
+    return _fetch_ml_dashboard_data_store(region, start_date, end_date, get_dashboard_data_version())
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_funder_dashboard_data_store(region, start_date, end_date, include_summary, data_version):
     if DB_TYPE != 'supabase':
         return None
     start_iso = start_date.isoformat() if start_date else None
@@ -3825,16 +3188,122 @@ def fetch_funder_dashboard_data(region, start_date=None, end_date=None, include_
     events = _rows_to_payloads(event_rows, date_field="start_date", region_field="region")
     payments = _rows_to_payloads(payment_rows, date_field="payment_date")
     grants = _rows_to_payloads(grant_rows, date_field="close_date")
-    result = compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records={})
+    result = compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records={}, include_details=False)
     result["_source"] = "supabase_funder"
     return result
 
+def fetch_funder_dashboard_data(region, start_date=None, end_date=None, include_summary=True):
+    return _fetch_funder_dashboard_data_store(region, start_date, end_date, include_summary, get_dashboard_data_version())
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_funder_income_store(funder_key, start_date, end_date, data_version):
+    start_iso = start_date.isoformat() if start_date else None
+    end_iso = end_date.isoformat() if end_date else None
+    try:
+        payment_rows = _fetch_supabase_rows(
+            "beacon_payments", "payload, payment_date", "payment_date", start_iso, end_iso, filters={"funder_key": funder_key}
+        )
+        grant_rows = _fetch_supabase_rows(
+            "beacon_grants", "payload, close_date", "close_date", start_iso, end_iso, filters={"funder_key": funder_key}
+        )
+    except Exception as e:
+        print(f"Funder Income Error: {e}")
+        return None
+    return {
+        "payments": _rows_to_payloads(payment_rows, date_field="payment_date"),
+        "grants": _rows_to_payloads(grant_rows, date_field="close_date"),
+    }
+
 @st.cache_data(show_spinner=False, ttl=300)
-def fetch_kpi_section_data(section, region, start_date=None, end_date=None):
+def _funder_rollups_ready():
+    # True once funder_income_rollups exists and a sync/import has filled it.
+    try:
+        rows = DB_CLIENT.table("funder_income_rollups").select("funder_key").limit(1).execute().data or []
+    except Exception as e:
+        print(f"Funder Rollups Error: {e}")
+        return False
+    return bool(rows)
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_funder_income_rollups_store(funder_key, start_day, end_day, data_version):
+    try:
+        return _fetch_supabase_rows(
+            "funder_income_rollups",
+            "source, stage, income_date, row_count, amount",
+            "income_date",
+            start_day,
+            end_day,
+            filters={"funder_key": funder_key},
+        )
+    except Exception as e:
+        print(f"Funder Rollups Error: {e}")
+        return None
+
+def fetch_funder_income_rollups(funder_key, start_date=None, end_date=None):
+    # One funder's daily income totals (sql/funder_income_rollups.sql); None
+    # until the rollups are available, in which case callers use raw rows.
+    if DB_TYPE != 'supabase' or not funder_key or not _funder_rollups_ready():
+        return None
+    start_day = start_date.date().isoformat() if start_date is not None else None
+    end_day = end_date.date().isoformat() if end_date is not None else None
+    return _fetch_funder_income_rollups_store(funder_key, start_day, end_day, get_dashboard_data_version())
+
+def summarise_funder_income(payments, grants):
+    # (total funds, bids submitted, income trend rows) from payment/grant payloads.
+    total_funds = sum(_coerce_money(r.get("amount")) for r in payments)
+    total_funds += sum(
+        _coerce_money(r.get("amount"))
+        for r in grants
+        if str(r.get("stage") or "").strip().lower() == "won"
+    )
+    bids_submitted = sum(
+        1
+        for r in grants
+        if any(x in str(r.get("stage") or "").lower() for x in BID_STAGE_TOKENS)
+    )
+    income_rows = []
+    for row in payments:
+        income_rows.append({
+            "date": row.get("payment_date"),
+            "source": "Payments",
+            "amount": _coerce_money(row.get("amount")),
+        })
+    for row in grants:
+        income_rows.append({
+            "date": row.get("close_date"),
+            "source": "Grants",
+            "amount": _coerce_money(row.get("amount")),
+        })
+    return total_funds, bids_submitted, income_rows
+
+def summarise_funder_rollups(rollups):
+    # Same figures as summarise_funder_income, from funder_income_rollups rows.
+    total_funds = 0.0
+    bids_submitted = 0
+    income_rows = []
+    for row in rollups:
+        amount = float(row.get("amount") or 0)
+        stage = row.get("stage") or ""
+        if row.get("source") == "Payments" or stage == "won":
+            total_funds += amount
+        if row.get("source") == "Grants" and any(x in stage for x in BID_STAGE_TOKENS):
+            bids_submitted += int(row.get("row_count") or 0)
+        income_rows.append({"date": row.get("income_date"), "source": row.get("source"), "amount": amount})
+    return total_funds, bids_submitted, income_rows
+
+def fetch_funder_income(funder_key, start_date=None, end_date=None):
+    # One funder's payments and grants through the funder_key index; None if
+    # the column isn't there or filled in yet, in which case callers filter
+    # payloads.
+    if DB_TYPE != 'supabase' or not funder_key or not _funder_keys_filled():
+        return None
+    return _fetch_funder_income_store(funder_key, start_date, end_date, get_dashboard_data_version())
+
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_kpi_section_data_store(section, region, start_date, end_date, include_details, data_version):
     if DB_TYPE != 'supabase':
         return None
-    start_iso = start_date.isoformat() if start_date else None
-    end_iso = end_date.isoformat() if end_date else None
+    start_iso, end_iso = _kpi_range_bounds(start_date, end_date)
     fetch_errors = []
 
     def _safe_fetch(table, columns, date_field):
@@ -3850,6 +3319,7 @@ def fetch_kpi_section_data(section, region, start_date=None, end_date=None):
     attendee_rows = []
     payment_rows = []
     grant_rows = []
+    linked_people_rows = []
 
     if section in {"Governance", "Delivery"}:
         people_rows = _safe_fetch("beacon_people", "payload, created_at", "created_at")
@@ -3857,7 +3327,11 @@ def fetch_kpi_section_data(section, region, start_date=None, end_date=None):
         org_rows = _safe_fetch("beacon_organisations", "payload, created_at", "created_at")
     if section == "Delivery":
         event_rows = _safe_fetch("beacon_events", "payload, start_date, region", "start_date")
-        attendee_rows = _safe_fetch("beacon_event_attendees", "payload, event_id, person_id, created_at", "created_at")
+        joins = _kpi_range_joins(region, start_date, end_date, event_rows)
+        if joins is None:
+            attendee_rows = _safe_fetch("beacon_event_attendees", "payload, event_id, person_id, created_at", "created_at")
+        else:
+            attendee_rows, linked_people_rows = joins
     if section == "Income":
         payment_rows = _safe_fetch("beacon_payments", "payload, payment_date", "payment_date")
         grant_rows = _safe_fetch("beacon_grants", "payload, close_date", "close_date")
@@ -3873,11 +3347,29 @@ def fetch_kpi_section_data(section, region, start_date=None, end_date=None):
     payments = _rows_to_payloads(payment_rows, date_field="payment_date")
     grants = _rows_to_payloads(grant_rows, date_field="close_date")
     event_attendee_records = _build_event_attendee_records(attendee_rows)
-    result = compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records=event_attendee_records)
+    linked_people = _rows_to_payloads(linked_people_rows, date_field="created_at")
+    result = compute_kpis(
+        region,
+        people,
+        organisations,
+        events,
+        payments,
+        grants,
+        event_attendee_records=event_attendee_records,
+        include_details=include_details,
+        linked_people=linked_people,
+    )
     result["_source"] = "supabase_kpi_section"
     result["_section"] = section
     return result
 
+def fetch_kpi_section_data(section, region, start_date=None, end_date=None, include_details=True):
+    if not include_details:
+        summary = fetch_kpi_state_summary(region, start_date, end_date)
+        if summary is not None:
+            return {**summary, "_section": section}
+    return _fetch_kpi_section_data_store(section, region, start_date, end_date, include_details, get_dashboard_data_version())
+
 @st.cache_data(show_spinner=False, ttl=120)
 def get_last_refresh_timestamp():
     if DB_TYPE != 'supabase':
@@ -3910,46 +3402,37 @@ def get_last_refresh_timestamp():
     except Exception:
         return None
 
+def _sync_job_store():
+    if DB_TYPE == 'supabase':
+        SYNC_JOB_STORE.bind(get_admin_client)
+    return SYNC_JOB_STORE
+
 def _set_sync_job_state(job_id, **updates):
-    with SYNC_JOBS_LOCK:
-        state = SYNC_JOBS.get(job_id) or {}
-        state.update(updates)
-        SYNC_JOBS[job_id] = state
-        return state
+    return _sync_job_store().update(job_id, **updates)
 
 def _get_sync_job_state(job_id):
-    with SYNC_JOBS_LOCK:
-        state = SYNC_JOBS.get(job_id)
-        return dict(state) if state else None
+    return _sync_job_store().get(job_id)
 
 def _find_recent_sync_job_id(user_email=None, max_age_seconds=7200):
-    now_ts = time.time()
-    with SYNC_JOBS_LOCK:
-        candidates = []
-        for job_id, state in SYNC_JOBS.items():
-            created_at = state.get("created_at") or state.get("started_at") or now_ts
-            if (now_ts - created_at) > max_age_seconds:
-                continue
-            if user_email and state.get("user_email") not in (user_email, "System"):
-                continue
-            candidates.append((created_at, job_id))
-    if not candidates:
-        return None
-    candidates.sort(reverse=True)
-    return candidates[0][1]
+    return _sync_job_store().recent_local_job_id(user_email, max_age_seconds=max_age_seconds)
 
-def _insert_system_audit(admin_client, action, details, user_email="System", region="Global"):
+def _insert_system_audit(admin_client, action, details, user_email="System", region="Global", flush=False):
     try:
-        admin_client.table("audit_logs").insert({
-            "user_email": user_email or "System",
-            "action": action,
-            "details": details or {},
-            "region": region or "Global",
-        }).execute()
+        writer = get_audit_writer("system", lambda: admin_client)
+        if writer:
+            writer.write({
+                "user_email": user_email or "System",
+                "action": action,
+                "details": details or {},
+                "region": region or "Global",
+            }, flush=flush)
     except Exception as e:
         print(f"Audit Log Error: {e}")
 
 def _log_manual_sync_progress(admin_client, user_email, region, job_id, progress, message):
+    # Progress rows only matter for status reconstruction when sync_jobs is unavailable.
+    if _sync_job_store().durable:
+        return
     _insert_system_audit(
         admin_client,
         "Data Sync Progress",
@@ -3967,6 +3450,14 @@ def _log_manual_sync_progress(admin_client, user_email, region, job_id, progress
 def get_latest_manual_sync_state(user_email=None, lookback_rows=300):
     if DB_TYPE != 'supabase':
         return None
+    store = _sync_job_store()
+    state = store.latest(user_email)
+    if state or store.durable:
+        return state
+    return _latest_sync_state_from_audit_logs(user_email=user_email, lookback_rows=lookback_rows)
+
+def _latest_sync_state_from_audit_logs(user_email=None, lookback_rows=300):
+    # Fallback for databases without the sync_jobs table (sql/sync_jobs.sql).
     try:
         resp = (
             DB_CLIENT.table("audit_logs")
@@ -4099,11 +3590,11 @@ def _run_manual_sync_job(job_id):
         {"source": "beacon_api", "trigger": "manual_ui", "job_id": job_id},
         user_email=user_email,
         region=region,
+        flush=True,
     )
 
     def _is_cancel_requested():
-        current_state = _get_sync_job_state(job_id) or {}
-        return bool(current_state.get("cancel_requested"))
+        return _sync_job_store().cancel_requested(job_id)
 
     last_logged_progress = {"value": -1}
     def _sync_job_progress(progress, message):
@@ -4125,7 +3616,7 @@ def _run_manual_sync_job(job_id):
         result["source"] = "beacon_api"
         result["trigger"] = "manual_ui"
         result["job_id"] = job_id
-        _insert_system_audit(admin_client, "Data Sync Completed", result, user_email=user_email, region=region)
+        _insert_system_audit(admin_client, "Data Sync Completed", result, user_email=user_email, region=region, flush=True)
         _set_sync_job_state(
             job_id,
             status="completed",
@@ -4141,6 +3632,7 @@ def _run_manual_sync_job(job_id):
             {"source": "beacon_api", "trigger": "manual_ui", "job_id": job_id},
             user_email=user_email,
             region=region,
+            flush=True,
         )
         _set_sync_job_state(
             job_id,
@@ -4156,6 +3648,7 @@ def _run_manual_sync_job(job_id):
             {"source": "beacon_api", "trigger": "manual_ui", "job_id": job_id, "error": str(e)},
             user_email=user_email,
             region=region,
+            flush=True,
         )
         _set_sync_job_state(
             job_id,
@@ -4166,48 +3659,89 @@ def _run_manual_sync_job(job_id):
             error=str(e),
         )
 
+def _sync_worker_mode():
+    # thread: run in this server (default); worker: leave the job for a
+    # running sync_worker.py; subprocess: launch sync_worker.py --once per job.
+    mode = str(_get_secret_or_env("SYNC_WORKER_MODE", "thread") or "thread").strip().lower()
+    return mode if mode in ("thread", "worker", "subprocess") else "thread"
+
+def _spawn_sync_worker():
+    env = dict(os.environ)
+    try:
+        if "supabase" in st.secrets:
+            env["SUPABASE_URL"] = str(st.secrets["supabase"]["url"])
+            env["SUPABASE_SERVICE_ROLE_KEY"] = str(st.secrets["supabase"]["key"])
+    except Exception as e:
+        print(f"Sync Worker Error: {e}")
+    for key in ("BEACON_API_KEY", "BEACON_ACCOUNT_ID", "BEACON_BASE_URL", "BEACON_EVENT_ATTENDEES_ENDPOINT"):
+        value = _get_secret_or_env(key)
+        if value:
+            env[key] = str(value)
+    worker_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sync_worker.py")
+    subprocess.Popen([sys.executable, worker_path, "--once"], env=env, start_new_session=True)
+
 def start_manual_sync_job(user_email, region):
     audit_state = get_latest_manual_sync_state(user_email=user_email)
     if audit_state and audit_state.get("status") == "running":
         return audit_state.get("job_id"), "A manual sync is already running. Showing its progress."
 
-    with SYNC_JOBS_LOCK:
-        for running_job_id, state in SYNC_JOBS.items():
-            if state.get("status") == "running":
-                return running_job_id, "A manual sync is already running. Showing its progress."
-        job_id = uuid.uuid4().hex[:10]
-        SYNC_JOBS[job_id] = {
-            "job_id": job_id,
-            "status": "queued",
-            "progress": 0,
-            "message": "Queued...",
-            "created_at": time.time(),
-            "user_email": user_email,
-            "region": region,
-        }
+    job_fields = {
+        "source": "beacon_api",
+        "trigger": "manual_ui",
+        "status": "queued",
+        "progress": 0,
+        "message": "Queued...",
+        "created_at": time.time(),
+        "user_email": user_email,
+        "region": region,
+    }
+    mode = _sync_worker_mode()
+    if mode != "thread":
+        job_id, created = _sync_job_store().enqueue(uuid.uuid4().hex[:10], **job_fields)
+        if job_id and not created:
+            return job_id, "A manual sync is already running. Showing its progress."
+        if created:
+            if mode == "subprocess":
+                try:
+                    _spawn_sync_worker()
+                except Exception as e:
+                    _set_sync_job_state(
+                        job_id,
+                        status="failed",
+                        progress=100,
+                        message="Could not start the sync worker.",
+                        ended_at=time.time(),
+                        error=str(e),
+                    )
+                    return job_id, f"Could not start the sync worker: {e}"
+            return job_id, None
+        # No sync_jobs table to queue through; run in this process instead.
+
+    job_id, created = _sync_job_store().claim(uuid.uuid4().hex[:10], **job_fields)
+    if not created:
+        return job_id, "A manual sync is already running. Showing its progress."
     SYNC_EXECUTOR.submit(_run_manual_sync_job, job_id)
     return job_id, None
 
 def stop_manual_sync_job(job_id, user_email=None, region=None):
     if not job_id:
         return False, "No active manual sync job found."
-    with SYNC_JOBS_LOCK:
-        state = SYNC_JOBS.get(job_id)
-        if not state:
-            return False, "Manual sync job not found."
-        status = state.get("status")
-        if status in ("completed", "failed", "cancelled"):
-            return False, f"Manual sync is already {status}."
-        if status == "queued":
-            state["status"] = "cancelled"
-            state["progress"] = 100
-            state["message"] = "Manual sync cancelled before start."
-            state["ended_at"] = time.time()
-            SYNC_JOBS[job_id] = state
-        else:
-            state["cancel_requested"] = True
-            state["message"] = "Cancellation requested..."
-            SYNC_JOBS[job_id] = state
+    state = _get_sync_job_state(job_id)
+    if not state:
+        return False, "Manual sync job not found."
+    status = state.get("status")
+    if status in ("completed", "failed", "cancelled"):
+        return False, f"Manual sync is already {status}."
+    if status == "queued":
+        _set_sync_job_state(
+            job_id,
+            status="cancelled",
+            progress=100,
+            message="Manual sync cancelled before start.",
+            ended_at=time.time(),
+        )
+    else:
+        _set_sync_job_state(job_id, cancel_requested=True, message="Cancellation requested...")
     admin_client = get_admin_client()
     if admin_client:
         _insert_system_audit(
@@ -4222,14 +3756,14 @@ def stop_manual_sync_job(job_id, user_email=None, region=None):
 def clear_manual_sync_job(job_id, user_email=None, region=None):
     if not job_id:
         return False, "No manual sync job selected."
-    with SYNC_JOBS_LOCK:
-        state = SYNC_JOBS.get(job_id)
-        if state:
-            state["status"] = "cancelled"
-            state["progress"] = 100
-            state["message"] = "Manual sync cleared by user."
-            state["ended_at"] = time.time()
-            SYNC_JOBS[job_id] = state
+    if _get_sync_job_state(job_id):
+        _set_sync_job_state(
+            job_id,
+            status="cancelled",
+            progress=100,
+            message="Manual sync cleared by user.",
+            ended_at=time.time(),
+        )
     st.session_state.pop("manual_sync_job_id", None)
     admin_client = get_admin_client()
     if admin_client:
@@ -4239,6 +3773,7 @@ def clear_manual_sync_job(job_id, user_email=None, region=None):
             {"source": "beacon_api", "trigger": "manual_ui", "job_id": job_id},
             user_email=user_email or st.session_state.get("email", "System"),
             region=region or st.session_state.get("region", "Global"),
+            flush=True,
         )
     return True, "Stuck sync state cleared."
 
@@ -4272,11 +3807,38 @@ def render_manual_sync_status():
         if not state:
             return None, False
 
+    if state.get("status") == "completed":
+        # The job may have finished in another process; refresh cached data once.
+        cache_key = f"_manual_sync_cache_cleared_{state.get('job_id') or job_id}"
+        if not st.session_state.get(cache_key):
+            st.cache_data.clear()
+            bump_dashboard_data_version()
+            st.session_state[cache_key] = True
+
     # Auto-hide finished sync states from sidebar once handled.
     if state.get("status") in ("completed", "failed", "cancelled"):
         st.session_state.pop("manual_sync_job_id", None)
         return state, False
 
+    job_id = state.get("job_id") or job_id
+    with st.sidebar:
+        if state.get("status") in ("queued", "running"):
+            _manual_sync_sidebar_fragment(job_id)
+        else:
+            _render_manual_sync_sidebar(state)
+    return state, state.get("status") in ("queued", "running")
+
+@st.fragment(run_every=SYNC_PROGRESS_REFRESH_SECONDS)
+def _manual_sync_sidebar_fragment(job_id):
+    # Only this widget reruns on the timer; the page reruns once when the job ends.
+    state = _get_sync_job_state(job_id)
+    if not state:
+        return
+    if state.get("status") not in ("queued", "running"):
+        st.rerun()
+    _render_manual_sync_sidebar(state)
+
+def _render_manual_sync_sidebar(state):
     status = state.get("status", "unknown")
     progress = int(state.get("progress", 0))
     message = state.get("message", "Working...")
@@ -4286,8 +3848,8 @@ def render_manual_sync_status():
     if started_at:
         elapsed = (ended_at or time.time()) - started_at
 
-    st.sidebar.markdown("### Manual Sync Status")
-    st.sidebar.progress(progress, text=message)
+    st.markdown("### Manual Sync Status")
+    st.progress(progress, text=message)
     toast_class = "sync-toast-running"
     if status == "completed":
         toast_class = "sync-toast-complete"
@@ -4295,43 +3857,47 @@ def render_manual_sync_status():
         toast_class = "sync-toast-failed"
     elif status == "cancelled":
         toast_class = "sync-toast-failed"
-    st.sidebar.markdown(
+    st.markdown(
         f"<div class='sync-toast {toast_class}'>Sync {status.title()} | {progress}%<br>{message}</div>",
         unsafe_allow_html=True,
     )
     if status == "running":
-        st.sidebar.info(f"Status: Running ({progress}%)")
+        st.info(f"Status: Running ({progress}%)")
     elif status == "queued":
-        st.sidebar.info("Status: Queued")
+        st.info("Status: Queued")
     elif status == "completed":
-        st.sidebar.success("Status: Completed")
+        st.success("Status: Completed")
     elif status == "failed":
-        st.sidebar.error("Status: Failed")
+        st.error("Status: Failed")
     elif status == "cancelled":
-        st.sidebar.warning("Status: Cancelled")
+        st.warning("Status: Cancelled")
     else:
-        st.sidebar.warning(f"Status: {status}")
+        st.warning(f"Status: {status}")
 
     if elapsed is not None:
-        st.sidebar.caption(f"Elapsed: {elapsed:.1f}s")
+        st.caption(f"Elapsed: {elapsed:.1f}s")
         if status in ("queued", "running") and progress > 3:
             remaining = max(0.0, elapsed * (100 - progress) / progress)
-            st.sidebar.caption(f"ETA: {remaining:.1f}s")
+            st.caption(f"ETA: {remaining:.1f}s")
 
     if status == "completed":
         result = state.get("result") or {}
-        st.sidebar.caption(
+        st.caption(
             f"Updated P:{result.get('people', 0)} O:{result.get('organisations', 0)} "
             f"E:{result.get('events', 0)} Pay:{result.get('payments', 0)} G:{result.get('grants', 0)}"
         )
-        cache_key = f"_manual_sync_cache_cleared_{job_id}"
-        if not st.session_state.get(cache_key):
-            st.cache_data.clear()
-            st.session_state[cache_key] = True
     if status == "failed" and state.get("error"):
-        st.sidebar.caption(f"Error: {state.get('error')}")
+        st.caption(f"Error: {state.get('error')}")
 
-    return state, status in ("queued", "running")
+
+@st.fragment(run_every=SYNC_PROGRESS_REFRESH_SECONDS)
+def _manual_sync_main_panel_fragment(job_id):
+    state = _get_sync_job_state(job_id)
+    if not state:
+        return
+    if state.get("status") not in ("queued", "running"):
+        st.rerun()
+    render_manual_sync_main_panel(state)
 
 def render_manual_sync_main_panel(sync_state):
     if not sync_state:
@@ -4386,52 +3952,124 @@ def render_manual_sync_main_panel(sync_state):
     if status == "failed" and sync_state.get("error"):
         st.caption(f"Error details: {sync_state.get('error')}")
 
+# Deliberately excludes user/auth tables (e.g. user_roles, roles, auth users).
+DASHBOARD_RESET_TABLES = [
+    ("beacon_people", "id"),
+    ("beacon_organisations", "id"),
+    ("beacon_events", "id"),
+    ("beacon_event_attendees", "id"),
+    ("beacon_payments", "id"),
+    ("beacon_grants", "id"),
+    ("case_studies", "id"),
+    ("audit_logs", "id"),
+]
+# Built from the Beacon tables, so they are reset with them. Each has its own
+# sql/ file and may not exist yet; a missing one is skipped, not an error.
+DASHBOARD_DERIVED_TABLES = [
+    ("org_names", "ref_key"),
+    ("funder_income_rollups", "funder_key"),
+    ("kpi_contributions", "record_key"),
+    ("kpi_cube", "measure"),
+]
+DASHBOARD_RESET_WORKERS = 4
+DASHBOARD_RESET_BATCH_SIZE = 1000
+
+def _count_table_rows(admin_client, table, key):
+    try:
+        resp = admin_client.table(table).select(key, count="exact").limit(1).execute()
+        return int(resp.count or 0)
+    except Exception:
+        return None
+
+def _clear_table_rows(admin_client, table, key, on_deleted):
+    # One range delete per table; if that hits a statement timeout, fall back
+    # to deleting id batches so large tables still clear.
+    try:
+        resp = admin_client.table(table).delete(count="exact", returning="minimal").not_.is_(key, "null").execute()
+        deleted = int(resp.count or 0)
+        on_deleted(deleted)
+        return deleted
+    except Exception as e:
+        msg = str(e).lower()
+        if "statement timeout" not in msg and "57014" not in msg:
+            raise
+    deleted = 0
+    while True:
+        rows = admin_client.table(table).select(key).limit(DASHBOARD_RESET_BATCH_SIZE).execute().data or []
+        ids = [r.get(key) for r in rows if r.get(key) is not None]
+        if not ids:
+            return deleted
+        admin_client.table(table).delete(returning="minimal").in_(key, ids).execute()
+        deleted += len(ids)
+        on_deleted(len(ids))
+
 def clear_dashboard_data_except_users(admin_client, progress_callback=None):
-    # Deliberately excludes user/auth tables (e.g. user_roles, roles, auth users).
-    tables = [
-        ("beacon_people", "id"),
-        ("beacon_organisations", "id"),
-        ("beacon_events", "id"),
-        ("beacon_payments", "id"),
-        ("beacon_grants", "id"),
-        ("case_studies", "id"),
-        ("audit_logs", "id"),
-    ]
+    tables = DASHBOARD_RESET_TABLES + DASHBOARD_DERIVED_TABLES
     deleted = {}
     errors = []
 
-    total_tables = len(tables)
     if progress_callback:
         progress_callback(0, "Starting dashboard data reset...")
 
-    for idx, (table, key) in enumerate(tables):
+    # Fast path: one TRUNCATE via the reset_dashboard_data function (sql/reset_dashboard_data.sql).
+    try:
+        resp = admin_client.rpc("reset_dashboard_data", {"table_names": [t for t, _ in tables]}).execute()
+        counts = resp.data if isinstance(resp.data, dict) else {}
+        deleted = {table: int(counts.get(table) or 0) for table, _ in tables}
         if progress_callback:
-            start_pct = int((idx / total_tables) * 100)
-            progress_callback(start_pct, f"Clearing {table}...")
-        table_deleted = 0
-        while True:
-            try:
-                rows = admin_client.table(table).select(key).limit(500).execute().data or []
-            except Exception as e:
-                errors.append(f"{table}: {e}")
-                break
-
-            ids = [r.get(key) for r in rows if r.get(key) is not None]
-            if not ids:
-                break
-
-            try:
-                admin_client.table(table).delete().in_(key, ids).execute()
-                table_deleted += len(ids)
-            except Exception as e:
-                errors.append(f"{table}: {e}")
-                break
+            progress_callback(100, f"Cleared {len(tables)} tables: {sum(deleted.values())} rows.")
+        return deleted, errors
+    except Exception as e:
+        print(f"Dashboard Reset RPC unavailable, deleting per table: {e}")
 
-        deleted[table] = table_deleted
-        if progress_callback:
-            done_pct = int(((idx + 1) / total_tables) * 100)
-            progress_callback(done_pct, f"Cleared {table}: {table_deleted} rows.")
+    if progress_callback:
+        progress_callback(2, "Counting rows to clear...")
+    with ThreadPoolExecutor(max_workers=DASHBOARD_RESET_WORKERS) as pool:
+        totals = dict(zip(
+            [t for t, _ in tables],
+            pool.map(lambda tk: _count_table_rows(admin_client, *tk), tables),
+        ))
+    derived = {t for t, _ in DASHBOARD_DERIVED_TABLES}
+    tables = [(t, k) for t, k in tables if t not in derived or totals.get(t) is not None]
+    total_rows = sum(n for n in totals.values() if n)
+    done = {"rows": 0}
+    done_lock = threading.Lock()
+
+    def _on_deleted(count):
+        with done_lock:
+            done["rows"] += count
+
+    # Worker threads only count; progress is reported from this thread
+    # because Streamlit widgets can't be updated from other threads.
+    with ThreadPoolExecutor(max_workers=DASHBOARD_RESET_WORKERS) as pool:
+        futures = {pool.submit(_clear_table_rows, admin_client, table, key, _on_deleted): table for table, key in tables}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=0.5)
+            for future in finished:
+                table = futures[future]
+                try:
+                    deleted[table] = future.result()
+                except Exception as e:
+                    deleted[table] = 0
+                    errors.append(f"{table}: {e}")
+            if progress_callback:
+                with done_lock:
+                    rows_done = done["rows"]
+                tables_done = len(futures) - len(pending)
+                if total_rows:
+                    pct = 5 + int(94 * min(1.0, rows_done / total_rows))
+                else:
+                    pct = 5 + int(94 * tables_done / len(futures))
+                progress_callback(
+                    pct,
+                    f"Clearing dashboard data... {rows_done} of {total_rows} rows deleted "
+                    f"({tables_done} of {len(futures)} tables done).",
+                )
 
+    deleted = {table: deleted.get(table, 0) for table, _ in tables}
+    if progress_callback:
+        progress_callback(100, f"Cleared {len(tables)} tables: {sum(deleted.values())} rows.")
     return deleted, errors
 
 # --- UI COMPONENTS ---
@@ -4463,18 +4101,101 @@ def _gdpr_safe_count(value, threshold=5):
         return f"<{threshold}"
     return f"{max(0, n):,}"
 
+TABLE_PAGE_SIZES = (50, 150, 500, 1000)
+CSV_EXPORT_CHUNK_ROWS = 5000
+CSV_EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+def _iter_csv_chunks(df, chunk_rows=CSV_EXPORT_CHUNK_ROWS):
+    if df.empty:
+        yield df.to_csv(index=False).encode("utf-8")
+        return
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+def _csv_export_buffer(df):
+    # Chunks are written to a file that moves to disk past CSV_EXPORT_SPOOL_BYTES,
+    # read back once and closed so no temp file outlives the download.
+    with tempfile.SpooledTemporaryFile(max_size=CSV_EXPORT_SPOOL_BYTES) as buffer:
+        for chunk in _iter_csv_chunks(df):
+            buffer.write(chunk)
+        buffer.seek(0)
+        return buffer.read()
+
+def _filter_sort_df(df, query, sort_col, descending):
+    view = df
+    query = (query or "").strip()
+    if query:
+        mask = pd.Series(False, index=range(len(df)))
+        for idx in range(df.shape[1]):
+            col = df.iloc[:, idx]
+            mask |= col.astype(str).str.contains(query, case=False, regex=False, na=False).to_numpy()
+        view = df[mask.to_numpy()]
+    if sort_col is not None:
+        try:
+            view = view.sort_values(sort_col, ascending=not descending, kind="stable", na_position="last")
+        except Exception:
+            try:
+                view = view.sort_values(sort_col, ascending=not descending, kind="stable", na_position="last", key=lambda s: s.astype(str))
+            except Exception:
+                pass
+    return view
+
 def _show_df_limited(df, key, default_limit=150):
     df = _sanitize_dataframe_for_role(df)
     if df is None or df.empty:
         st.caption("No rows found for this selection.")
         return
     total_rows = len(df)
-    show_all = st.checkbox(f"Show all rows ({total_rows})", key=f"{key}_show_all", value=False)
-    if show_all or total_rows <= default_limit:
+    if total_rows <= default_limit:
         _safe_dataframe(df, width="stretch", hide_index=True)
-    else:
-        _safe_dataframe(df.head(default_limit), width="stretch", hide_index=True)
-        st.caption(f"Showing first {default_limit} of {total_rows} rows. Enable 'Show all rows' to view everything.")
+        return
+
+    # Large tables are filtered, sorted and paged here; only the current page is sent to the browser.
+    columns = [str(c) for c in df.columns]
+    page_sizes = sorted(set(TABLE_PAGE_SIZES) | {default_limit})
+    c_filter, c_sort, c_order, c_size = st.columns([3, 2, 1, 1])
+    query = c_filter.text_input("Filter rows", key=f"{key}_filter", placeholder="Contains...")
+    sort_choice = c_sort.selectbox("Sort by", ["(original order)"] + columns, key=f"{key}_sort")
+    descending = c_order.toggle("Desc", key=f"{key}_desc")
+    page_size = c_size.selectbox("Rows", page_sizes, index=page_sizes.index(default_limit), key=f"{key}_page_size")
+    sort_col = None
+    if sort_choice in columns and columns.count(sort_choice) == 1:
+        sort_col = df.columns[columns.index(sort_choice)]
+
+    view = _cached_df_view(
+        ("table_view", query.strip(), sort_choice, bool(descending)),
+        df,
+        lambda d: _filter_sort_df(d, query, sort_col, descending),
+    )
+    view_rows = len(view)
+    if view_rows == 0:
+        st.caption(f"No rows match '{query.strip()}' ({total_rows} rows in total).")
+        return
+    pages = max(1, math.ceil(view_rows / page_size))
+    # The widget is keyed by page count, so a filter that shrinks the view
+    # starts a fresh widget at the last page the user saw, clamped.
+    page_key = f"{key}_page"
+    page = min(int(st.session_state.get(page_key, 1)), pages)
+    page = int(
+        st.number_input(
+            f"Page (of {pages})", min_value=1, max_value=pages, value=page, step=1, key=f"{page_key}_of_{pages}"
+        )
+    )
+    st.session_state[page_key] = page
+    start = (page - 1) * page_size
+    end = min(start + page_size, view_rows)
+    _safe_dataframe(view.iloc[start:end], cache_view=False, width="stretch", hide_index=True)
+    filtered_note = f" (filtered from {total_rows})" if view_rows != total_rows else ""
+    st.caption(f"Rows {start + 1}-{end} of {view_rows}{filtered_note}.")
+
+    # The CSV is only built when the button is clicked, into a spooled file.
+    st.download_button(
+        "Download CSV of all matching rows",
+        data=lambda: _csv_export_buffer(view),
+        file_name=f"{key}.csv",
+        mime="text/csv",
+        key=f"{key}_csv_download",
+    )
 
 def _can_view_event_attendee_details():
     roles = _session_roles()
@@ -4532,22 +4253,28 @@ def _sanitize_record_for_role(record):
         sanitized[k] = sanitized_value
     return sanitized
 
-def _sanitize_dataframe_for_role(df):
-    if _can_view_personal_details() or df is None or df.empty:
-        return df
+def _has_nested_cells(series):
+    if not pd.api.types.is_object_dtype(series.dtype):
+        return False
+    return any(issubclass(t, (dict, list)) for t in series.map(type).unique())
+
+def _build_role_sanitized_df(df):
     keep_cols = []
     for c in df.columns:
         if _is_personal_field_name(c):
             continue
-        series = df[c]
-        has_nested_values = series.apply(lambda v: isinstance(v, (dict, list))).any()
-        if has_nested_values:
+        if _has_nested_cells(df[c]):
             continue
         keep_cols.append(c)
     if not keep_cols:
         return pd.DataFrame(index=df.index)
     return df[keep_cols].copy()
 
+def _sanitize_dataframe_for_role(df):
+    if _can_view_personal_details() or df is None or df.empty:
+        return df
+    return _cached_df_view("role_sanitized", df, _build_role_sanitized_df)
+
 def ml_dashboard():
     st.title("Mountain Leader Dashboard")
     st.caption("Select an event to see attendees plus medical and emergency contact details.")
@@ -4585,20 +4312,18 @@ def ml_dashboard():
             return str(value)
 
     def _event_label(event):
-        raw = event.get("raw_event") or {}
         name = _get_row_value(
             event,
             "name",
             "title",
             "event_name",
             "Display Name",
-        ) or _get_row_value(raw, "name", "title", "event_name", "Display Name") or str(event.get("id") or raw.get("id") or "Unnamed Event")
-        date_value = event.get("date") or raw.get("start_date") or raw.get("date")
-        return f"{name} ({_format_date(date_value)})"
+        ) or str(event.get("id") or "Unnamed Event")
+        return f"{name} ({_format_date(event.get('date'))})"
 
     sorted_events = sorted(
         events,
-        key=lambda e: _format_date(e.get("date") or (e.get("raw_event") or {}).get("start_date") or ""),
+        key=lambda e: _format_date(e.get("date") or ""),
         reverse=True,
     )
     labels = [_event_label(e) for e in sorted_events]
@@ -4609,7 +4334,8 @@ def ml_dashboard():
         key="ml_event_select",
     )
     selected_event = sorted_events[selected_idx]
-    raw_event = selected_event.get("raw_event") or {}
+    # Only the selected event's full payload is loaded.
+    raw_event = fetch_entity_payload("beacon_events", selected_event.get("id")) or {}
 
     def _format_value(value):
         if value is None:
@@ -4655,7 +4381,7 @@ def ml_dashboard():
         if norm:
             people_by_name.setdefault(norm, person)
         if person_id:
-            people_by_id[str(person_id)] = person
+            people_by_id[_entity_ref_key(person_id)] = person
 
     attendee_records = selected_event.get("attendee_records") or []
     attendee_options = []
@@ -4697,7 +4423,7 @@ def ml_dashboard():
         if display_name:
             attendee_record_by_name[_normalize_name(display_name)] = rec
         if person_id:
-            attendee_record_by_id[str(person_id)] = rec
+            attendee_record_by_id[_entity_ref_key(person_id)] = rec
         _add_option(label, display_name, person_id, record=rec)
 
     attendee_names = selected_event.get("participant_list") or []
@@ -4731,15 +4457,19 @@ def ml_dashboard():
         selected_record = selected_entry.get("record")
         person_record = None
         person_id = selected_entry.get("id")
-        if not selected_record and person_id and str(person_id) in attendee_record_by_id:
-            selected_record = attendee_record_by_id[str(person_id)]
+        if not selected_record and person_id and _entity_ref_key(person_id) in attendee_record_by_id:
+            selected_record = attendee_record_by_id[_entity_ref_key(person_id)]
         if not selected_record and selected_entry.get("name"):
             selected_record = attendee_record_by_name.get(_normalize_name(selected_entry["name"]))
-        if person_id and str(person_id) in people_by_id:
-            person_record = people_by_id[str(person_id)]
+        if person_id and _entity_ref_key(person_id) in people_by_id:
+            person_record = people_by_id[_entity_ref_key(person_id)]
         if not person_record and selected_entry.get("name"):
             norm = _normalize_name(selected_entry["name"])
             person_record = people_by_name.get(norm)
+        if selected_record:
+            selected_record = _expand_compact_record(selected_record)
+        if person_record:
+            person_record = _expand_compact_record(person_record)
         selected_person = person_record or selected_record
     else:
         st.caption("No attendee records available to view details.")
@@ -4893,33 +4623,47 @@ def funder_dashboard():
         start_date = pd.Timestamp(custom_start)
         end_date = pd.Timestamp(custom_end) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
 
-    data = fetch_funder_dashboard_data(
-        region_val,
-        start_date=start_date,
-        end_date=end_date,
-        include_summary=(role != "Funder"),
-    )
-    if not data:
-        st.error("No dashboard data is available for this public view.")
-        return
-
     def _funder_key(value):
         return _norm_key(value)
 
+    # A Funder only ever sees their own income, which the sync precomputes.
+    rollups = None
+    if role == "Funder":
+        rollups = fetch_funder_income_rollups(
+            _funder_key(assigned_funder or "Unknown / Not tagged"),
+            start_date=start_date,
+            end_date=end_date,
+        )
+    if rollups is not None:
+        data = {}
+    else:
+        data = fetch_funder_dashboard_data(
+            region_val,
+            start_date=start_date,
+            end_date=end_date,
+            include_summary=(role != "Funder"),
+        )
+        if not data:
+            st.error("No dashboard data is available for this public view.")
+            return
+
     raw_income = data.get("_raw_income", {}) or {}
     payments_all = raw_income.get("payments") or []
     grants_all = raw_income.get("grants") or []
-    org_name_lookup = get_organisation_name_lookup()
     funder_map = {}
-    for fname in get_assigned_funder_names():
-        fk = _funder_key(fname)
-        if fk and fk not in funder_map:
-            funder_map[fk] = fname
-    for row in payments_all + grants_all:
-        fname = _extract_funder_name(row, org_name_lookup=org_name_lookup)
-        fk = _funder_key(fname)
-        if fk and fk not in funder_map:
-            funder_map[fk] = fname
+    if role != "Funder":
+        funder_index = get_funder_index()
+        for fname in get_assigned_funder_names() + (funder_index or []):
+            fk = _funder_key(fname)
+            if fk and fk not in funder_map:
+                funder_map[fk] = fname
+        if funder_index is None:
+            org_name_lookup = get_organisation_name_lookup()
+            for row in payments_all + grants_all:
+                fname = _extract_funder_name(row, org_name_lookup=org_name_lookup)
+                fk = _funder_key(fname)
+                if fk and fk not in funder_map:
+                    funder_map[fk] = fname
 
     if role == "Funder":
         selected_funder = assigned_funder or "Unknown / Not tagged"
@@ -4930,25 +4674,30 @@ def funder_dashboard():
         selected_funder = st.selectbox("Funder", funder_options, index=0, key="funder_selector")
         selected_funder_key = _funder_key(selected_funder)
 
-    def _row_matches_funder(row):
-        if selected_funder == "All Funders":
-            return True
-        return _funder_key(_extract_funder_name(row, org_name_lookup=org_name_lookup)) == selected_funder_key
+    if rollups is not None:
+        filtered_payments = []
+        filtered_grants = []
+    elif selected_funder == "All Funders":
+        filtered_payments = payments_all
+        filtered_grants = grants_all
+    else:
+        funder_income = fetch_funder_income(selected_funder_key, start_date=start_date, end_date=end_date)
+        if funder_income is not None:
+            filtered_payments = funder_income["payments"]
+            filtered_grants = funder_income["grants"]
+        else:
+            org_name_lookup = get_organisation_name_lookup()
 
-    filtered_payments = [r for r in payments_all if _row_matches_funder(r)]
-    filtered_grants = [r for r in grants_all if _row_matches_funder(r)]
+            def _row_matches_funder(row):
+                return _funder_key(_extract_funder_name(row, org_name_lookup=org_name_lookup)) == selected_funder_key
 
-    filtered_total_funds = sum(_coerce_money(r.get("amount")) for r in filtered_payments)
-    filtered_total_funds += sum(
-        _coerce_money(r.get("amount"))
-        for r in filtered_grants
-        if str(r.get("stage") or "").strip().lower() == "won"
-    )
-    filtered_bids_submitted = sum(
-        1
-        for r in filtered_grants
-        if any(x in str(r.get("stage") or "").lower() for x in ["submitted", "review", "pending"])
-    )
+            filtered_payments = [r for r in payments_all if _row_matches_funder(r)]
+            filtered_grants = [r for r in grants_all if _row_matches_funder(r)]
+
+    if rollups is not None:
+        filtered_total_funds, filtered_bids_submitted, income_rows = summarise_funder_rollups(rollups)
+    else:
+        filtered_total_funds, filtered_bids_submitted, income_rows = summarise_funder_income(filtered_payments, filtered_grants)
 
     last_refresh = get_last_refresh_timestamp()
     if last_refresh:
@@ -4999,19 +4748,6 @@ def funder_dashboard():
         m2.metric("Total Funds Raised", f"£{float(filtered_total_funds or 0):,.2f}")
 
     st.markdown("### Income Trend (Aggregated, Funder Filtered)")
-    income_rows = []
-    for row in filtered_payments:
-        income_rows.append({
-            "date": row.get("payment_date"),
-            "source": "Payments",
-            "amount": _coerce_money(row.get("amount")),
-        })
-    for row in filtered_grants:
-        income_rows.append({
-            "date": row.get("close_date"),
-            "source": "Grants",
-            "amount": _coerce_money(row.get("amount")),
-        })
     if income_rows:
         income_df = pd.DataFrame(income_rows)
         income_df["date"] = pd.to_datetime(income_df["date"], errors="coerce")
@@ -5503,7 +5239,10 @@ def admin_dashboard():
                     st.rerun()
             if active_state:
                 with st.expander("Active Sync Progress", expanded=True):
-                    render_manual_sync_main_panel(active_state)
+                    if active_job_id and active_state.get("status") in ("queued", "running"):
+                        _manual_sync_main_panel_fragment(active_job_id)
+                    else:
+                        render_manual_sync_main_panel(active_state)
         else:
             st.info("Admin client not available. Check Supabase secrets.")
     else:
@@ -5520,27 +5259,43 @@ def admin_dashboard():
             if st.session_state.get("show_upload_dialog"):
                 @st.dialog("Upload Beacon Exports")
                 def _upload_dialog():
-                    people_file = st.file_uploader("People CSV", type=["csv"])
-                    org_file = st.file_uploader("Organisation CSV", type=["csv"])
-                    event_file = st.file_uploader("Event CSV", type=["csv"])
-                    payment_file = st.file_uploader("Payment CSV", type=["csv"])
-                    grant_file = st.file_uploader("Grant CSV", type=["csv"])
+                    upload_labels = {
+                        "people": "People CSV",
+                        "organization": "Organisation CSV",
+                        "event": "Event CSV",
+                        "payment": "Payment CSV",
+                        "grant": "Grant CSV",
+                    }
+                    uploads = {}
+                    for kind, label in upload_labels.items():
+                        uploads[kind] = st.file_uploader(label, type=["csv"])
+                        if uploads[kind] is not None:
+                            render_upload_mapping(kind, uploads[kind])
 
                     if st.button("Import"):
                         log_audit_event("Data Import Started", {"source": "beacon_csv"})
-                        uploads = {
-                            "people": _read_uploaded_csv(people_file),
-                            "organization": _read_uploaded_csv(org_file),
-                            "event": _read_uploaded_csv(event_file),
-                            "payment": _read_uploaded_csv(payment_file),
-                            "grant": _read_uploaded_csv(grant_file),
-                        }
-                        result = import_beacon_uploads(admin_client, uploads)
+                        import_progress = st.progress(0, text="Preparing import...")
+
+                        def _import_ui_progress(progress, message):
+                            import_progress.progress(int(max(0, min(100, progress))), text=message)
+
+                        result, import_errors = import_beacon_uploads(
+                            admin_client,
+                            uploads,
+                            progress_callback=_import_ui_progress,
+                        )
                         
                         # --- AUDIT LOG ---
-                        log_audit_event("Data Imported", {"source": "beacon_csv", **result})
+                        log_audit_event("Data Imported", {"source": "beacon_csv", **result, "errors": import_errors})
+                        st.cache_data.clear()
+                        bump_dashboard_data_version()
                         
-                        st.success(f"Imported: {result}")
+                        for kind, message in import_errors.items():
+                            st.error(f"{upload_labels[kind]}: {message}")
+                        if import_errors:
+                            st.warning(f"Imported with errors: {result}")
+                        else:
+                            st.success(f"Imported: {result}")
                         st.session_state["show_upload_dialog"] = False
                 _upload_dialog()
         else:
@@ -5584,6 +5339,7 @@ def admin_dashboard():
                     },
                 )
                 st.cache_data.clear()
+                bump_dashboard_data_version()
                 if delete_errors:
                     refresh_progress.progress(100, text="Dashboard data reset finished with errors.")
                     st.warning("Dashboard data reset completed with some errors. Check audit logs for details.")
@@ -5805,9 +5561,9 @@ def main_dashboard():
     if active_section == "Case Studies":
         data = {"region": region_val, "_raw_kpi": {}, "_debug": {}}
     elif show_debug:
-        data = fetch_supabase_data(region_val, start_date=start_date, end_date=end_date)
+        data = fetch_supabase_data(region_val, start_date=start_date, end_date=end_date, include_details=False)
     else:
-        data = fetch_kpi_section_data(active_section, region_val, start_date=start_date, end_date=end_date)
+        data = fetch_kpi_section_data(active_section, region_val, start_date=start_date, end_date=end_date, include_details=False)
     if not data:
         st.error("No Supabase data found for the selected filters.")
         return
@@ -5831,16 +5587,33 @@ def main_dashboard():
         e3.metric("Grants in Region", debug.get("region_grants", 0))
         e4.metric("Bids Submitted", debug.get("bids_submitted", 0))
 
-    raw_kpi = data.get("_raw_kpi") or {}
+    # Headline tiles come from the cheap load above; drill-down rows are built
+    # (and cached separately) the first time a details toggle is switched on.
+    raw_kpi_holder = {}
+
+    def _raw_kpi_rows(name):
+        if "rows" not in raw_kpi_holder:
+            if active_section == "Case Studies":
+                detailed = None
+            elif show_debug:
+                detailed = fetch_supabase_data(region_val, start_date=start_date, end_date=end_date)
+            else:
+                detailed = fetch_kpi_section_data(active_section, region_val, start_date=start_date, end_date=end_date)
+            raw_kpi_holder["rows"] = (detailed or {}).get("_raw_kpi") or {}
+        return raw_kpi_holder["rows"].get(name) or []
+
     current_role = st.session_state.get("role")
     assigned_region = st.session_state.get("region") or "Global"
 
     def _record_matches_region_scope(record, scope_region):
-        if not isinstance(record, dict):
+        if not isinstance(record, (dict, CompactRecord)):
             return False
         if not scope_region or str(scope_region).strip() == "" or str(scope_region) == "Global":
             return True
-        record_regions = _extract_region_tags(record)
+        if isinstance(record, CompactRecord):
+            record_regions = list(record.regions)
+        else:
+            record_regions = _extract_region_tags(record)
         if not record_regions and record.get("region") not in [None, ""]:
             record_regions = _to_list(record.get("region"))
         scope_norm = str(scope_region).strip().lower()
@@ -5872,8 +5645,7 @@ def main_dashboard():
         return pd.DataFrame(out)
 
     def _details_enabled(key, label="Load drill-down details"):
-        st.caption(label)
-        return True
+        return st.toggle(label, key=key, value=False)
 
     def _pretty_field_name(name):
         return str(name).replace("_", " ").strip().title()
@@ -5955,7 +5727,7 @@ def main_dashboard():
             format_func=lambda idx: labels[idx],
         )
         st.caption(f"Selected: {labels[selected_idx]}")
-        selected = _sanitize_record_for_role(rows[selected_idx])
+        selected = _sanitize_record_for_role(_expand_compact_record(rows[selected_idx]))
         _render_readable_record(selected, key_prefix=f"{key}_record")
         return selected
     
@@ -5976,7 +5748,7 @@ def main_dashboard():
                 if _details_enabled("lazy_gov_steering_active"):
                     _drilldown_caption("Permission scope.")
                     _render_deep_drilldown(
-                        _drilldown_rows(raw_kpi.get("steering_volunteers") or []),
+                        _drilldown_rows(_raw_kpi_rows("steering_volunteers")),
                         lambda r: _get_row_value(r, "name", "full_name", "Display Name", "email") or r.get("id"),
                         key="dd_gov_steering_active",
                         empty_msg="No steering source rows found for deeper drill-down.",
@@ -5987,7 +5759,7 @@ def main_dashboard():
                 width="stretch",
             ):
                 if _details_enabled("lazy_gov_steering_members"):
-                    steering_rows = _drilldown_rows(raw_kpi.get("steering_volunteers") or [])
+                    steering_rows = _drilldown_rows(_raw_kpi_rows("steering_volunteers"))
                     _drilldown_caption("Permission scope.")
                     steering_df = _rows_to_df(
                         steering_rows,
@@ -6014,7 +5786,7 @@ def main_dashboard():
                 width="stretch",
             ):
                 if _details_enabled("lazy_gov_new_volunteers"):
-                    volunteer_rows = _drilldown_rows(raw_kpi.get("volunteers") or [])
+                    volunteer_rows = _drilldown_rows(_raw_kpi_rows("volunteers"))
                     _drilldown_caption("Permission scope.")
                     volunteers_df = _rows_to_df(
                         volunteer_rows,
@@ -6056,7 +5828,7 @@ def main_dashboard():
             ):
                 st.markdown("**List of Organisations**")
                 if _details_enabled("lazy_part_active_orgs"):
-                    org_rows = _drilldown_rows(raw_kpi.get("region_orgs") or [])
+                    org_rows = _drilldown_rows(_raw_kpi_rows("region_orgs"))
                     _drilldown_caption("Permission scope.")
                     org_df = _rows_to_df(
                         org_rows,
@@ -6098,7 +5870,7 @@ def main_dashboard():
             ):
                 st.markdown("**List of Attendees by Event**")
                 if _details_enabled("lazy_del_events"):
-                    delivery_events = _drilldown_rows(raw_kpi.get("delivery_events") or [])
+                    delivery_events = _drilldown_rows(_raw_kpi_rows("delivery_events"))
                     _drilldown_caption("Permission scope.")
                     attendees_rows = []
                     for e in delivery_events:
@@ -6124,7 +5896,7 @@ def main_dashboard():
                 width="stretch",
             ):
                 if _details_enabled("lazy_del_participants"):
-                    delivery_events = _drilldown_rows(raw_kpi.get("delivery_events") or [])
+                    delivery_events = _drilldown_rows(_raw_kpi_rows("delivery_events"))
                     _drilldown_caption("Permission scope.")
                     delivery_df = _rows_to_df(
                         delivery_events,
@@ -6252,9 +6024,9 @@ def main_dashboard():
                     width="stretch",
                 ):
                     if _details_enabled("lazy_inc_total_funds"):
-                        payment_source_rows = _drilldown_rows(raw_kpi.get("region_payments") or [])
+                        payment_source_rows = _drilldown_rows(_raw_kpi_rows("region_payments"))
                         payment_rows = []
-                        grant_source_rows = _drilldown_rows(raw_kpi.get("region_grants") or [])
+                        grant_source_rows = _drilldown_rows(_raw_kpi_rows("region_grants"))
                         _drilldown_caption("Permission scope.")
                         for p in payment_source_rows:
                             payment_rows.append({
@@ -6296,7 +6068,7 @@ def main_dashboard():
                     width="stretch",
                 ):
                     if _details_enabled("lazy_inc_bids"):
-                        grant_source_rows = _drilldown_rows(raw_kpi.get("region_grants") or [])
+                        grant_source_rows = _drilldown_rows(_raw_kpi_rows("region_grants"))
                         _drilldown_caption("Permission scope.")
                         grant_rows = []
                         for g in grant_source_rows:
@@ -6324,7 +6096,7 @@ def main_dashboard():
                     width="stretch",
                 ):
                     if _details_enabled("lazy_inc_corp"):
-                        corp_rows = _drilldown_rows(raw_kpi.get("corporate_orgs") or [])
+                        corp_rows = _drilldown_rows(_raw_kpi_rows("corporate_orgs"))
                         _drilldown_caption("Permission scope.")
                         corp_df = _rows_to_df(
                             corp_rows,
@@ -6355,7 +6127,8 @@ def main_dashboard():
             def _to_float(val):
                 return _coerce_money(val)
 
-            rows = []
+            # Daily totals instead of raw rows when the figures come from kpi_cube.
+            rows = list(data.get("_income_rows") or [])
             for p in payments:
                 rows.append({
                     "date": p.get("payment_date"),
@@ -6825,6 +6598,13 @@ def _normalize_email_list(values):
         out.append(e)
     return out
 
+def _custom_reports_table_missing(exc):
+    # Databases without sql/custom_reports.sql keep reports in audit_logs only.
+    msg = str(exc).lower()
+    return "custom_reports" in msg and any(
+        token in msg for token in ("does not exist", "42p01", "pgrst205", "could not find the table")
+    )
+
 def save_custom_report(report_name, config, shared_with):
     report_id = uuid.uuid4().hex[:12]
     details = {
@@ -6835,7 +6615,26 @@ def save_custom_report(report_name, config, shared_with):
         "shared_with": _normalize_email_list(shared_with),
         "config": config or {},
     }
-    log_audit_event("Custom Report Saved", details)
+    if DB_TYPE == 'supabase':
+        now_iso = datetime.now(UTC).isoformat()
+        try:
+            DB_CLIENT.table("custom_reports").upsert({
+                "report_id": report_id,
+                "name": details["report_name"],
+                "owner_email": details["owner_email"],
+                "shared_with": details["shared_with"],
+                "config": details["config"],
+                "created_at": now_iso,
+                "updated_at": now_iso,
+            }).execute()
+        except Exception as e:
+            print(f"Custom Report Save Error: {e}")
+            if not _custom_reports_table_missing(e):
+                st.error(f"Report could not be saved: {e}")
+                return None
+    # The audit row is kept for the audit trail, and is the only copy when
+    # custom_reports is missing.
+    log_audit_event("Custom Report Saved", details, flush=True)
     get_accessible_custom_reports.clear()
     return report_id
 
@@ -6847,8 +6646,47 @@ def update_custom_report_sharing(report_id, report_name, shared_with):
         "owner_email": st.session_state.get("email", "").strip().lower(),
         "shared_with": _normalize_email_list(shared_with),
     }
-    log_audit_event("Custom Report Share Updated", details)
+    if DB_TYPE == 'supabase':
+        payload = {"shared_with": details["shared_with"], "updated_at": datetime.now(UTC).isoformat()}
+        if (report_name or "").strip():
+            payload["name"] = report_name.strip()
+        # Only the owner may change sharing; the owner filter makes anyone
+        # else's update match no rows.
+        try:
+            updated = (
+                DB_CLIENT.table("custom_reports")
+                .update(payload)
+                .eq("report_id", report_id)
+                .eq("owner_email", details["owner_email"])
+                .execute()
+                .data
+                or []
+            )
+        except Exception as e:
+            print(f"Custom Report Share Error: {e}")
+            # Without the table, _custom_reports_from_audit_logs applies the
+            # owner check when it reads the share rows back.
+            if not _custom_reports_table_missing(e):
+                st.error(f"Report sharing could not be updated: {e}")
+                return False
+        else:
+            if not updated:
+                st.error("Only the report's owner can change who it is shared with.")
+                return False
+    log_audit_event("Custom Report Share Updated", details, flush=True)
     get_accessible_custom_reports.clear()
+    return True
+
+def _custom_report_from_row(row):
+    return {
+        "report_id": row.get("report_id"),
+        "name": row.get("name") or "Untitled Report",
+        "owner_email": str(row.get("owner_email") or "").strip().lower(),
+        "shared_with": _normalize_email_list(row.get("shared_with") or []),
+        "config": row.get("config") or {},
+        "created_at": row.get("created_at"),
+        "updated_at": row.get("updated_at"),
+    }
 
 @st.cache_data(show_spinner=False, ttl=60)
 def get_accessible_custom_reports(user_email):
@@ -6857,6 +6695,25 @@ def get_accessible_custom_reports(user_email):
     email = (user_email or "").strip().lower()
     if not email:
         return []
+    columns = "report_id, name, owner_email, shared_with, config, created_at, updated_at"
+    try:
+        # Two index lookups: reports the user owns and reports shared with them.
+        owned = DB_CLIENT.table("custom_reports").select(columns).eq("owner_email", email).execute().data or []
+        shared = DB_CLIENT.table("custom_reports").select(columns).contains("shared_with", [email]).execute().data or []
+    except Exception as e:
+        print(f"Custom Reports Error: {e}")
+        return _custom_reports_from_audit_logs(email)
+
+    reports = {}
+    for row in owned + shared:
+        if row.get("report_id"):
+            reports[row["report_id"]] = _custom_report_from_row(row)
+    accessible = list(reports.values())
+    accessible.sort(key=lambda x: str(x.get("updated_at") or ""), reverse=True)
+    return accessible
+
+def _custom_reports_from_audit_logs(email):
+    """Rebuilds saved reports from audit_logs, for databases without the custom_reports table."""
     try:
         resp = (
             DB_CLIENT.table("audit_logs")
@@ -6879,6 +6736,9 @@ def get_accessible_custom_reports(user_email):
         if not report_id:
             continue
         rep = reports.get(report_id, {})
+        owner_email = str(details.get("owner_email") or "").strip().lower()
+        if row.get("action") != "Custom Report Saved" and rep.get("owner_email") and owner_email != rep["owner_email"]:
+            continue
         rep["report_id"] = report_id
         rep["name"] = details.get("report_name") or rep.get("name") or "Untitled Report"
         rep["owner_email"] = str(details.get("owner_email") or rep.get("owner_email") or "").strip().lower()
@@ -6897,8 +6757,8 @@ def get_accessible_custom_reports(user_email):
     accessible.sort(key=lambda x: str(x.get("updated_at") or ""), reverse=True)
     return accessible
 
-@st.cache_data(show_spinner=False, ttl=300)
-def fetch_custom_report_data(dataset_key, start_date=None, end_date=None):
+@st.cache_resource(show_spinner=False, ttl=300, max_entries=DASHBOARD_STORE_MAX_ENTRIES)
+def _fetch_custom_report_data_store(dataset_key, start_date, end_date, data_version):
     if DB_TYPE != 'supabase':
         return pd.DataFrame()
 
@@ -7005,6 +6865,9 @@ def fetch_custom_report_data(dataset_key, start_date=None, end_date=None):
     df["month"] = df["date"].dt.tz_localize(None).dt.to_period("M").astype(str)
     return df
 
+def fetch_custom_report_data(dataset_key, start_date=None, end_date=None):
+    return _fetch_custom_report_data_store(dataset_key, start_date, end_date, get_dashboard_data_version())
+
 def custom_reports_dashboard():
     st.title("Custom Reports Dashboard")
     st.caption("Build custom reports with table, pie, bar, line, UK map, and comparison analysis outputs.")
@@ -7486,7 +7349,7 @@ def main():
             f"(https://github.com/Scott-MoM/RPL-KPIs/actions/workflows/nightly-beacon-sync.yml/badge.svg?branch=main&t={badge_ts})"
             f"](https://github.com/Scott-MoM/RPL-KPIs/actions/workflows/nightly-beacon-sync.yml)"
         )
-        sync_state, sync_running = render_manual_sync_status()
+        render_manual_sync_status()
 
         # Last Data Refresh card
         last_refresh = get_last_refresh_timestamp()
@@ -7587,10 +7450,6 @@ def main():
 
         audit_user_interactions(current_view=current_view)
 
-        if sync_running and role == "Admin" and current_view == "Admin Dashboard":
-            time.sleep(1)
-            st.rerun()
-
 if __name__ == "__main__":
     main()
 
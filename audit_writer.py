@@ -0,0 +1,116 @@
+import atexit
+import queue
+import threading
+
+# Buffered audit_logs writer. Rows are queued on the request thread and a
+# background thread inserts them in batches, so audit logging doesn't add a
+# Supabase round trip to UI interactions. Lives in its own module so the
+# writer survives Streamlit reruns (the main script is re-executed, imported
+# modules are not).
+
+AUDIT_QUEUE_MAX = 5000
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL_SECONDS = 1.0
+
+
+class BufferedAuditWriter:
+    def __init__(
+        self,
+        client,
+        table="audit_logs",
+        max_queue=AUDIT_QUEUE_MAX,
+        batch_size=AUDIT_BATCH_SIZE,
+        flush_interval=AUDIT_FLUSH_INTERVAL_SECONDS,
+    ):
+        self._client = client
+        self._table = table
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row, flush=False):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Never block the UI on audit logging; count what was lost instead.
+            self.dropped += 1
+            print(f"Audit Log Error: queue full, dropped {self.dropped} row(s)")
+            return
+        if flush:
+            self.flush()
+        elif self._queue.qsize() >= self._batch_size:
+            self._wake.set()
+
+    def flush(self):
+        # Everything queued before this call is inserted when it returns.
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self._batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                self._insert(batch)
+
+    def close(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self.flush()
+
+    def _insert(self, batch):
+        try:
+            self._client.table(self._table).insert(batch).execute()
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Audit Log Error: {e}")
+                return
+        # One bad row shouldn't lose the whole batch.
+        for row in batch:
+            try:
+                self._client.table(self._table).insert(row).execute()
+            except Exception as e:
+                print(f"Audit Log Error: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Audit Log Error: {e}")
+
+
+_WRITERS = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def get_audit_writer(name, client_factory):
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(name)
+        if writer is None:
+            client = client_factory()
+            if client is None:
+                return None
+            writer = BufferedAuditWriter(client)
+            _WRITERS[name] = writer
+        return writer
+
+
+@atexit.register
+def close_audit_writers():
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+    for writer in writers:
+        writer.close()
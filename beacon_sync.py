@@ -0,0 +1,1126 @@
+import json
+import math
+import os
+import re
+import shutil
+import time
+from datetime import datetime, UTC
+
+import requests
+
+from beacon_utils import ContextMatcher, KeyedIdCollector, entity_ref_key, walk_payload
+
+# Beacon API -> Supabase sync engine shared by the app's manual sync,
+# sync_worker.py and the nightly sync_beacon_to_supabase.py job. Keep this
+# module free of Streamlit imports; callers resolve credentials themselves.
+
+BEACON_BASE_URL = "https://api.beaconcrm.org/v1/account/{account_id}"
+SYNC_CHECKPOINT_MAX_AGE_SECONDS = 24 * 3600
+UNKNOWN_FUNDER = "Unknown / Not tagged"
+ORG_NAMES_TABLE = "org_names"
+FUNDER_ROLLUPS_TABLE = "funder_income_rollups"
+# Columns added by later migrations (sql/funder_index.sql). Upserts drop them
+# and carry on when the target table doesn't have them yet.
+OPTIONAL_COLUMNS = ("funder_name", "funder_key")
+
+ATTENDEE_ENDPOINT_CANDIDATES = [
+    ("event_attendee", "event attendees"),
+    ("event_attendees", "event attendees"),
+    ("event_attendance", "event attendance"),
+    ("event_attendances", "event attendance"),
+    ("attendance", "attendance"),
+    ("attendees", "attendees"),
+    ("event_registration", "event registrations"),
+    ("event_registrations", "event registrations"),
+]
+
+# Fallback matchers for attendee payloads that don't use the usual event/person fields.
+ATTENDEE_EVENT_CONTEXT = ContextMatcher(("event", "activity", "session"))
+ATTENDEE_EVENT_ID = ContextMatcher(("id", "event"))
+ATTENDEE_PERSON_CONTEXT = ContextMatcher(("person", "contact", "participant", "attendee", "people"))
+ATTENDEE_PERSON_ID = ContextMatcher(("id", "person", "contact", "participant"))
+
+
+class SyncCancelledError(Exception):
+    pass
+
+
+def check_cancel(should_cancel):
+    if should_cancel and should_cancel():
+        raise SyncCancelledError("Manual sync cancelled by user.")
+
+
+# --- PAYLOAD HELPERS ---
+
+def clean_ts(value):
+    if value is None:
+        return None
+    s = str(value).strip()
+    return s if s else None
+
+
+def _is_nan(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+def to_list(value):
+    if value is None or _is_nan(value):
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    s = str(value).strip()
+    if not s:
+        return []
+    parts = [p.strip() for p in s.split(",") if p.strip()]
+    return parts if parts else [s]
+
+
+def sanitize(obj):
+    if isinstance(obj, dict):
+        return {k: sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [sanitize(v) for v in obj]
+    if _is_nan(obj):
+        return None
+    return obj
+
+
+def coerce_money(value):
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        for key in ("value", "amount", "total", "gross", "net"):
+            if key in value:
+                coerced = coerce_money(value.get(key))
+                if coerced != 0.0:
+                    return coerced
+        for nested in value.values():
+            coerced = coerce_money(nested)
+            if coerced != 0.0:
+                return coerced
+        return 0.0
+    if isinstance(value, (list, tuple, set)):
+        for item in value:
+            coerced = coerce_money(item)
+            if coerced != 0.0:
+                return coerced
+        return 0.0
+    s = str(value).replace("£", "").replace(",", "").strip()
+    try:
+        return float(s)
+    except Exception:
+        return 0.0
+
+
+def norm_key(value):
+    if value is None:
+        return ""
+    return "".join(ch for ch in str(value).lower() if ch.isalnum())
+
+
+def get_row_value(row, *keys):
+    if not row or not keys:
+        return None
+    try:
+        if any(k in row for k in keys):
+            for k in keys:
+                if k in row and row.get(k) not in [None, ""]:
+                    return row.get(k)
+    except Exception:
+        pass
+
+    normalized = {}
+    for k, v in row.items():
+        nk = norm_key(k)
+        if nk and nk not in normalized:
+            normalized[nk] = v
+
+    for k in keys:
+        nk = norm_key(k)
+        if nk in normalized and normalized[nk] not in [None, ""]:
+            return normalized[nk]
+    return None
+
+
+def extract_linked_id(value):
+    if isinstance(value, list):
+        for item in value:
+            extracted = extract_linked_id(item)
+            if extracted not in [None, ""]:
+                return extracted
+        return None
+    if isinstance(value, dict):
+        for key in ("id", "record_id", "value"):
+            if value.get(key) not in [None, ""]:
+                return value.get(key)
+        return None
+    return value
+
+
+def build_organisation_name_lookup(payloads):
+    lookup = {}
+    for payload in payloads:
+        org_id = (payload or {}).get("id")
+        org_name = get_row_value(payload, "name", "Organisation", "Organization", "Display Name")
+        if org_id is None or not org_name:
+            continue
+        key = entity_ref_key(org_id)
+        if key:
+            lookup[key] = str(org_name).strip()
+    return lookup
+
+
+def extract_funder_name(row, org_name_lookup=None):
+    name = get_row_value(
+        row,
+        "funder",
+        "funder_name",
+        "funding_body",
+        "funding_body_name",
+        "donor",
+        "donor_name",
+        "sponsor",
+        "sponsor_name",
+        "organisation",
+        "organization",
+        "organisation_name",
+        "organization_name",
+        "grantor",
+        "grantor_name",
+    )
+    if isinstance(name, dict):
+        display = get_row_value(name, "name", "title", "display_name")
+        if display:
+            name = display
+        else:
+            ref_id = name.get("id")
+            resolved = None
+            if org_name_lookup and ref_id is not None:
+                resolved = org_name_lookup.get(entity_ref_key(ref_id))
+            name = resolved or ""
+    if isinstance(name, list):
+        name = ", ".join(str(x) for x in name if str(x).strip())
+    value = str(name or "").strip()
+    if not value:
+        # Common fallback: organization field carries only an id reference.
+        ref = get_row_value(row, "organization", "organisation", "organisation_id", "organization_id")
+        if isinstance(ref, dict):
+            ref = ref.get("id")
+        if org_name_lookup and ref is not None:
+            mapped = org_name_lookup.get(entity_ref_key(ref))
+            if mapped:
+                return mapped
+        return UNKNOWN_FUNDER
+    # If value itself looks like an ID and can be resolved, prefer the readable name.
+    if org_name_lookup:
+        mapped = org_name_lookup.get(entity_ref_key(value))
+        if mapped:
+            return mapped
+    # Do not expose unresolved ID-like tokens in the dashboard.
+    key_like = entity_ref_key(value)
+    if key_like and (value.isdigit() or len(value) <= 16):
+        return UNKNOWN_FUNDER
+    return value
+
+
+def funder_columns(payload, org_name_lookup=None):
+    # Stored on beacon_payments/beacon_grants so the Funder Dashboard can
+    # filter with an indexed equality match on funder_key.
+    name = extract_funder_name(payload, org_name_lookup=org_name_lookup)
+    return {"funder_name": name, "funder_key": norm_key(name)}
+
+
+def extract_region_tags(record):
+    candidates = []
+    for key in (
+        "c_region",
+        "region",
+        "Region",
+        "location_region",
+        "location",
+        "Location (region)",
+        "Location Region",
+    ):
+        if key in record and record.get(key) not in [None, ""]:
+            candidates.extend(to_list(record.get(key)))
+    if isinstance(record.get("address"), list):
+        for addr in record.get("address"):
+            if isinstance(addr, dict):
+                if addr.get("region"):
+                    candidates.extend(to_list(addr.get("region")))
+                if addr.get("country"):
+                    candidates.extend(to_list(addr.get("country")))
+    seen = set()
+    out = []
+    for item in candidates:
+        s = str(item).strip()
+        if s and s.lower() not in seen:
+            seen.add(s.lower())
+            out.append(s)
+    return out
+
+
+# --- BEACON API ---
+
+def build_beacon_url(base_url, account_id, endpoint):
+    base = (base_url or "").strip()
+    if not base:
+        base = BEACON_BASE_URL
+    if "{account_id}" in base:
+        if not account_id:
+            raise ValueError("Missing BEACON_ACCOUNT_ID for base URL template.")
+        base = base.format(account_id=account_id)
+    base = base.rstrip("/")
+    if endpoint.startswith("/"):
+        return f"{base}{endpoint}"
+    if base.endswith("/entities"):
+        return f"{base}/{endpoint}"
+    return f"{base}/entities/{endpoint}"
+
+
+def extract_result_list(response_json):
+    if isinstance(response_json, list):
+        return response_json
+    if not isinstance(response_json, dict):
+        return []
+    if isinstance(response_json.get("results"), list):
+        return response_json.get("results") or []
+    if isinstance(response_json.get("data"), list):
+        return response_json.get("data") or []
+    return []
+
+
+def extract_total_count(response_json):
+    if not isinstance(response_json, dict):
+        return None
+    meta = response_json.get("meta")
+    if isinstance(meta, dict):
+        total = meta.get("total")
+        if isinstance(total, int):
+            return total
+    total = response_json.get("total")
+    if isinstance(total, int):
+        return total
+    return None
+
+
+def extract_page_progress(response_json):
+    if not isinstance(response_json, dict):
+        return None, None
+    meta = response_json.get("meta")
+    if isinstance(meta, dict):
+        current_page = meta.get("current_page")
+        total_pages = meta.get("total_pages")
+        if isinstance(current_page, int) and isinstance(total_pages, int):
+            return current_page, total_pages
+    current_page = response_json.get("current_page")
+    total_pages = response_json.get("total_pages")
+    if isinstance(current_page, int) and isinstance(total_pages, int):
+        return current_page, total_pages
+    return None, None
+
+
+def extract_entity(record):
+    if not isinstance(record, dict):
+        return {}
+    if isinstance(record.get("entity"), dict):
+        entity = dict(record.get("entity") or {})
+        # Preserve wrapper metadata/relationships when Beacon sends related data
+        # outside entity (common for participant links on events).
+        for k, v in record.items():
+            if k == "entity":
+                continue
+            if k not in entity:
+                entity[k] = v
+        return entity
+    return record
+
+
+def fetch_beacon_entities(
+    base_url,
+    api_key,
+    account_id,
+    endpoint,
+    per_page=50,
+    max_pages=200,
+    should_cancel=None,
+    start_page=1,
+    fetched_count=0,
+    on_page=None,
+):
+    # start_page/fetched_count resume a partly fetched endpoint; on_page is
+    # called with (page, rows) after each page so it can be checkpointed.
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Beacon-Application": "developer_api",
+    }
+    all_rows = []
+    page = start_page
+    while page <= max_pages:
+        check_cancel(should_cancel)
+        url = build_beacon_url(base_url, account_id, endpoint)
+        params = {
+            "page": page,
+            "per_page": per_page,
+            "sort_by": "created_at",
+            "sort_direction": "desc",
+        }
+        resp = None
+        for attempt in range(4):
+            check_cancel(should_cancel)
+            resp = requests.get(url, headers=headers, params=params, timeout=45)
+            if resp.status_code not in (429, 500, 502, 503, 504):
+                break
+            if attempt < 3:
+                time.sleep(2 ** attempt)
+        if resp is None:
+            raise RuntimeError(f"Beacon API request failed for {endpoint}: no response")
+        if resp.status_code >= 400:
+            try:
+                details = resp.json()
+            except Exception:
+                details = resp.text[:500]
+            raise RuntimeError(f"Beacon API error {resp.status_code} for {endpoint}: {details}")
+        payload = resp.json()
+        rows = extract_result_list(payload)
+        if not rows:
+            break
+        all_rows.extend(rows)
+        if on_page:
+            on_page(page, rows)
+        if len(rows) < per_page:
+            break
+        total = extract_total_count(payload)
+        if isinstance(total, int) and fetched_count + len(all_rows) >= total:
+            break
+        current_page, total_pages = extract_page_progress(payload)
+        if isinstance(current_page, int) and isinstance(total_pages, int) and current_page >= total_pages:
+            break
+        page += 1
+    return all_rows
+
+
+# --- CHECKPOINTS ---
+
+class SyncCheckpoint:
+    # On-disk record of one sync run: every fetched page (JSON lines per
+    # endpoint), which endpoints finished, and how many rows of each table
+    # were upserted. A retry with the same run_key skips that work; upserts
+    # are idempotent, so resuming at the saved offset is safe.
+    def __init__(self, directory, run_key, max_age_seconds=SYNC_CHECKPOINT_MAX_AGE_SECONDS):
+        self.path = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", str(run_key)))
+        self._state_path = os.path.join(self.path, "state.json")
+        self.pages_reused = 0
+        self.rows_skipped = 0
+        state = None
+        if os.path.exists(self._state_path):
+            try:
+                with open(self._state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = None
+        if state and time.time() - state.get("created_at", 0) > max_age_seconds:
+            self.clear()
+            state = None
+        os.makedirs(self.path, exist_ok=True)
+        self._state = state or {"created_at": time.time(), "fetched": [], "upserted": {}}
+        self._save()
+
+    def _save(self):
+        tmp_path = f"{self._state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _pages_path(self, endpoint):
+        return os.path.join(self.path, f"fetch_{re.sub(r'[^A-Za-z0-9_]+', '_', endpoint)}.jsonl")
+
+    def load_fetch(self, endpoint):
+        # Returns (rows, next_page, complete) for an endpoint.
+        rows = []
+        last_page = 0
+        pages_path = self._pages_path(endpoint)
+        if os.path.exists(pages_path):
+            try:
+                with open(pages_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        if entry["page"] != last_page + 1:
+                            raise ValueError(f"page {entry['page']} after page {last_page}")
+                        rows.extend(entry["rows"])
+                        last_page = entry["page"]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # A page cut short by a crash (or otherwise damaged) leaves
+                # the endpoint incomplete: drop its pages and fetch it again.
+                print(f"Checkpoint Error ({endpoint}): {e}")
+                self.discard_fetch(endpoint)
+                return [], 1, False
+            self.pages_reused += last_page
+        return rows, last_page + 1, endpoint in self._state["fetched"]
+
+    def discard_fetch(self, endpoint):
+        # Refetched rows may come back in a different order, so the saved
+        # upsert offsets no longer line up either.
+        try:
+            os.remove(self._pages_path(endpoint))
+        except FileNotFoundError:
+            pass
+        if endpoint in self._state["fetched"]:
+            self._state["fetched"].remove(endpoint)
+        self._state["upserted"] = {}
+        self._save()
+
+    def save_page(self, endpoint, page, rows):
+        with open(self._pages_path(endpoint), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"page": page, "rows": rows}) + "\n")
+
+    def mark_fetched(self, endpoint):
+        if endpoint not in self._state["fetched"]:
+            self._state["fetched"].append(endpoint)
+            self._save()
+
+    def upserted(self, table):
+        return int(self._state["upserted"].get(table, 0))
+
+    def save_upserted(self, table, count):
+        self._state["upserted"][table] = int(count)
+        self._save()
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _fetch_with_checkpoint(checkpoint, base_url, api_key, account_id, endpoint, should_cancel=None):
+    if checkpoint is None:
+        return fetch_beacon_entities(base_url, api_key, account_id, endpoint, should_cancel=should_cancel)
+    rows, next_page, complete = checkpoint.load_fetch(endpoint)
+    if complete:
+        return rows
+    rows.extend(
+        fetch_beacon_entities(
+            base_url,
+            api_key,
+            account_id,
+            endpoint,
+            should_cancel=should_cancel,
+            start_page=next_page,
+            fetched_count=len(rows),
+            on_page=lambda page, page_rows: checkpoint.save_page(endpoint, page, page_rows),
+        )
+    )
+    checkpoint.mark_fetched(endpoint)
+    return rows
+
+
+# --- SUPABASE ---
+
+def _missing_optional_column(msg, optional_columns):
+    if not any(token in msg for token in ("pgrst204", "42703", "could not find", "does not exist")):
+        return None
+    for column in optional_columns:
+        if f"'{column}'" in msg or f'"{column}"' in msg:
+            return column
+    return None
+
+
+def upsert_org_names(client, org_name_lookup, now_iso=None):
+    # Refreshes the org_names lookup (sql/org_names.sql) from an
+    # entity_ref_key -> name map. The lookup is derived data, so a failure
+    # (e.g. the table isn't created yet) is logged and doesn't stop the import.
+    if not org_name_lookup:
+        return 0
+    now_iso = now_iso or datetime.now(UTC).isoformat().replace("+00:00", "Z")
+    rows = [{"ref_key": key, "name": name, "updated_at": now_iso} for key, name in org_name_lookup.items()]
+    try:
+        return upsert_in_batches(client, ORG_NAMES_TABLE, rows, on_conflict="ref_key", default_chunk_size=1000)
+    except SyncCancelledError:
+        raise
+    except Exception as e:
+        print(f"Org names lookup not updated: {e}")
+        return 0
+
+
+def income_day(value):
+    s = clean_ts(value)
+    if not s:
+        return None
+    for candidate in (s.replace("Z", "+00:00"), s[:10]):
+        try:
+            return datetime.fromisoformat(candidate).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def build_funder_income_rollups(payment_rows, grant_rows, org_name_lookup=None):
+    # Totals per (funder, source, grant stage, day) from rows shaped like the
+    # beacon_payments/beacon_grants upserts. Amounts, stages and dates are read
+    # the same way the Funder Dashboard reads payloads.
+    buckets = {}
+    for source, rows, date_column in (
+        ("Payments", payment_rows, "payment_date"),
+        ("Grants", grant_rows, "close_date"),
+    ):
+        for row in rows:
+            payload = row.get("payload") or {}
+            funder = row if row.get("funder_key") else funder_columns(payload, org_name_lookup)
+            stage = str(payload.get("stage") or "").strip().lower() if source == "Grants" else ""
+            day = income_day(payload.get(date_column) or row.get(date_column))
+            bucket = day or "undated"
+            key = (funder["funder_key"], source, stage, bucket)
+            entry = buckets.get(key)
+            if entry is None:
+                entry = buckets[key] = {
+                    "funder_key": funder["funder_key"],
+                    "funder_name": funder.get("funder_name"),
+                    "source": source,
+                    "stage": stage,
+                    "bucket": bucket,
+                    "income_date": day,
+                    "row_count": 0,
+                    "amount": 0.0,
+                }
+            entry["row_count"] += 1
+            entry["amount"] += coerce_money(payload.get("amount"))
+    return list(buckets.values())
+
+
+def replace_funder_income_rollups(client, rollups, now_iso=None):
+    # Upserts the new totals, then drops buckets the build no longer has, so
+    # readers never see an empty table mid-refresh. Like org_names this is
+    # derived data: failures are logged, not raised.
+    now_iso = now_iso or datetime.now(UTC).isoformat().replace("+00:00", "Z")
+    rows = [{**entry, "updated_at": now_iso} for entry in rollups]
+    try:
+        upsert_in_batches(
+            client,
+            FUNDER_ROLLUPS_TABLE,
+            rows,
+            on_conflict="funder_key,source,stage,bucket",
+            default_chunk_size=1000,
+        )
+        client.table(FUNDER_ROLLUPS_TABLE).delete(returning="minimal").lt("updated_at", now_iso).execute()
+    except SyncCancelledError:
+        raise
+    except Exception as e:
+        print(f"Funder income rollups not updated: {e}")
+        return 0
+    return len(rows)
+
+
+def backfill_funder_columns(client, org_name_lookup=None, batch_size=1000):
+    # Fills funder_name/funder_key on payments and grants stored before
+    # sql/funder_index.sql, which the Funder Dashboard's indexed lookups
+    # would otherwise miss. Rows with the same funder are updated together.
+    # Derived data like the rollups: failures are logged, not raised.
+    updated = 0
+    try:
+        for table in ("beacon_payments", "beacon_grants"):
+            while True:
+                rows = (
+                    client.table(table).select("id, payload").is_("funder_key", "null").limit(batch_size).execute().data
+                    or []
+                )
+                ids_by_funder = {}
+                for row in rows:
+                    columns = funder_columns(row.get("payload") or {}, org_name_lookup)
+                    ids_by_funder.setdefault((columns["funder_name"], columns["funder_key"]), []).append(row["id"])
+                for (name, key), ids in ids_by_funder.items():
+                    for start in range(0, len(ids), 200):
+                        client.table(table).update({"funder_name": name, "funder_key": key}).in_(
+                            "id", ids[start:start + 200]
+                        ).execute()
+                updated += len(rows)
+                if len(rows) < batch_size:
+                    break
+    except Exception as e:
+        print(f"Funder columns not backfilled: {e}")
+    return updated
+
+
+def select_all(client, table, columns, batch_size=1000):
+    rows = []
+    offset = 0
+    while True:
+        chunk = client.table(table).select(columns).range(offset, offset + batch_size - 1).execute().data or []
+        rows.extend(chunk)
+        if len(chunk) < batch_size:
+            return rows
+        offset += batch_size
+
+
+def refresh_funder_income_rollups(client, org_name_lookup=None):
+    # Rebuilds the rollups from the stored payments and grants, for imports
+    # that only see part of the data.
+    try:
+        try:
+            payments = select_all(client, "beacon_payments", "payload, payment_date, funder_key, funder_name")
+            grants = select_all(client, "beacon_grants", "payload, close_date, funder_key, funder_name")
+        except Exception as e:
+            if not _missing_optional_column(str(e).lower(), OPTIONAL_COLUMNS):
+                raise
+            payments = select_all(client, "beacon_payments", "payload, payment_date")
+            grants = select_all(client, "beacon_grants", "payload, close_date")
+    except Exception as e:
+        print(f"Funder income rollups not updated: {e}")
+        return 0
+    rollups = build_funder_income_rollups(payments, grants, org_name_lookup)
+    return replace_funder_income_rollups(client, rollups)
+
+
+def upsert_in_batches(
+    client,
+    table,
+    rows,
+    on_conflict="id",
+    default_chunk_size=200,
+    min_chunk_size=25,
+    batch_progress_callback=None,
+    should_cancel=None,
+    optional_columns=OPTIONAL_COLUMNS,
+):
+    if not rows:
+        return 0
+    total = len(rows)
+    index = 0
+    while index < total:
+        check_cancel(should_cancel)
+        chunk_size = min(default_chunk_size, total - index)
+        while True:
+            check_cancel(should_cancel)
+            chunk = rows[index:index + chunk_size]
+            try:
+                client.table(table).upsert(chunk, on_conflict=on_conflict).execute()
+                index += len(chunk)
+                if batch_progress_callback:
+                    try:
+                        batch_progress_callback(index, total)
+                    except SyncCancelledError:
+                        raise
+                    except Exception:
+                        pass
+                break
+            except SyncCancelledError:
+                raise
+            except Exception as e:
+                msg = str(e).lower()
+                missing = _missing_optional_column(msg, optional_columns)
+                if missing:
+                    print(f"Upsert: {table}.{missing} not migrated yet, writing without it.")
+                    optional_columns = tuple(c for c in optional_columns if c != missing)
+                    rows = [{k: v for k, v in row.items() if k != missing} for row in rows]
+                    continue
+                is_timeout = "statement timeout" in msg or "57014" in msg
+                if is_timeout and chunk_size > min_chunk_size:
+                    # Reduce batch size and retry the same offset.
+                    chunk_size = max(min_chunk_size, chunk_size // 2)
+                    time.sleep(1)
+                    continue
+                if is_timeout:
+                    time.sleep(2)
+                raise
+    return total
+
+
+# --- SYNC ---
+
+def _attendee_event_id(att):
+    direct = get_row_value(att, "event_id", "eventId", "event")
+    direct = extract_linked_id(direct)
+    if direct not in [None, ""]:
+        return str(direct)
+    for key in ("event", "activity", "session"):
+        ref = att.get(key)
+        if isinstance(ref, dict) and ref.get("id") not in [None, ""]:
+            return str(ref.get("id"))
+    rel = att.get("relationships")
+    if isinstance(rel, dict):
+        for key in ("event", "events", "activity", "session"):
+            ref = rel.get(key)
+            if isinstance(ref, dict):
+                if isinstance(ref.get("data"), dict) and ref["data"].get("id") not in [None, ""]:
+                    return str(ref["data"]["id"])
+                if ref.get("id") not in [None, ""]:
+                    return str(ref.get("id"))
+                if isinstance(ref.get("data"), list) and ref["data"]:
+                    first = ref["data"][0]
+                    if isinstance(first, dict) and first.get("id") not in [None, ""]:
+                        return str(first.get("id"))
+    return None
+
+
+def _attendee_person_id(att):
+    direct = get_row_value(att, "person_id", "contact_id", "participant_id", "person", "contact", "participant")
+    direct = extract_linked_id(direct)
+    if direct not in [None, ""]:
+        return str(direct)
+    rel = att.get("relationships")
+    if isinstance(rel, dict):
+        for key in ("person", "people", "contact", "participant"):
+            ref = rel.get(key)
+            if isinstance(ref, dict):
+                if isinstance(ref.get("data"), dict) and ref["data"].get("id") not in [None, ""]:
+                    return str(ref["data"]["id"])
+                if ref.get("id") not in [None, ""]:
+                    return str(ref.get("id"))
+    return None
+
+
+def _attendee_ids(att):
+    event_id = _attendee_event_id(att)
+    person_id = _attendee_person_id(att)
+    if not event_id or not person_id:
+        # One traversal serves both fallbacks.
+        event_ids = KeyedIdCollector(ATTENDEE_EVENT_CONTEXT, ATTENDEE_EVENT_ID)
+        person_ids = KeyedIdCollector(ATTENDEE_PERSON_CONTEXT, ATTENDEE_PERSON_ID)
+        walk_payload(att, [v for v, have in ((event_ids, event_id), (person_ids, person_id)) if not have])
+        if not event_id and event_ids.ids:
+            event_id = sorted(event_ids.ids, key=len)[0]
+        if not person_id and person_ids.ids:
+            person_id = sorted(person_ids.ids, key=len)[0]
+    return event_id, person_id
+
+
+def _attendee_name(att):
+    return get_row_value(
+        att,
+        "name",
+        "full_name",
+        "display_name",
+        "participant_name",
+        "attendee_name",
+        "person_name",
+        "contact_name",
+        "email",
+    )
+
+
+def run_beacon_sync(
+    client,
+    beacon_key,
+    beacon_base_url=None,
+    beacon_account_id=None,
+    attendee_endpoint=None,
+    progress_callback=None,
+    should_cancel=None,
+    checkpoint=None,
+    kpi_refresh=None,
+):
+    # kpi_refresh (kpi_state.refresh_kpi_state bound to a client, passed in
+    # because kpi_state imports this module) is given {table: rows} for every
+    # row written, so the KPI store is updated from rows already in memory.
+    def _status_text(progress, message):
+        return f"{int(progress)}% | {message}"
+
+    def _report(progress, message):
+        check_cancel(should_cancel)
+        if progress_callback:
+            progress_callback(progress, _status_text(progress, message))
+
+    if not beacon_key:
+        raise RuntimeError("Missing BEACON_API_KEY.")
+    if not beacon_base_url and not beacon_account_id:
+        raise RuntimeError("Set BEACON_BASE_URL (preferred) or BEACON_ACCOUNT_ID.")
+
+    total_started = time.time()
+    now_iso = datetime.now(UTC).isoformat().replace("+00:00", "Z")
+
+    fetch_plan = [
+        ("people", "person", "people"),
+        ("organisations", "organization", "organisations"),
+        ("events", "event", "events"),
+        ("payments", "payment", "payments"),
+        ("subscriptions", "subscription", "subscriptions"),
+        ("grants", "grant", "grants"),
+    ]
+    datasets = {}
+    fetch_breakdown_ms = {}
+    fetch_started = time.time()
+    _report(5, "Starting Beacon API sync...")
+    for idx, (dataset_key, endpoint, label) in enumerate(fetch_plan):
+        check_cancel(should_cancel)
+        fetch_start = 5 + int((idx / len(fetch_plan)) * 45)
+        fetch_end = 5 + int(((idx + 1) / len(fetch_plan)) * 45)
+        _report(fetch_start, f"Fetching Beacon {label} ({idx + 1} of {len(fetch_plan)} datasets)...")
+        endpoint_started = time.time()
+        datasets[dataset_key] = _fetch_with_checkpoint(
+            checkpoint, beacon_base_url, beacon_key, beacon_account_id, endpoint, should_cancel=should_cancel
+        )
+        fetch_breakdown_ms[dataset_key] = int((time.time() - endpoint_started) * 1000)
+        _report(fetch_end, f"Fetched Beacon {label}: {len(datasets[dataset_key])} records.")
+
+    # Optional direct attendee source (preferred for participant drill-down).
+    attendee_endpoint_candidates = [(attendee_endpoint, "event attendees")] + ATTENDEE_ENDPOINT_CANDIDATES
+    datasets["event_attendees"] = []
+    attendee_fetch_started = time.time()
+    for endpoint, label in attendee_endpoint_candidates:
+        check_cancel(should_cancel)
+        if not endpoint:
+            continue
+        try:
+            rows = _fetch_with_checkpoint(
+                checkpoint, beacon_base_url, beacon_key, beacon_account_id, endpoint, should_cancel=should_cancel
+            )
+            datasets["event_attendees"] = rows
+            _report(50, f"Fetched Beacon {label}: {len(rows)} records from endpoint '{endpoint}'.")
+            break
+        except SyncCancelledError:
+            raise
+        except Exception:
+            continue
+    fetch_breakdown_ms["event_attendees"] = int((time.time() - attendee_fetch_started) * 1000)
+    fetch_duration_ms = int((time.time() - fetch_started) * 1000)
+
+    _report(55, "Transforming Beacon records...")
+    transform_started = time.time()
+
+    people_seen = {}
+    for row in datasets["people"]:
+        entity = sanitize(extract_entity(row))
+        rec_id = entity.get("id")
+        if not rec_id:
+            continue
+        entity["id"] = rec_id
+        entity["created_at"] = clean_ts(entity.get("created_at"))
+        entity["type"] = to_list(entity.get("type"))
+        if not entity.get("c_region"):
+            entity["c_region"] = extract_region_tags(entity)
+        people_seen[rec_id] = {"id": rec_id, "payload": entity, "created_at": entity.get("created_at"), "updated_at": now_iso}
+
+    people_name_by_id = {}
+    for p_id, p_row in people_seen.items():
+        p_payload = p_row.get("payload") or {}
+        p_name = get_row_value(p_payload, "name", "full_name", "Display Name", "email") or p_id
+        people_name_by_id[entity_ref_key(p_id)] = str(p_name).strip()
+
+    org_seen = {}
+    for row in datasets["organisations"]:
+        entity = sanitize(extract_entity(row))
+        rec_id = entity.get("id")
+        if not rec_id:
+            continue
+        entity["id"] = rec_id
+        entity["created_at"] = clean_ts(entity.get("created_at"))
+        if isinstance(entity.get("type"), list):
+            entity["type"] = ", ".join([str(v) for v in entity.get("type") if str(v).strip()])
+        if not entity.get("c_region"):
+            entity["c_region"] = extract_region_tags(entity)
+        org_seen[rec_id] = {"id": rec_id, "payload": entity, "created_at": entity.get("created_at"), "updated_at": now_iso}
+    org_name_lookup = build_organisation_name_lookup(r["payload"] for r in org_seen.values())
+
+    attendee_map = {}
+    attendee_seen = {}
+    for row in datasets.get("event_attendees") or []:
+        att = sanitize(extract_entity(row))
+        rec_id = att.get("id") or get_row_value(att, "Record ID", "ID", "Id")
+        if not rec_id:
+            continue
+        att["id"] = str(rec_id)
+        att["created_at"] = clean_ts(att.get("created_at") or get_row_value(att, "Created date", "Created", "Created at"))
+        event_id, person_id = _attendee_ids(att)
+        if not event_id:
+            continue
+        if person_id:
+            att["person_id"] = str(person_id)
+        att["event_id"] = str(event_id)
+        name = _attendee_name(att)
+        if (not name) and person_id:
+            name = people_name_by_id.get(entity_ref_key(person_id))
+        bucket = attendee_map.setdefault(event_id, {"names": set(), "ids": set()})
+        norm_event_id = entity_ref_key(event_id)
+        bucket_norm = attendee_map.setdefault(norm_event_id, {"names": set(), "ids": set()}) if norm_event_id else bucket
+        if person_id:
+            bucket["ids"].add(str(person_id))
+            bucket_norm["ids"].add(str(person_id))
+        if name:
+            bucket["names"].add(str(name).strip())
+            bucket_norm["names"].add(str(name).strip())
+        attendee_seen[str(rec_id)] = {
+            "id": str(rec_id),
+            "event_id": str(event_id),
+            "person_id": str(person_id) if person_id else None,
+            "created_at": att.get("created_at"),
+            "updated_at": now_iso,
+            "payload": att,
+        }
+
+    event_seen = {}
+    for row in datasets["events"]:
+        entity = sanitize(extract_entity(row))
+        rec_id = entity.get("id")
+        if not rec_id:
+            continue
+        entity["id"] = rec_id
+        entity["start_date"] = clean_ts(entity.get("start_date") or entity.get("date") or entity.get("created_at"))
+        if not entity.get("c_region"):
+            entity["c_region"] = extract_region_tags(entity)
+        entity["type"] = entity.get("type") or entity.get("event_type") or entity.get("category")
+        attendee_bucket = attendee_map.get(str(rec_id))
+        if not attendee_bucket or not (attendee_bucket["names"] or attendee_bucket["ids"]):
+            attendee_bucket = attendee_map.get(entity_ref_key(rec_id), {"names": set(), "ids": set()})
+        direct_names = sorted([n for n in attendee_bucket["names"] if n])
+        direct_ids = sorted([i for i in attendee_bucket["ids"] if i])
+        if direct_names:
+            entity["participant_list"] = direct_names
+        if direct_ids:
+            entity["participant_ids"] = direct_ids
+        direct_count = max(len(direct_names), len(direct_ids))
+        existing_count = entity.get("number_of_attendees") or entity.get("attendees") or entity.get("participant_count")
+        if existing_count in [None, ""] and direct_count > 0:
+            entity["number_of_attendees"] = direct_count
+        else:
+            entity["number_of_attendees"] = existing_count
+        event_seen[rec_id] = {
+            "id": rec_id,
+            "payload": entity,
+            "start_date": entity.get("start_date"),
+            "region": (entity.get("c_region") or [None])[0],
+            "updated_at": now_iso,
+        }
+
+    payment_seen = {}
+    for row in datasets["payments"] + datasets["subscriptions"]:
+        entity = sanitize(extract_entity(row))
+        rec_id = entity.get("id")
+        if not rec_id:
+            continue
+        if rec_id in payment_seen:
+            continue
+        entity["id"] = rec_id
+        entity["payment_date"] = clean_ts(entity.get("payment_date") or entity.get("date") or entity.get("created_at"))
+        entity["amount"] = entity.get("amount") or entity.get("value")
+        payment_seen[rec_id] = {
+            "id": rec_id,
+            "payload": entity,
+            "payment_date": entity.get("payment_date"),
+            "updated_at": now_iso,
+            **funder_columns(entity, org_name_lookup),
+        }
+
+    grant_seen = {}
+    for row in datasets["grants"]:
+        entity = sanitize(extract_entity(row))
+        rec_id = entity.get("id")
+        if not rec_id:
+            continue
+        entity["id"] = rec_id
+        entity["close_date"] = clean_ts(entity.get("close_date") or entity.get("award_date") or entity.get("created_at"))
+        entity["amount"] = entity.get("amount") or entity.get("amount_granted") or entity.get("value")
+        entity["stage"] = entity.get("stage") or entity.get("status")
+        grant_seen[rec_id] = {
+            "id": rec_id,
+            "payload": entity,
+            "close_date": entity.get("close_date"),
+            "updated_at": now_iso,
+            **funder_columns(entity, org_name_lookup),
+        }
+
+    people_rows = list(people_seen.values())
+    org_rows = list(org_seen.values())
+    event_rows = list(event_seen.values())
+    attendee_rows = list(attendee_seen.values())
+    payment_rows = list(payment_seen.values())
+    grant_rows = list(grant_seen.values())
+    transform_duration_ms = int((time.time() - transform_started) * 1000)
+
+    total_records = len(people_rows) + len(org_rows) + len(event_rows) + len(attendee_rows) + len(payment_rows) + len(grant_rows)
+    synced_records = 0
+
+    def _upsert_with_progress(table_name, rows, start_pct, end_pct, label):
+        if not rows:
+            return 0
+        # Rows are built in fetch order, so a resumed run sees the same order.
+        offset = min(checkpoint.upserted(table_name), len(rows)) if checkpoint else 0
+        if checkpoint and offset:
+            checkpoint.rows_skipped += offset
+
+        def _on_batch(done, total):
+            done += offset
+            if checkpoint:
+                checkpoint.save_upserted(table_name, done)
+            frac = max(0.0, min(1.0, done / len(rows)))
+            pct = start_pct + int((end_pct - start_pct) * frac)
+            overall_synced = synced_records + done
+            _report(pct, f"Upserting {label}... {overall_synced} out of {total_records} records synced.")
+
+        check_cancel(should_cancel)
+        upsert_in_batches(
+            client,
+            table_name,
+            rows[offset:],
+            on_conflict="id",
+            batch_progress_callback=_on_batch,
+            should_cancel=should_cancel,
+        )
+        return len(rows)
+
+    upsert_started = time.time()
+    _report(68, f"Preparing import: {synced_records} out of {total_records} records synced.")
+    _report(72, f"Upserting people ({len(people_rows)}) and organisations ({len(org_rows)})...")
+    if people_rows:
+        synced_records += _upsert_with_progress("beacon_people", people_rows, 72, 76, "people")
+        _report(76, f"People upserted: {synced_records} out of {total_records} records synced.")
+    if org_rows:
+        synced_records += _upsert_with_progress("beacon_organisations", org_rows, 76, 80, "organisations")
+        _report(80, f"Organisations upserted: {synced_records} out of {total_records} records synced.")
+    org_names_synced = upsert_org_names(client, org_name_lookup, now_iso)
+
+    _report(84, f"Upserting events ({len(event_rows)}), attendees ({len(attendee_rows)}) and payments ({len(payment_rows)})...")
+    if event_rows:
+        synced_records += _upsert_with_progress("beacon_events", event_rows, 84, 87, "events")
+        _report(87, f"Events upserted: {synced_records} out of {total_records} records synced.")
+    if attendee_rows:
+        synced_records += _upsert_with_progress("beacon_event_attendees", attendee_rows, 87, 90, "event attendees")
+        _report(90, f"Event attendees upserted: {synced_records} out of {total_records} records synced.")
+    if payment_rows:
+        synced_records += _upsert_with_progress("beacon_payments", payment_rows, 90, 94, "payments")
+        _report(92, f"Payments upserted: {synced_records} out of {total_records} records synced.")
+
+    _report(94, f"Upserting grants ({len(grant_rows)})...")
+    if grant_rows:
+        synced_records += _upsert_with_progress("beacon_grants", grant_rows, 94, 97, "grants")
+        _report(97, f"Grants upserted: {synced_records} out of {total_records} records synced.")
+    # Rows stored earlier that this fetch no longer returns.
+    backfill_funder_columns(client, org_name_lookup)
+    _report(98, "Refreshing funder income rollups...")
+    # Rebuilt from the stored tables: this fetch may not hold every payment
+    # and grant (CSV imports, rows past max_pages).
+    funder_rollups = refresh_funder_income_rollups(client, org_name_lookup)
+    upsert_duration_ms = int((time.time() - upsert_started) * 1000)
+    kpi_state = 0
+    if kpi_refresh:
+        _report(99, "Updating KPI state...")
+        kpi_state = kpi_refresh({
+            "beacon_people": people_rows,
+            "beacon_organisations": org_rows,
+            "beacon_events": event_rows,
+            "beacon_event_attendees": attendee_rows,
+            "beacon_payments": payment_rows,
+            "beacon_grants": grant_rows,
+        })
+
+    _report(100, f"Beacon API sync complete. {synced_records} out of {total_records} records synced.")
+    total_duration_ms = int((time.time() - total_started) * 1000)
+
+    return {
+        "people": len(people_rows),
+        "organisations": len(org_rows),
+        "org_names": org_names_synced,
+        "events": len(event_rows),
+        "event_attendees": len(attendee_rows),
+        "payments": len(payment_rows),
+        "grants": len(grant_rows),
+        "funder_rollups": funder_rollups,
+        "kpi_state": kpi_state,
+        "synced_at": now_iso,
+        "fetch_duration_ms": fetch_duration_ms,
+        "transform_duration_ms": transform_duration_ms,
+        "upsert_duration_ms": upsert_duration_ms,
+        "total_duration_ms": total_duration_ms,
+        "fetch_breakdown_ms": fetch_breakdown_ms,
+        "checkpoint_pages_reused": checkpoint.pages_reused if checkpoint else 0,
+        "checkpoint_rows_skipped": checkpoint.rows_skipped if checkpoint else 0,
+    }
@@ -0,0 +1,326 @@
+import re
+from functools import lru_cache
+
+# Shared Beacon helpers used by both the Streamlit app and the CLI sync/import
+# scripts. Keep this module free of Streamlit imports.
+
+ENTITY_REF_KEY_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=ENTITY_REF_KEY_CACHE_SIZE)
+def _entity_ref_key_cached(text):
+    s = text.strip().lower()
+    if not s:
+        return ""
+    if "/" in s:
+        s = s.rstrip("/").split("/")[-1]
+    if ":" in s:
+        s = s.split(":")[-1]
+    digits = "".join(filter(str.isdigit, s))
+    if len(digits) >= 4:
+        return digits
+    return "".join(filter(str.isalnum, s))
+
+
+def entity_ref_key(value):
+    # Normalise Beacon ids/refs ("people/12345", "event:12345", 12345) to one
+    # join key. Memoised because the same ids are normalised repeatedly when
+    # joining events, people and attendees.
+    if value is None:
+        return ""
+    return _entity_ref_key_cached(str(value))
+
+
+# --- PAYLOAD WALKER ---
+# Beacon payloads are arbitrarily nested dicts/lists. Every "find X somewhere in
+# this record" question goes through walk_payload so a record is traversed once
+# no matter how many extractors run over it.
+
+WALK_MAX_DEPTH = 32
+WALK_MAX_NODES = 50000
+
+POSTCODE_RE = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2})\b", re.IGNORECASE)
+_TOKEN_SPLIT_RE = re.compile(r"[,;\n]")
+
+
+class ContextMatcher:
+    # Precompiled "does this key mention any of these tokens" check, memoised
+    # per lower-cased key since the same field names recur across records.
+    __slots__ = ("_pattern", "_cache")
+
+    def __init__(self, tokens):
+        self._pattern = re.compile("|".join(re.escape(t) for t in tokens))
+        self._cache = {}
+
+    def __call__(self, key_l):
+        hit = self._cache.get(key_l)
+        if hit is None:
+            hit = self._pattern.search(key_l) is not None
+            if len(self._cache) < 4096:
+                self._cache[key_l] = hit
+        return hit
+
+
+class PayloadVisitor:
+    # context: ContextMatcher applied to keys on the way down; a node is "in
+    # context" when it or any ancestor key matched. Set done=True to stop
+    # receiving nodes.
+    context = None
+    done = False
+
+    def visit(self, value, key_l, in_context):
+        raise NotImplementedError
+
+
+def walk_payload(value, visitors, root_key=None, max_depth=WALK_MAX_DEPTH, max_nodes=WALK_MAX_NODES):
+    visitors = list(visitors)
+    if not visitors:
+        return
+    root_l = str(root_key).lower() if root_key is not None else None
+    flags = tuple(bool(root_l and v.context is not None and v.context(root_l)) for v in visitors)
+    # Depth-first, pre-order, children pushed in reverse so traversal order
+    # matches the old recursive helpers (first match wins for finders).
+    stack = [(value, root_l, flags, 0)]
+    visited = 0
+    while stack:
+        node, key_l, flags, depth = stack.pop()
+        visited += 1
+        if visited > max_nodes:
+            break
+        pending = False
+        for visitor, in_context in zip(visitors, flags):
+            if visitor.done:
+                continue
+            visitor.visit(node, key_l, in_context)
+            if not visitor.done:
+                pending = True
+        if not pending:
+            break
+        if depth >= max_depth:
+            continue
+        if isinstance(node, dict):
+            children = []
+            for k, v in node.items():
+                k_l = str(k).lower()
+                child_flags = tuple(
+                    f or (vis.context is not None and vis.context(k_l))
+                    for vis, f in zip(visitors, flags)
+                )
+                children.append((v, k_l, child_flags, depth + 1))
+            stack.extend(reversed(children))
+        elif isinstance(node, (list, tuple, set)):
+            stack.extend((item, None, flags, depth + 1) for item in reversed(list(node)))
+
+
+def split_ref_tokens(text):
+    return [t.strip() for t in _TOKEN_SPLIT_RE.split(text) if t.strip()]
+
+
+PARTICIPANT_CONTEXT = ContextMatcher(("participant", "attendee", "people", "contact", "person", "member"))
+EVENT_LINK_CONTEXT = ContextMatcher(("event", "attend", "session", "activity", "retreat", "walk", "booking"))
+
+
+class ParticipantRefCollector(PayloadVisitor):
+    context = PARTICIPANT_CONTEXT
+    id_keys = ("id", "person_id", "contact_id", "participant_id", "attendee_id")
+
+    def __init__(self):
+        self.names = []
+        self.ids = []
+        self._seen_names = set()
+        self._seen_ids = set()
+
+    def add_name(self, value):
+        candidate = str(value).strip()
+        if not candidate:
+            return
+        key = candidate.lower()
+        if key in self._seen_names:
+            return
+        self._seen_names.add(key)
+        self.names.append(candidate)
+
+    def add_id(self, value):
+        candidate = str(value).strip()
+        if not candidate or candidate in self._seen_ids:
+            return
+        self._seen_ids.add(candidate)
+        self.ids.append(candidate)
+
+    def visit(self, value, key_l, in_context):
+        if isinstance(value, dict):
+            local_name = value.get("name") or value.get("full_name") or value.get("display_name")
+            if local_name:
+                self.add_name(local_name)
+            if value.get("email"):
+                self.add_name(value.get("email"))
+            if in_context:
+                for id_key in self.id_keys:
+                    if value.get(id_key) is not None:
+                        self.add_id(value.get(id_key))
+        elif isinstance(value, str) and in_context:
+            for token in split_ref_tokens(value):
+                self.add_name(token)
+
+
+class LinkedIdCollector(PayloadVisitor):
+    # Collects ids found under context keys: id fields of in-context dicts plus
+    # in-context scalar values (comma/semicolon separated strings are split).
+    def __init__(self, context=EVENT_LINK_CONTEXT, id_keys=("id", "event_id", "activity_id", "session_id")):
+        self.context = context
+        self.id_keys = id_keys
+        self.ids = set()
+
+    def visit(self, value, key_l, in_context):
+        if not in_context:
+            return
+        if isinstance(value, dict):
+            for id_key in self.id_keys:
+                v = value.get(id_key)
+                if v is not None and str(v).strip():
+                    self.ids.add(str(v).strip())
+        elif isinstance(value, bool):
+            return
+        elif isinstance(value, (int, float)):
+            try:
+                self.ids.add(str(int(value)))
+            except (ValueError, OverflowError):
+                return
+        elif isinstance(value, str):
+            self.ids.update(split_ref_tokens(value))
+
+
+class KeyedIdCollector(PayloadVisitor):
+    # Collects scalar values whose key matches id_match while in context,
+    # e.g. {"event": {"id": 1}} or {"event_id": 1}. Pass module-level
+    # ContextMatchers so their key caches are shared across records.
+    def __init__(self, context, id_match):
+        self.context = context
+        self._id_match = id_match
+        self.ids = set()
+
+    def visit(self, value, key_l, in_context):
+        if key_l is None or not in_context:
+            return
+        if value is None or value == "" or isinstance(value, (dict, list, tuple, set)):
+            return
+        if self._id_match(key_l):
+            self.ids.add(str(value))
+
+
+class CoordinateFinder(PayloadVisitor):
+    lat_keys = ("lat", "latitude", "y")
+    lon_keys = ("lon", "lng", "long", "longitude", "x")
+
+    def __init__(self):
+        self.lat = None
+        self.lon = None
+
+    @staticmethod
+    def _first_float(record, keys):
+        for key in keys:
+            if key in record:
+                try:
+                    return float(record.get(key))
+                except Exception:
+                    continue
+        return None
+
+    def visit(self, value, key_l, in_context):
+        if not isinstance(value, dict):
+            return
+        lat = self._first_float(value, self.lat_keys)
+        lon = self._first_float(value, self.lon_keys)
+        if lat is not None and lon is not None:
+            self.lat, self.lon = lat, lon
+            self.done = True
+
+
+class PostcodeFinder(PayloadVisitor):
+    def __init__(self):
+        self.postcode = None
+
+    def visit(self, value, key_l, in_context):
+        if value is None or isinstance(value, (dict, list, tuple, set)):
+            return
+        if isinstance(value, bytes):
+            try:
+                value = value.decode("utf-8")
+            except Exception:
+                value = str(value)
+        text = str(value).strip()
+        if not text:
+            return
+        match = POSTCODE_RE.search(text.upper())
+        if match:
+            postcode = re.sub(r"\s+", "", match.group(1).upper())
+            self.postcode = f"{postcode[:-3]} {postcode[-3:]}" if len(postcode) > 3 else postcode
+            self.done = True
+
+
+# --- COMPACT RECORDS ---
+# Cached dashboard rows keep only the fields the views read. Values live in a
+# tuple aligned with a shared RecordSchema, and read access mirrors dict
+# get/[]/in so the existing row helpers work unchanged. The full payload is
+# fetched separately by id when a single row is opened.
+
+
+class RecordSchema:
+    __slots__ = ("table", "fields", "index")
+
+    def __init__(self, table, fields):
+        self.table = table
+        self.fields = tuple(fields)
+        self.index = {field: i for i, field in enumerate(self.fields)}
+
+    def __reduce__(self):
+        return (RecordSchema, (self.table, self.fields))
+
+
+class CompactRecord:
+    __slots__ = ("schema", "values", "regions")
+
+    def __init__(self, schema, values, regions=()):
+        self.schema = schema
+        self.values = tuple(values)
+        self.regions = tuple(regions)
+
+    @property
+    def table(self):
+        return self.schema.table
+
+    def get(self, key, default=None):
+        idx = self.schema.index.get(key)
+        if idx is None:
+            return default
+        return self.values[idx]
+
+    def __getitem__(self, key):
+        idx = self.schema.index.get(key)
+        if idx is None:
+            raise KeyError(key)
+        return self.values[idx]
+
+    def __contains__(self, key):
+        return key in self.schema.index
+
+    def __iter__(self):
+        return iter(self.schema.fields)
+
+    def __len__(self):
+        return len(self.schema.fields)
+
+    def keys(self):
+        return self.schema.fields
+
+    def items(self):
+        return zip(self.schema.fields, self.values)
+
+    def to_dict(self):
+        return {k: v for k, v in zip(self.schema.fields, self.values) if v is not None}
+
+    def __reduce__(self):
+        return (CompactRecord, (self.schema, self.values, self.regions))
+
+    def __repr__(self):
+        return f"CompactRecord({self.schema.table}, id={self.get('id')!r})"
@@ -1,6 +1,8 @@
 import csv
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from itertools import islice
 
 try:
     import tomllib  # py3.11+
@@ -9,6 +11,21 @@ except Exception:  # pragma: no cover
 
 from supabase import create_client
 
+from beacon_sync import (
+    backfill_funder_columns,
+    build_organisation_name_lookup,
+    funder_columns,
+    refresh_funder_income_rollups,
+    upsert_in_batches,
+    upsert_org_names,
+)
+from kpi_state import refresh_kpi_state
+
+# Rows are streamed from each CSV and upserted in chunks of IMPORT_CHUNK_SIZE,
+# IMPORT_WORKERS at a time, so memory stays flat however large the export is.
+IMPORT_CHUNK_SIZE = int(os.getenv("CSV_IMPORT_CHUNK_SIZE", "500"))
+IMPORT_WORKERS = int(os.getenv("CSV_IMPORT_WORKERS", "4"))
+
 
 def load_secrets():
     secrets = {}
@@ -36,7 +53,24 @@ def read_rows(path):
     delim = sniff_delimiter(path)
     with open(path, "r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(f, delimiter=delim)
-        return list(reader)
+        yield from reader
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _dedupe_chunk(chunk):
+    # Postgres rejects an upsert that touches the same id twice in one statement.
+    by_id = {}
+    for row in chunk:
+        by_id[row.get("id")] = row
+    return list(by_id.values())
 
 
 def to_list(value):
@@ -100,11 +134,42 @@ def norm_grant(row):
     return payload
 
 
-def upsert_rows(table, rows, client):
-    if not rows:
-        return 0
-    client.table(table).upsert(rows).execute()
-    return len(rows)
+def collect_org_names(org_rows, lookup):
+    # Passes organisations through while filling lookup, so payments and
+    # grants imported afterwards can resolve funder references to names.
+    for org in org_rows:
+        lookup.update(build_organisation_name_lookup([org]))
+        yield org
+
+
+def collect_ids(rows, ids):
+    # Passes rows through while recording their ids, for the KPI refresh.
+    for row in rows:
+        ids.add(row.get("id"))
+        yield row
+
+
+def upsert_rows(table, rows, client, chunk_size=IMPORT_CHUNK_SIZE, workers=IMPORT_WORKERS):
+    # rows may be any iterable; at most workers * 2 chunks are held at once.
+    total = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for chunk in iter_chunks(rows, chunk_size):
+            if len(in_flight) >= max(1, workers) * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                total += sum(f.result() for f in done)
+            in_flight.add(
+                pool.submit(
+                    upsert_in_batches,
+                    client,
+                    table,
+                    _dedupe_chunk(chunk),
+                    on_conflict="id",
+                    default_chunk_size=chunk_size,
+                )
+            )
+        total += sum(f.result() for f in in_flight)
+    return total
 
 
 def main():
@@ -127,39 +192,66 @@ def main():
         if not os.path.exists(path):
             raise SystemExit(f"Missing file: {path}")
 
-    people_rows = [norm_people(r) for r in read_rows(paths["people"]) if r.get("Record ID")]
-    org_rows = [norm_org(r) for r in read_rows(paths["organization"]) if r.get("Record ID")]
-    event_rows = [norm_event(r) for r in read_rows(paths["event"]) if r.get("Record ID")]
-    payment_rows = [norm_payment(r) for r in read_rows(paths["payment"]) if r.get("Record ID")]
-    grant_rows = [norm_grant(r) for r in read_rows(paths["grant"]) if r.get("Record ID")]
+    people_rows = (norm_people(r) for r in read_rows(paths["people"]) if r.get("Record ID"))
+    org_rows = (norm_org(r) for r in read_rows(paths["organization"]) if r.get("Record ID"))
+    event_rows = (norm_event(r) for r in read_rows(paths["event"]) if r.get("Record ID"))
+    payment_rows = (norm_payment(r) for r in read_rows(paths["payment"]) if r.get("Record ID"))
+    grant_rows = (norm_grant(r) for r in read_rows(paths["grant"]) if r.get("Record ID"))
 
     client = create_client(supabase_url, supabase_key)
+    org_name_lookup = {}
+    written = {table: set() for table in ("beacon_people", "beacon_organisations", "beacon_events", "beacon_payments", "beacon_grants")}
 
     count_people = upsert_rows(
         "beacon_people",
-        [{"id": p.get("id"), "payload": p, "created_at": p.get("created_at")} for p in people_rows],
+        collect_ids(
+            ({"id": p.get("id"), "payload": p, "created_at": p.get("created_at")} for p in people_rows),
+            written["beacon_people"],
+        ),
         client,
     )
     count_orgs = upsert_rows(
         "beacon_organisations",
-        [{"id": o.get("id"), "payload": o, "created_at": o.get("created_at")} for o in org_rows],
+        collect_ids(
+            ({"id": o.get("id"), "payload": o, "created_at": o.get("created_at")} for o in collect_org_names(org_rows, org_name_lookup)),
+            written["beacon_organisations"],
+        ),
         client,
     )
+    upsert_org_names(client, org_name_lookup)
     count_events = upsert_rows(
         "beacon_events",
-        [{"id": e.get("id"), "payload": e, "start_date": e.get("start_date"), "region": (e.get("c_region") or [None])[0]} for e in event_rows],
+        collect_ids(
+            ({"id": e.get("id"), "payload": e, "start_date": e.get("start_date"), "region": (e.get("c_region") or [None])[0]} for e in event_rows),
+            written["beacon_events"],
+        ),
         client,
     )
     count_payments = upsert_rows(
         "beacon_payments",
-        [{"id": p.get("id"), "payload": p, "payment_date": p.get("payment_date")} for p in payment_rows],
+        collect_ids(
+            (
+                {"id": p.get("id"), "payload": p, "payment_date": p.get("payment_date"), **funder_columns(p, org_name_lookup)}
+                for p in payment_rows
+            ),
+            written["beacon_payments"],
+        ),
         client,
     )
     count_grants = upsert_rows(
         "beacon_grants",
-        [{"id": g.get("id"), "payload": g, "close_date": g.get("close_date")} for g in grant_rows],
+        collect_ids(
+            (
+                {"id": g.get("id"), "payload": g, "close_date": g.get("close_date"), **funder_columns(g, org_name_lookup)}
+                for g in grant_rows
+            ),
+            written["beacon_grants"],
+        ),
         client,
     )
+    count_backfilled = backfill_funder_columns(client, org_name_lookup)
+    count_rollups = refresh_funder_income_rollups(client, org_name_lookup)
+    count_kpi_state = refresh_kpi_state(client, written)
 
     print({
         "people": count_people,
@@ -167,6 +259,9 @@ def main():
         "events": count_events,
         "payments": count_payments,
         "grants": count_grants,
+        "funder_backfilled": count_backfilled,
+        "funder_rollups": count_rollups,
+        "kpi_state": count_kpi_state,
         "imported_at": datetime.utcnow().isoformat() + "Z",
     })
 
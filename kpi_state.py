@@ -0,0 +1,1069 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from beacon_sync import coerce_money, get_row_value, income_day, select_all, to_list
+from beacon_utils import LinkedIdCollector, ParticipantRefCollector, entity_ref_key, walk_payload
+
+# Headline KPIs kept up to date from per-record contributions
+# (sql/kpi_state.sql). Every stored person, organisation, event, attendee,
+# payment and grant adds a few (measure, region, label) values on the day the
+# dashboard's date filter files it under, with its joins (linked people,
+# attendee ages) resolved when the contribution is built. Each contribution
+# also stores its links: the record's own ref ("event:123") and the refs it
+# joins on. refresh_kpi_state is given the records a sync or import wrote,
+# finds the events and attendees that join on them through the links, and
+# rebuilds only those contributions; apply_kpi_contributions adds the
+# difference to the kpi_cube day buckets. Any date range is then the sum of
+# its buckets (kpi_cube_totals), which kpi_summary turns back into the dict
+# compute_kpis returns.
+
+KPI_CUBE_TABLE = "kpi_cube"
+KPI_CONTRIBUTIONS_TABLE = "kpi_contributions"
+KPI_REGIONS = ("Global", "North of England", "South of England", "Midlands", "Wales", "Other")
+# Region of the measures that don't depend on region (income, corporate partners).
+SHARED_REGION = ""
+# Bucket of records without a date: counted in "All Time" only, as with the raw rows.
+UNDATED_BUCKET = "undated"
+KPI_APPLY_BATCH_SIZE = 500
+KPI_LOAD_BATCH_SIZE = 200
+# Beacon table -> (record key prefix, columns the contributions are built from).
+KPI_SOURCE_TABLES = {
+    "beacon_people": ("person", "id, payload, created_at"),
+    "beacon_organisations": ("organisation", "id, payload, created_at"),
+    "beacon_events": ("event", "id, payload, start_date, region"),
+    "beacon_event_attendees": ("attendee", "id, payload, event_id, person_id, created_at"),
+    "beacon_payments": ("payment", "id, payload, payment_date"),
+    "beacon_grants": ("grant", "id, payload, close_date"),
+}
+
+PARTICIPANT_SOURCE_KEYS = (
+    "participant_list",
+    "participants_list",
+    "participants",
+    "attendees",
+    "attendee_list",
+    "attendees_list",
+    "people",
+    "participant_names",
+    "attendee_names",
+    "contacts",
+    "relationships",
+)
+EVENT_TYPE_KEYS = ("type", "Type", "Event type", "Activity type", "Category")
+EVENT_ATTENDEE_KEYS = (
+    "number_of_attendees",
+    "Number of attendees",
+    "Attendees",
+    "Participants",
+    "Total participants",
+    "Participant count",
+    "Number attending",
+)
+AGE_KEYS = ("c_age", "age", "Age", "participant_age", "age_years", "Age (years)")
+DOB_KEYS = ("dob", "date_of_birth", "Date of Birth", "Birth date", "birth_date")
+AGE_BUCKET_ORDER = ["18-30", "30-40", "40-45", "45-65", "65-75", "75+"]
+DELIVERY_EVENT_TOKENS = ("walk", "retreat", "delivery", "session", "hike", "trek")
+LSP_TYPE_TOKENS = ("university", "trust", "political", "parliamentary", "media", "nhs", "prescriber")
+BID_STAGE_TOKENS = ("submitted", "review", "pending")
+DEMOGRAPHIC_KEYWORDS = {
+    "Men": ["men", "male"],
+    "Women": ["women", "female"],
+    "Young Adults": ["young adult", "young people", "youth"],
+    "Carers": ["carer", "caregiver"],
+    "Veterans": ["veteran"],
+    "Ethnic Minorities": ["ethnic minority", "minority ethnic", "bame", "global majority"],
+    "Parents": ["parent", "mum", "dad"],
+}
+
+
+def rows_to_payloads(rows, date_field=None, region_field=None):
+    payloads = []
+    for row in rows:
+        payload = row.get("payload") or {}
+        if date_field and row.get(date_field) and not payload.get(date_field):
+            payload[date_field] = row.get(date_field)
+        if region_field and row.get(region_field) and not payload.get("c_region"):
+            payload["c_region"] = [row.get(region_field)]
+        payloads.append(payload)
+    return payloads
+
+
+def build_event_attendee_records(attendee_rows):
+    event_attendee_records = {}
+    for row in attendee_rows:
+        payload = row.get("payload") or {}
+        event_id = payload.get("event_id") or row.get("event_id")
+        person_id = payload.get("person_id") or row.get("person_id")
+        if person_id and not payload.get("person_id"):
+            payload["person_id"] = person_id
+        if event_id and not payload.get("event_id"):
+            payload["event_id"] = event_id
+        if row.get("created_at") and not payload.get("created_at"):
+            payload["created_at"] = row.get("created_at")
+        if not event_id:
+            continue
+        event_attendee_records.setdefault(str(event_id), []).append(payload)
+        norm_event_id = entity_ref_key(event_id)
+        if norm_event_id and norm_event_id != str(event_id):
+            event_attendee_records.setdefault(norm_event_id, []).append(payload)
+    return event_attendee_records
+
+
+def record_in_region(record, region):
+    if region == "Global":
+        return True
+    tags = to_list(record.get("c_region"))
+    if not tags and record.get("region"):
+        tags = to_list(record.get("region"))
+    return any(region.lower() in str(t).lower() for t in tags)
+
+
+def extract_participant_refs(event_row, people_name_by_id=None):
+    people_name_by_id = people_name_by_id or {}
+    refs = ParticipantRefCollector()
+    sources = {key: event_row.get(key) for key in PARTICIPANT_SOURCE_KEYS if event_row.get(key) is not None}
+    walk_payload(sources, [refs])
+
+    for pid in list(refs.ids):
+        mapped_name = people_name_by_id.get(entity_ref_key(pid))
+        if mapped_name:
+            refs.add_name(mapped_name)
+    return refs.names, refs.ids
+
+
+def extract_linked_event_ids(person_row):
+    linked = LinkedIdCollector()
+    walk_payload(person_row, [linked])
+    return linked.ids
+
+
+def normalize_gender(value):
+    raw = str(value or "").strip().lower()
+    if not raw:
+        return "Unknown / Not provided"
+    if raw in {"prefer not to say", "prefer not say", "prefer not", "pn ts", "n/a", "na"}:
+        return "Prefer not to say"
+    if any(token in raw for token in ["trans", "non-binary", "non binary", "nonbinary", "gender diverse", "genderqueer", "agender"]):
+        return "Trans / Non-binary / Gender diverse"
+    if raw in {"m", "male", "man", "men"}:
+        return "Men"
+    if raw in {"f", "female", "woman", "women"}:
+        return "Women"
+    if raw in {"unknown", "not provided", "unspecified"}:
+        return "Unknown / Not provided"
+    return "Trans / Non-binary / Gender diverse"
+
+
+def person_types(person):
+    return [str(t).lower() for t in to_list(person.get("type"))]
+
+
+def is_volunteer(person):
+    return any("volunteer" in t for t in person_types(person))
+
+
+def is_steering_member(person):
+    return any("steering" in t or "committee" in t for t in person_types(person))
+
+
+def people_tag_labels(person):
+    person_tags = person_types(person)
+    if not person_tags:
+        return []
+    person_text = " | ".join(person_tags)
+    return [label for label, keywords in DEMOGRAPHIC_KEYWORDS.items() if any(k in person_text for k in keywords)]
+
+
+def partnership_kind(org):
+    # "LSP" (strategic) or "LDP" (delivery) for a typed organisation, else None.
+    org_type = str(org.get("type") or "").strip()
+    if not org_type:
+        return None
+    return "LSP" if any(x in org_type.lower() for x in LSP_TYPE_TOKENS) else "LDP"
+
+
+def is_corporate(org):
+    org_type = str(org.get("type") or "").strip().lower()
+    return "business" in org_type or "corporate" in org_type
+
+
+def _count_value(value):
+    if value is None:
+        return 0
+    s = str(value).strip().replace(",", "")
+    if not s:
+        return 0
+    try:
+        return int(float(s))
+    except ValueError:
+        return 0
+
+
+def event_type(event_row):
+    for key in EVENT_TYPE_KEYS:
+        val = event_row.get(key)
+        if val is not None and str(val).strip():
+            return str(val).lower()
+    return ""
+
+
+def is_delivery_event_type(e_type):
+    return any(x in e_type for x in DELIVERY_EVENT_TOKENS)
+
+
+def event_type_label(e_type):
+    return e_type.title() if e_type else "Unknown Event Type"
+
+
+def event_attendee_count(event_row):
+    for key in EVENT_ATTENDEE_KEYS:
+        val = event_row.get(key)
+        if val is not None and str(val).strip():
+            if isinstance(val, list):
+                return len(val)
+            if isinstance(val, dict):
+                for count_key in ("count", "total", "value", "participants", "attendees"):
+                    if val.get(count_key) is not None and str(val.get(count_key)).strip():
+                        return _count_value(val.get(count_key))
+            return _count_value(val)
+    return 0
+
+
+def person_display_name(person):
+    return get_row_value(person, "name", "full_name", "Display Name", "email") or person.get("id")
+
+
+def build_people_lookups(people):
+    # entity_ref_key -> display name, and -> raw age or date of birth.
+    people_name_by_id = {}
+    people_age_by_id = {}
+    for person_row in people:
+        pid = person_row.get("id")
+        person_key = entity_ref_key(pid) if pid is not None else ""
+        p_name = person_display_name(person_row)
+        if person_key:
+            people_name_by_id[person_key] = str(p_name).strip()
+        for age_key in AGE_KEYS:
+            age_val = person_row.get(age_key)
+            if age_val is not None and str(age_val).strip():
+                if person_key:
+                    people_age_by_id[person_key] = age_val
+                break
+        if person_key and person_key not in people_age_by_id:
+            for dob_key in DOB_KEYS:
+                dob_val = person_row.get(dob_key)
+                if dob_val is not None and str(dob_val).strip():
+                    people_age_by_id[person_key] = dob_val
+                    break
+    return people_name_by_id, people_age_by_id
+
+
+def build_people_by_event(region_people):
+    # entity_ref_key(event id) -> names of the people whose records link to it.
+    people_by_event_id = {}
+    for p in region_people:
+        p_name = person_display_name(p)
+        if not p_name:
+            continue
+        for linked_id in extract_linked_event_ids(p):
+            names = people_by_event_id.setdefault(entity_ref_key(linked_id), [])
+            if str(p_name) not in names:
+                names.append(str(p_name))
+    return people_by_event_id
+
+
+def event_participants(event_row, people_name_by_id, people_by_event_id):
+    # (participant count, names, ids) for a delivery event.
+    participant_list, participant_ids = extract_participant_refs(event_row, people_name_by_id)
+    event_id = str(event_row.get("id")) if event_row.get("id") is not None else ""
+    linked_people = people_by_event_id.get(entity_ref_key(event_id), [])
+    if linked_people:
+        seen_names = set(str(x).strip().lower() for x in participant_list)
+        for lp in linked_people:
+            lp_norm = str(lp).strip().lower()
+            if lp_norm and lp_norm not in seen_names:
+                participant_list.append(lp)
+                seen_names.add(lp_norm)
+    count = max(event_attendee_count(event_row), len(participant_list), len(participant_ids))
+    return count, participant_list, participant_ids
+
+
+def coerce_age_years(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not pd.isna(value):
+        age_num = int(float(value))
+        return age_num if 0 <= age_num <= 120 else None
+    text = str(value).strip()
+    if not text:
+        return None
+    match = re.search(r"(\d{1,3})", text)
+    if match:
+        age_num = int(match.group(1))
+        return age_num if 0 <= age_num <= 120 else None
+    dob = pd.to_datetime(text, errors="coerce", dayfirst=True)
+    if pd.isna(dob):
+        dob = pd.to_datetime(text, errors="coerce")
+    if pd.isna(dob):
+        return None
+    today = pd.Timestamp.now(tz=dob.tz) if getattr(dob, "tzinfo", None) else pd.Timestamp.now()
+    age_num = int((today - dob).days // 365.25)
+    return age_num if 0 <= age_num <= 120 else None
+
+
+def age_bucket_for(value):
+    age_num = coerce_age_years(value)
+    if age_num is None or age_num < 18:
+        return None
+    if age_num < 30:
+        return "18-30"
+    if age_num < 40:
+        return "30-40"
+    if age_num < 45:
+        return "40-45"
+    if age_num < 65:
+        return "45-65"
+    if age_num < 75:
+        return "65-75"
+    return "75+"
+
+
+def attendee_age_bucket(attendee, people_age_by_id):
+    for key in AGE_KEYS + DOB_KEYS:
+        bucket = age_bucket_for(get_row_value(attendee, key))
+        if bucket:
+            return bucket
+    person_key = entity_ref_key(attendee.get("person_id"))
+    if person_key and person_key in people_age_by_id:
+        return age_bucket_for(people_age_by_id.get(person_key))
+    return None
+
+
+def event_attendee_rows(event_attendee_records, event_id):
+    return event_attendee_records.get(event_id) or event_attendee_records.get(entity_ref_key(event_id)) or []
+
+
+def attendee_key(attendee, event_id):
+    return str(attendee.get("id") or f"{event_id}:{attendee.get('person_id') or attendee.get('name') or attendee.get('email') or ''}").strip()
+
+
+def compute_kpis(region, people, organisations, events, payments, grants, event_attendee_records=None, include_details=True, linked_people=None):
+    # The dashboard's KPI dict from raw payload rows. build_kpi_contributions
+    # applies the same per-record rules, so kpi_summary over kpi_cube gives
+    # the same figures. linked_people: people outside the date range that the
+    # events and attendees in it join on (see load_event_joins); counted
+    # nowhere else.
+    if event_attendee_records is None:
+        event_attendee_records = {}
+    # 2. Filter Helpers
+    def is_in_region(record):
+        return record_in_region(record, region)
+
+    # 3. Process People (Governance)
+    region_people = [p for p in people if is_in_region(p)]
+    
+    # Fuzzy match for volunteers
+    volunteers = [p for p in region_people if is_volunteer(p)]
+
+    # Check if they are part of a steering group (often a specific type or tag)
+    steering_volunteers = [v for v in volunteers if is_steering_member(v)]
+            
+    # Proxy: If no specific "steering" tag found, fallback to total or mock logic
+    steering_group_proxy = len(steering_volunteers) if steering_volunteers else len(volunteers)
+
+    # 4. Process Organisations (Partnerships)
+    region_orgs = [o for o in organisations if is_in_region(o)]
+    all_orgs = list(organisations or [])
+    org_id_to_region = {o.get('id'): True for o in region_orgs if o.get('id') is not None}
+    
+    lsp_counts = {}
+    ldp_counts = {}
+    
+    for org in region_orgs:
+        # Determine strategic vs delivery
+        kind = partnership_kind(org)
+        if not kind:
+            continue
+        counts = lsp_counts if kind == "LSP" else ldp_counts
+        org_type = str(org.get('type') or "").strip()
+        counts[org_type] = counts.get(org_type, 0) + 1
+
+    corporate_orgs = [org for org in all_orgs if is_corporate(org)]
+    corporate_count = len(corporate_orgs)
+
+    # 5. Process Income
+    global_grants = []
+    for g in grants:
+        org_link = g.get('organization')
+        linked_id = None
+        if isinstance(org_link, dict): linked_id = org_link.get('id')
+        elif isinstance(org_link, str): linked_id = org_link
+        
+        if linked_id and linked_id in org_id_to_region:
+            global_grants.append(g)
+        elif region == "Global":
+            global_grants.append(g)
+
+    if region != "Global":
+        global_grants = list(grants or [])
+            
+    # Fuzzy match for grant stages
+    bids_submitted = sum(1 for g in global_grants if any(x in str(g.get('stage')).lower() for x in BID_STAGE_TOKENS))
+    funds_raised_grants = sum(coerce_money(g.get('amount')) for g in global_grants if str(g.get('stage')).lower() == 'won')
+    
+    def _payment_in_region(payment):
+        if region == "Global":
+            return True
+        if is_in_region(payment):
+            return True
+        return False
+
+    global_payments = [p for p in payments if _payment_in_region(p)]
+    if region != "Global":
+        global_payments = list(payments or [])
+    total_payments = sum(coerce_money(p.get('amount')) for p in global_payments)
+    
+    total_funds = funds_raised_grants + total_payments
+
+    # 6. Process Delivery (Events)
+    region_events = [e for e in events if is_in_region(e)]
+
+    join_people = list(people)
+    if linked_people:
+        people_ids = {str(p.get("id")) for p in join_people}
+        join_people += [p for p in linked_people if str(p.get("id")) not in people_ids]
+    people_name_by_id, people_age_by_id = build_people_lookups(join_people)
+
+    walks_delivered = 0
+    participants = 0
+    delivery_event_count = 0
+    delivery_events = []
+    event_type_counts = {}
+    people_by_event_id = build_people_by_event(p for p in join_people if is_in_region(p))
+    for e in region_events:
+        e_type = event_type(e)
+        if is_delivery_event_type(e_type):
+            walks_delivered += 1
+            delivery_event_count += 1
+            event_participants_count, participant_list, participant_ids = event_participants(e, people_name_by_id, people_by_event_id)
+            participants += event_participants_count
+            event_type_label_text = event_type_label(e_type)
+            event_type_counts[event_type_label_text] = event_type_counts.get(event_type_label_text, 0) + 1
+            if not include_details:
+                continue
+            event_id = str(e.get("id")) if e.get("id") is not None else ""
+            delivery_events.append({
+                "id": e.get("id"),
+                "type": e_type,
+                "participants": event_participants_count,
+                "date": e.get("start_date") or e.get("date") or e.get("created_at"),
+                "name": get_row_value(e, "name", "title", "Event name", "Description") or e.get("id"),
+                "region": ", ".join(to_list(e.get("c_region"))),
+                "participant_list": participant_list,
+                "participant_ids": participant_ids,
+                "attendee_records": event_attendee_rows(event_attendee_records, event_id),
+            })
+
+    # Fallback: if event labels are inconsistent, treat all region events as delivered.
+    if walks_delivered == 0 and region_events:
+        walks_delivered = len(region_events)
+        participants = sum(event_attendee_count(e) for e in region_events)
+
+    attendee_gender_demographics = {}
+    attendee_age_demographics = {}
+    seen_attendees = set()
+    for event in region_events:
+        event_id = str(event.get("id") or "")
+        for attendee in event_attendee_rows(event_attendee_records, event_id):
+            if not isinstance(attendee, dict):
+                continue
+            key = attendee_key(attendee, event_id)
+            if key in seen_attendees:
+                continue
+            seen_attendees.add(key)
+            label = normalize_gender(get_row_value(attendee, "c_gender", "Gender", "gender"))
+            attendee_gender_demographics[label] = attendee_gender_demographics.get(label, 0) + 1
+            age_bucket = attendee_age_bucket(attendee, people_age_by_id)
+            if age_bucket:
+                attendee_age_demographics[age_bucket] = attendee_age_demographics.get(age_bucket, 0) + 1
+
+    # Delivery demographics from currently available fields.
+    # Priority 1: event attendee gender
+    # Priority 2: people type tags
+    # Priority 3: event type split
+    people_tag_demographics = {}
+    for p in region_people:
+        for label in people_tag_labels(p):
+            people_tag_demographics[label] = people_tag_demographics.get(label, 0) + 1
+
+    if attendee_gender_demographics or attendee_age_demographics:
+        delivery_demographics = {}
+        for label, count in attendee_gender_demographics.items():
+            delivery_demographics[label] = count
+        for label in AGE_BUCKET_ORDER:
+            if attendee_age_demographics.get(label):
+                delivery_demographics[label] = attendee_age_demographics[label]
+        unknown_age_count = max(0, len(seen_attendees) - sum(attendee_age_demographics.values()))
+        if unknown_age_count:
+            delivery_demographics["Unknown Age"] = unknown_age_count
+        delivery_demographics_source = "event_attendee_demographics"
+    elif people_tag_demographics:
+        delivery_demographics = people_tag_demographics
+        delivery_demographics_source = "people_type_tags"
+    elif event_type_counts:
+        delivery_demographics = event_type_counts
+        delivery_demographics_source = "event_type_split"
+    else:
+        delivery_demographics = {"Unknown": participants if participants > 0 else 0}
+        delivery_demographics_source = "unknown"
+
+    return {
+        "region": region,
+        "last_updated": datetime.now().strftime("%H:%M:%S"),
+        "governance": {
+            "steering_group_active": steering_group_proxy > 0, 
+            "steering_members": steering_group_proxy,
+            "volunteers_new": len(volunteers) 
+        },
+        "partnerships": {
+            "LSP": lsp_counts if lsp_counts else {"None": 0},
+            "LDP": ldp_counts if ldp_counts else {"None": 0},
+            "active_referrals": len(region_orgs),
+            "networks_sat_on": 0 
+        },
+        "delivery": {
+            "walks_delivered": walks_delivered, 
+            "participants": participants,
+            "bursary_participants": 0, 
+            "wellbeing_change_score": 0,
+            "demographics": delivery_demographics,
+            "demographics_source": delivery_demographics_source,
+        },
+        "income": {
+            "bids_submitted": bids_submitted,
+            "total_funds_raised": total_funds,
+            "corporate_partners": corporate_count,
+            "in_kind_value": 0 
+        },
+        "comms": {
+            "press_releases": 0,
+            "media_coverage": 0,
+            "newsletters_sent": 0,
+            "open_rate": 0
+        },
+        "_debug": {
+            "region_people": len(region_people),
+            "volunteers": len(volunteers),
+            "steering_volunteers": len(steering_volunteers),
+            "region_events": len(region_events),
+            "walk_events": walks_delivered,
+            "participants": participants,
+            "region_grants": len(global_grants),
+            "bids_submitted": bids_submitted,
+            "delivery_events_tagged": delivery_event_count
+        },
+        "_raw_income": {
+            "payments": global_payments,
+            "grants": global_grants
+        },
+        # Drill-down rows are only built for callers that render them.
+        "_raw_kpi": {
+            "region_people": region_people,
+            "volunteers": volunteers,
+            "steering_volunteers": steering_volunteers,
+            "region_orgs": region_orgs,
+            "corporate_orgs": corporate_orgs,
+            "region_events": region_events,
+            "delivery_events": delivery_events,
+            "region_grants": global_grants,
+            "region_payments": global_payments,
+        } if include_details else {}
+    }
+
+
+def record_bucket(value):
+    return income_day(value) or UNDATED_BUCKET
+
+
+def ref_token(kind, value):
+    # Link token of a person or event id in any of its ref forms.
+    ref = entity_ref_key(value)
+    return f"{kind}:{ref}" if ref else ""
+
+
+def build_kpi_contributions(people_rows, org_rows, event_rows, attendee_rows, payment_rows, grant_rows, regions=KPI_REGIONS):
+    # record key -> {(measure, region, label, day bucket): value}, from rows
+    # shaped like the beacon_* table selects. Each record is filed under the
+    # day of the column the dashboard filters its table on; attendees go
+    # under their event's day. Summed over every bucket this is compute_kpis
+    # for "All Time". For a date range the joins still use all records: an
+    # event counts everyone linked to it and attendee ages come from any
+    # person, not only people created in that range. Returns (contributions,
+    # record key -> sorted link tokens).
+    people = list(zip(people_rows, rows_to_payloads(people_rows, date_field="created_at")))
+    organisations = list(zip(org_rows, rows_to_payloads(org_rows, date_field="created_at")))
+    events = list(zip(event_rows, rows_to_payloads(event_rows, date_field="start_date", region_field="region")))
+    payments = rows_to_payloads(payment_rows, date_field="payment_date")
+    grants = rows_to_payloads(grant_rows, date_field="close_date")
+    event_attendee_records = build_event_attendee_records(attendee_rows)
+    people_name_by_id, people_age_by_id = build_people_lookups(p for _, p in people)
+
+    contributions = {}
+    links = {}
+
+    def _link(record_key, *tokens):
+        links.setdefault(record_key, set()).update(t for t in tokens if t)
+
+    for row, p in people:
+        _link(f"person:{row.get('id')}", ref_token("person", row.get("id")), *(ref_token("event", x) for x in extract_linked_event_ids(p)))
+
+    for row, e in events:
+        record_key = f"event:{row.get('id')}"
+        _link(record_key, ref_token("event", row.get("id")))
+        if is_delivery_event_type(event_type(e)):
+            _link(record_key, *(ref_token("person", x) for x in extract_participant_refs(e)[1]))
+
+    def _add(record_key, bucket, measure, region, label="", value=1):
+        if not value:
+            return
+        entry = contributions.setdefault(record_key, {})
+        key = (measure, region, label, bucket)
+        entry[key] = entry.get(key, 0) + value
+
+    for row, org in organisations:
+        if is_corporate(org):
+            _add(f"organisation:{row.get('id')}", record_bucket(row.get("created_at")), "corporate_orgs", SHARED_REGION)
+
+    for row, grant in zip(grant_rows, grants):
+        record_key = f"grant:{row.get('id')}"
+        bucket = record_bucket(row.get("close_date"))
+        stage = str(grant.get("stage")).lower()
+        _add(record_key, bucket, "grants", SHARED_REGION, stage)
+        _add(record_key, bucket, "grants_amount", SHARED_REGION, stage, coerce_money(grant.get("amount")))
+
+    for row, payment in zip(payment_rows, payments):
+        bucket = record_bucket(row.get("payment_date"))
+        _add(f"payment:{row.get('id')}", bucket, "payments_amount", SHARED_REGION, "", coerce_money(payment.get("amount")))
+
+    for region in regions:
+        region_people = [(row, p) for row, p in people if record_in_region(p, region)]
+        for row, p in region_people:
+            record_key = f"person:{row.get('id')}"
+            bucket = record_bucket(row.get("created_at"))
+            _add(record_key, bucket, "people", region)
+            if is_volunteer(p):
+                _add(record_key, bucket, "volunteers", region)
+                if is_steering_member(p):
+                    _add(record_key, bucket, "steering_volunteers", region)
+            for label in people_tag_labels(p):
+                _add(record_key, bucket, "people_tags", region, label)
+
+        for row, org in organisations:
+            if not record_in_region(org, region):
+                continue
+            record_key = f"organisation:{row.get('id')}"
+            bucket = record_bucket(row.get("created_at"))
+            _add(record_key, bucket, "orgs", region)
+            kind = partnership_kind(org)
+            if kind:
+                _add(record_key, bucket, kind.lower(), region, str(org.get("type") or "").strip())
+
+        people_by_event_id = build_people_by_event(p for _, p in region_people)
+        region_events = [(row, e) for row, e in events if record_in_region(e, region)]
+        for row, e in region_events:
+            record_key = f"event:{row.get('id')}"
+            bucket = record_bucket(row.get("start_date"))
+            _add(record_key, bucket, "events", region)
+            _add(record_key, bucket, "event_attendee_sum", region, "", event_attendee_count(e))
+            e_type = event_type(e)
+            if is_delivery_event_type(e_type):
+                count = event_participants(e, people_name_by_id, people_by_event_id)[0]
+                _add(record_key, bucket, "delivery_events", region)
+                _add(record_key, bucket, "participants", region, "", count)
+                _add(record_key, bucket, "delivery_event_types", region, event_type_label(e_type))
+
+        seen_attendees = set()
+        for row, e in region_events:
+            event_id = str(e.get("id") or "")
+            bucket = record_bucket(row.get("start_date"))
+            for attendee in event_attendee_rows(event_attendee_records, event_id):
+                if not isinstance(attendee, dict):
+                    continue
+                key = attendee_key(attendee, event_id)
+                if key in seen_attendees:
+                    continue
+                seen_attendees.add(key)
+                record_key = f"attendee:{key}"
+                _link(record_key, ref_token("event", event_id), ref_token("person", attendee.get("person_id")))
+                _add(record_key, bucket, "attendees", region)
+                _add(record_key, bucket, "attendee_gender", region, normalize_gender(get_row_value(attendee, "c_gender", "Gender", "gender")))
+                age_bucket = attendee_age_bucket(attendee, people_age_by_id)
+                if age_bucket:
+                    _add(record_key, bucket, "attendee_age", region, age_bucket)
+    return contributions, {record_key: sorted(tokens) for record_key, tokens in links.items()}
+
+
+def _contribution_payload(entry):
+    # Sorted [measure, region, label, bucket, value] rows; amounts are rounded
+    # so adding and later subtracting the same record cancels exactly.
+    return sorted(
+        [measure, region, label, bucket, round(value, 6) if isinstance(value, float) else value]
+        for (measure, region, label, bucket), value in entry.items()
+    )
+
+
+def contribution_digest(payload, links=()):
+    return hashlib.sha1(json.dumps([payload, list(links)], separators=(",", ":"), ensure_ascii=True).encode("utf-8")).hexdigest()
+
+
+def _kpi_rows_args(rows_by_table):
+    return {
+        "people_rows": rows_by_table.get("beacon_people", []),
+        "org_rows": rows_by_table.get("beacon_organisations", []),
+        "event_rows": rows_by_table.get("beacon_events", []),
+        "attendee_rows": rows_by_table.get("beacon_event_attendees", []),
+        "payment_rows": rows_by_table.get("beacon_payments", []),
+        "grant_rows": rows_by_table.get("beacon_grants", []),
+    }
+
+
+def load_kpi_rows(client):
+    return _kpi_rows_args({table: select_all(client, table, columns) for table, (_, columns) in KPI_SOURCE_TABLES.items()})
+
+
+def _batches(values, size=KPI_LOAD_BATCH_SIZE):
+    values = sorted(values)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def _select_in(client, table, columns, column, values):
+    rows = []
+    for batch in _batches({str(v) for v in values if v not in (None, "")}):
+        rows.extend(client.table(table).select(columns).in_(column, batch).execute().data or [])
+    return rows
+
+
+def _select_linked(client, tokens, prefix=None):
+    # Stored contributions whose links share a token, optionally only those
+    # of one record kind ("event", "person"...).
+    rows = []
+    for batch in _batches({t for t in tokens if t}):
+        query = client.table(KPI_CONTRIBUTIONS_TABLE).select("record_key, links").overlaps("links", batch)
+        if prefix:
+            query = query.like("record_key", f"{prefix}:%")
+        rows.extend(query.execute().data or [])
+    return rows
+
+
+def _record_id(record_key):
+    return str(record_key).split(":", 1)[-1]
+
+
+def load_event_joins(client, event_rows):
+    # The attendees of event_rows and the people those events and attendees
+    # join on (linked to an event, listed on it, or attending), whatever their
+    # own dates, found through the kpi_contributions links. Lets a date-range
+    # drill-down use the same joins as kpi_cube. Returns (attendee_rows,
+    # people_rows).
+    events = [row.get("payload") or {} for row in event_rows]
+    event_ids = {str(e.get("id")) for e in events if e.get("id") not in (None, "")}
+    attendee_rows = _select_in(
+        client, "beacon_event_attendees", KPI_SOURCE_TABLES["beacon_event_attendees"][1], "event_id", event_ids
+    )
+    person_tokens = set()
+    for e in events:
+        if is_delivery_event_type(event_type(e)):
+            person_tokens.update(ref_token("person", x) for x in extract_participant_refs(e)[1])
+    person_tokens.update(ref_token("person", row.get("person_id")) for row in attendee_rows)
+    people_ids = {
+        _record_id(row["record_key"])
+        for row in _select_linked(client, {ref_token("event", i) for i in event_ids}, prefix="person")
+        + _select_linked(client, person_tokens, prefix="person")
+    }
+    people_rows = _select_in(client, "beacon_people", KPI_SOURCE_TABLES["beacon_people"][1], "id", people_ids)
+    return attendee_rows, people_rows
+
+
+def load_changed_kpi_rows(client, changed):
+    # changed maps a beacon_* table to the ids (or full rows) a sync or import
+    # wrote. Returns (rows for build_kpi_contributions, record keys to
+    # rebuild): the changed records, the events that join on a changed person
+    # (linked either way, before or after the change), every attendee of a
+    # changed event or person, plus the records those joins read.
+    rows = {table: {} for table in KPI_SOURCE_TABLES}
+    changed_ids = {table: set() for table in KPI_SOURCE_TABLES}
+    for table, items in (changed or {}).items():
+        if table not in KPI_SOURCE_TABLES:
+            continue
+        for item in items:
+            if isinstance(item, dict):
+                if item.get("id") not in (None, ""):
+                    rows[table][str(item["id"])] = item
+                    changed_ids[table].add(str(item["id"]))
+            elif item not in (None, ""):
+                changed_ids[table].add(str(item))
+
+    def _load(table, ids):
+        missing = {str(i) for i in ids} - set(rows[table])
+        for row in _select_in(client, table, KPI_SOURCE_TABLES[table][1], "id", missing):
+            rows[table][str(row.get("id"))] = row
+
+    for table, ids in changed_ids.items():
+        _load(table, ids)
+    changed_keys = {
+        f"{KPI_SOURCE_TABLES[table][0]}:{record_id}" for table, ids in changed_ids.items() for record_id in ids
+    }
+
+    # Events that list a changed person, and attendees of a changed event or
+    # person.
+    person_tokens = {ref_token("person", i) for i in changed_ids["beacon_people"]}
+    event_tokens = {ref_token("event", i) for i in changed_ids["beacon_events"]}
+    attendee_ids = set(changed_ids["beacon_event_attendees"])
+    for row in _select_linked(client, person_tokens | event_tokens):
+        kind, record_id = row["record_key"].split(":", 1)
+        if kind == "event":
+            event_tokens.add(ref_token("event", record_id))
+        elif kind == "attendee":
+            attendee_ids.add(record_id)
+    # Events a changed person links to, before (stored links) and after.
+    stored_people = _select_in(
+        client, KPI_CONTRIBUTIONS_TABLE, "record_key, links", "record_key",
+        {f"person:{i}" for i in changed_ids["beacon_people"]},
+    )
+    event_tokens.update(t for row in stored_people for t in (row.get("links") or []) if t.startswith("event:"))
+    for person_id in changed_ids["beacon_people"]:
+        person = rows["beacon_people"].get(person_id)
+        if person:
+            event_tokens.update(ref_token("event", x) for x in extract_linked_event_ids(person.get("payload") or {}))
+    # Those events, and everyone linked to them.
+    event_ids = set(changed_ids["beacon_events"])
+    people_ids = set(changed_ids["beacon_people"])
+    for row in _select_linked(client, event_tokens):
+        kind, record_id = row["record_key"].split(":", 1)
+        if kind == "event":
+            event_ids.add(record_id)
+        elif kind == "person":
+            people_ids.add(record_id)
+    _load("beacon_events", event_ids)
+    for row in _select_in(
+        client, "beacon_event_attendees", KPI_SOURCE_TABLES["beacon_event_attendees"][1], "event_id",
+        changed_ids["beacon_events"],
+    ):
+        rows["beacon_event_attendees"][str(row.get("id"))] = row
+        attendee_ids.add(str(row.get("id")))
+    _load("beacon_event_attendees", attendee_ids)
+
+    # The people the rebuilt events list, and the event and person of each
+    # rebuilt attendee.
+    context_people = set()
+    for event_id in event_ids:
+        event = rows["beacon_events"].get(event_id)
+        if event:
+            context_people.update(ref_token("person", x) for x in extract_participant_refs(event.get("payload") or {})[1])
+    context_events = set()
+    for attendee in rows["beacon_event_attendees"].values():
+        context_events.add(ref_token("event", attendee.get("event_id")))
+        context_people.add(ref_token("person", attendee.get("person_id")))
+    _load("beacon_events", {_record_id(row["record_key"]) for row in _select_linked(client, context_events, prefix="event")})
+    people_ids.update(_record_id(row["record_key"]) for row in _select_linked(client, context_people, prefix="person"))
+    _load("beacon_people", people_ids)
+
+    rebuild = changed_keys | {f"event:{i}" for i in event_ids} | {f"attendee:{i}" for i in attendee_ids}
+    return _kpi_rows_args({table: list(table_rows.values()) for table, table_rows in rows.items()}), rebuild
+
+
+def apply_kpi_contributions(client, contributions, links=None, stored=None):
+    # Sends the contributions whose digest differs from the stored one, and
+    # drops stored records that no longer contribute. stored is record key ->
+    # digest of the records being rebuilt (default: every stored record).
+    # Returns (changed, removed).
+    links = links or {}
+    if stored is None:
+        stored = {
+            row.get("record_key"): row.get("digest")
+            for row in select_all(client, KPI_CONTRIBUTIONS_TABLE, "record_key, digest")
+        }
+    changes = []
+    for record_key, entry in contributions.items():
+        payload = _contribution_payload(entry)
+        record_links = links.get(record_key, [])
+        digest = contribution_digest(payload, record_links)
+        if stored.get(record_key) != digest:
+            changes.append({"record_key": record_key, "digest": digest, "contribution": payload, "links": record_links})
+    removed = [record_key for record_key in stored if record_key not in contributions]
+
+    for start in range(0, max(len(changes), len(removed)), KPI_APPLY_BATCH_SIZE):
+        client.rpc(
+            "apply_kpi_contributions",
+            {
+                "changes": changes[start:start + KPI_APPLY_BATCH_SIZE],
+                "removed": removed[start:start + KPI_APPLY_BATCH_SIZE],
+            },
+        ).execute()
+    return len(changes), len(removed)
+
+
+def refresh_kpi_state(client, changed=None):
+    # Brings kpi_cube in line with the stored Beacon tables. changed maps a
+    # beacon_* table to the ids or rows just written; without it, or while
+    # nothing is stored yet, every record is rebuilt. Like the other derived
+    # tables a failure is logged, not raised; the dashboard computes KPIs from
+    # the raw rows until the state is available.
+    try:
+        stored_any = client.table(KPI_CONTRIBUTIONS_TABLE).select("record_key").limit(1).execute().data
+        if changed is None or not stored_any:
+            contributions, links = build_kpi_contributions(**load_kpi_rows(client))
+            stored = None
+        else:
+            kpi_rows, rebuild = load_changed_kpi_rows(client, changed)
+            if not rebuild:
+                return 0
+            contributions, links = build_kpi_contributions(**kpi_rows)
+            contributions = {k: v for k, v in contributions.items() if k in rebuild}
+            stored = {
+                row.get("record_key"): row.get("digest")
+                for row in _select_in(client, KPI_CONTRIBUTIONS_TABLE, "record_key, digest", "record_key", rebuild)
+            }
+        changed_count, removed = apply_kpi_contributions(client, contributions, links, stored)
+    except Exception as e:
+        print(f"KPI state not updated: {e}")
+        return 0
+    return changed_count + removed
+
+
+def clear_kpi_state(client):
+    try:
+        client.table(KPI_CONTRIBUTIONS_TABLE).delete(returning="minimal").neq("record_key", "").execute()
+        client.table(KPI_CUBE_TABLE).delete(returning="minimal").neq("measure", "").execute()
+    except Exception as e:
+        print(f"KPI state not cleared: {e}")
+
+
+def kpi_summary(rows, region, income_rows=()):
+    # The compute_kpis result (without drill-down rows) from kpi_cube_totals
+    # rows for region and SHARED_REGION. income_rows are the kpi_cube
+    # payments_amount/grants_amount rows (measure, day, value) in the range.
+    measures = {}
+    for row in rows:
+        if row.get("region") not in (region, SHARED_REGION):
+            continue
+        value = float(row.get("value") or 0)
+        if value:
+            measures.setdefault(row.get("measure"), {})[row.get("label") or ""] = value
+
+    def _total(measure):
+        return sum(measures.get(measure, {}).values())
+
+    def _count(measure):
+        return int(round(_total(measure)))
+
+    def _counts(measure):
+        counts = {label: int(round(v)) for label, v in measures.get(measure, {}).items()}
+        return {label: n for label, n in counts.items() if n}
+
+    volunteers = _count("volunteers")
+    steering_volunteers = _count("steering_volunteers")
+    steering_group_proxy = steering_volunteers if steering_volunteers else volunteers
+
+    lsp_counts = _counts("lsp")
+    ldp_counts = _counts("ldp")
+
+    grant_stages = _counts("grants")
+    bids_submitted = sum(n for stage, n in grant_stages.items() if any(x in stage for x in BID_STAGE_TOKENS))
+    total_funds = measures.get("grants_amount", {}).get("won", 0.0) + _total("payments_amount")
+
+    region_events = _count("events")
+    delivery_event_count = _count("delivery_events")
+    walks_delivered = delivery_event_count
+    participants = _count("participants")
+    if walks_delivered == 0 and region_events:
+        walks_delivered = region_events
+        participants = _count("event_attendee_sum")
+    event_type_counts = _counts("delivery_event_types")
+
+    attendee_gender = _counts("attendee_gender")
+    attendee_age = _counts("attendee_age")
+    people_tags = _counts("people_tags")
+    if attendee_gender or attendee_age:
+        delivery_demographics = dict(attendee_gender)
+        for label in AGE_BUCKET_ORDER:
+            if attendee_age.get(label):
+                delivery_demographics[label] = attendee_age[label]
+        unknown_age_count = max(0, _count("attendees") - sum(attendee_age.values()))
+        if unknown_age_count:
+            delivery_demographics["Unknown Age"] = unknown_age_count
+        delivery_demographics_source = "event_attendee_demographics"
+    elif people_tags:
+        delivery_demographics = people_tags
+        delivery_demographics_source = "people_type_tags"
+    elif event_type_counts:
+        delivery_demographics = event_type_counts
+        delivery_demographics_source = "event_type_split"
+    else:
+        delivery_demographics = {"Unknown": participants if participants > 0 else 0}
+        delivery_demographics_source = "unknown"
+
+    daily_income = {}
+    for row in income_rows:
+        source = {"payments_amount": "Payments", "grants_amount": "Grants"}.get(row.get("measure"))
+        if source and row.get("day"):
+            key = (row.get("day"), source)
+            daily_income[key] = daily_income.get(key, 0.0) + float(row.get("value") or 0)
+
+    return {
+        "region": region,
+        "last_updated": datetime.now().strftime("%H:%M:%S"),
+        "governance": {
+            "steering_group_active": steering_group_proxy > 0,
+            "steering_members": steering_group_proxy,
+            "volunteers_new": volunteers,
+        },
+        "partnerships": {
+            "LSP": lsp_counts if lsp_counts else {"None": 0},
+            "LDP": ldp_counts if ldp_counts else {"None": 0},
+            "active_referrals": _count("orgs"),
+            "networks_sat_on": 0,
+        },
+        "delivery": {
+            "walks_delivered": walks_delivered,
+            "participants": participants,
+            "bursary_participants": 0,
+            "wellbeing_change_score": 0,
+            "demographics": delivery_demographics,
+            "demographics_source": delivery_demographics_source,
+        },
+        "income": {
+            "bids_submitted": bids_submitted,
+            "total_funds_raised": total_funds,
+            "corporate_partners": _count("corporate_orgs"),
+            "in_kind_value": 0,
+        },
+        "comms": {
+            "press_releases": 0,
+            "media_coverage": 0,
+            "newsletters_sent": 0,
+            "open_rate": 0,
+        },
+        "_debug": {
+            "region_people": _count("people"),
+            "volunteers": volunteers,
+            "steering_volunteers": steering_volunteers,
+            "region_events": region_events,
+            "walk_events": walks_delivered,
+            "participants": participants,
+            "region_grants": sum(grant_stages.values()),
+            "bids_submitted": bids_submitted,
+            "delivery_events_tagged": delivery_event_count,
+        },
+        # Daily payment/grant totals for the Income Over Time chart, in place
+        # of the raw rows compute_kpis returns in _raw_income.
+        "_income_rows": [
+            {"date": day, "source": source, "amount": amount}
+            for (day, source), amount in sorted(daily_income.items())
+        ],
+        "_raw_kpi": {},
+    }
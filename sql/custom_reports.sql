@@ -0,0 +1,69 @@
+-- Saved Custom Reports Dashboard definitions, one row per report. The app
+-- lists a user's reports by owner_email or by membership of shared_with
+-- (lower-cased emails), instead of replaying "Custom Report Saved/Share
+-- Updated" rows from audit_logs. Those audit rows are still written.
+create table if not exists public.custom_reports (
+    report_id text primary key,
+    name text not null default 'Untitled Report',
+    owner_email text not null default '',
+    shared_with text[] not null default '{}',
+    config jsonb not null default '{}'::jsonb,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists custom_reports_owner_updated_idx on public.custom_reports (owner_email, updated_at desc);
+create index if not exists custom_reports_shared_with_idx on public.custom_reports using gin (shared_with);
+
+-- One-off backfill of reports saved before this table existed: the first
+-- save gives the owner, the owner's latest audit row gives name and sharing,
+-- the latest save gives the config.
+with events as (
+    select
+        created_at,
+        action,
+        details,
+        details->>'report_id' as report_id,
+        lower(trim(coalesce(details->>'owner_email', ''))) as owner_email
+    from public.audit_logs
+    where action in ('Custom Report Saved', 'Custom Report Share Updated')
+        and details->>'source' = 'custom_reports'
+        and coalesce(details->>'report_id', '') <> ''
+),
+first_saved as (
+    select distinct on (report_id) report_id, owner_email, created_at
+    from events
+    where action = 'Custom Report Saved'
+    order by report_id, created_at
+),
+latest as (
+    select distinct on (e.report_id) e.report_id, e.details, e.created_at
+    from events e
+    join first_saved f on f.report_id = e.report_id and f.owner_email = e.owner_email
+    order by e.report_id, e.created_at desc
+),
+saved as (
+    select distinct on (report_id) report_id, details->'config' as config
+    from events
+    where action = 'Custom Report Saved'
+    order by report_id, created_at desc
+)
+insert into public.custom_reports (report_id, name, owner_email, shared_with, config, created_at, updated_at)
+select
+    l.report_id,
+    coalesce(nullif(trim(l.details->>'report_name'), ''), 'Untitled Report'),
+    f.owner_email,
+    array(
+        select distinct lower(trim(e))
+        from jsonb_array_elements_text(
+            case when jsonb_typeof(l.details->'shared_with') = 'array' then l.details->'shared_with' else '[]'::jsonb end
+        ) e
+        where trim(e) <> ''
+    ),
+    coalesce(s.config, '{}'::jsonb),
+    coalesce(f.created_at, l.created_at),
+    l.created_at
+from latest l
+join first_saved f on f.report_id = l.report_id
+left join saved s on s.report_id = l.report_id
+on conflict (report_id) do nothing;
@@ -0,0 +1,23 @@
+-- Per-funder income totals by day, source (Payments/Grants) and grant stage,
+-- rebuilt by the Beacon sync and the CSV imports
+-- (beacon_sync.replace_funder_income_rollups). A Funder user's dashboard reads
+-- its own rows here instead of loading and filtering every payment and grant.
+-- bucket is income_date as text, or 'undated' so rows without a date still
+-- count towards all-time totals. Needs funder_index.sql for funder_key.
+create table if not exists public.funder_income_rollups (
+    funder_key text not null,
+    funder_name text,
+    source text not null,
+    stage text not null default '',
+    bucket text not null,
+    income_date date,
+    row_count integer not null default 0,
+    amount numeric not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (funder_key, source, stage, bucket)
+);
+
+create index if not exists funder_income_rollups_funder_date_idx
+    on public.funder_income_rollups (funder_key, income_date);
+create index if not exists funder_income_rollups_updated_at_idx
+    on public.funder_income_rollups (updated_at desc);
@@ -0,0 +1,31 @@
+-- Funder attribution resolved at sync/import time (beacon_sync.funder_columns).
+-- funder_key is the normalised funder name: the Funder Dashboard filters
+-- payments and grants with an indexed equality match on it, and
+-- beacon_funders lists every distinct funder without reading payloads.
+-- Existing rows are filled in by beacon_sync.backfill_funder_columns, which
+-- every Beacon sync and CSV import runs; until then the app reads payloads.
+alter table public.beacon_payments add column if not exists funder_name text;
+alter table public.beacon_payments add column if not exists funder_key text;
+alter table public.beacon_grants add column if not exists funder_name text;
+alter table public.beacon_grants add column if not exists funder_key text;
+
+create index if not exists beacon_payments_funder_key_idx
+    on public.beacon_payments (funder_key, payment_date);
+create index if not exists beacon_grants_funder_key_idx
+    on public.beacon_grants (funder_key, close_date);
+
+-- security_invoker keeps the base tables' row level security in force.
+create or replace view public.beacon_funders
+with (security_invoker = true) as
+select
+    funder_key,
+    min(funder_name) as funder_name,
+    sum(payments) as payments,
+    sum(grants) as grants
+from (
+    select funder_key, funder_name, 1 as payments, 0 as grants from public.beacon_payments
+    union all
+    select funder_key, funder_name, 0 as payments, 1 as grants from public.beacon_grants
+) income
+where funder_key is not null and funder_key <> ''
+group by funder_key;
@@ -0,0 +1,145 @@
+-- Headline KPI aggregates maintained by the Beacon sync and the CSV imports
+-- (kpi_state.refresh_kpi_state). kpi_cube holds each measure per region,
+-- label (org type, event type, grant stage, gender, age band...) and day, so
+-- any dashboard date range is a sum over its buckets (kpi_cube_totals).
+-- bucket is the day as text, or 'undated' for records without a date, which
+-- only count towards "All Time". region '' holds the measures that don't
+-- depend on region (income, corporate partners). kpi_contributions holds what
+-- each stored record adds as [measure, region, label, bucket, value] rows
+-- plus a digest; a refresh only sends records whose digest changed. links
+-- holds the record's own ref ('person:123', 'event:45') and the refs its
+-- contribution joins on, so a refresh finds the events and attendees to
+-- rebuild for the records it wrote with one indexed overlap query.
+create table if not exists public.kpi_cube (
+    measure text not null,
+    region text not null default '',
+    label text not null default '',
+    bucket text not null,
+    day date,
+    value numeric not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (measure, region, label, bucket)
+);
+
+create index if not exists kpi_cube_region_day_idx on public.kpi_cube (region, day);
+
+create table if not exists public.kpi_contributions (
+    record_key text primary key,
+    digest text not null,
+    contribution jsonb not null default '[]'::jsonb,
+    links text[] not null default '{}',
+    updated_at timestamptz not null default now()
+);
+
+-- Upgrading from the all-time kpi_state table: contributions stored without
+-- a day bucket are dropped with it and rebuilt by the next refresh.
+drop table if exists public.kpi_state;
+delete from public.kpi_contributions where contribution->0->>4 is null;
+
+-- Contributions stored before links existed can't be found from the records
+-- they join on: clear them, and the next refresh rebuilds everything.
+do $$
+begin
+    if not exists (
+        select 1 from information_schema.columns
+        where table_schema = 'public' and table_name = 'kpi_contributions' and column_name = 'links'
+    ) then
+        alter table public.kpi_contributions add column links text[] not null default '{}';
+        truncate public.kpi_cube, public.kpi_contributions;
+    end if;
+end $$;
+
+create index if not exists kpi_contributions_links_idx on public.kpi_contributions using gin (links);
+
+-- Replaces the stored contribution of each changed record and removes the
+-- listed records, adding (new - stored) to kpi_cube in the same transaction.
+-- Calls are serialised with a transaction-level advisory lock: row locks
+-- can't cover a record_key that isn't stored yet, and two refreshes inserting
+-- the same new record (a worker sync and an upload) would both add it in full.
+-- The stored contribution is read after the lock, so a re-applied change
+-- only adds what differs from the stored one.
+create or replace function public.apply_kpi_contributions(changes jsonb, removed text[] default '{}')
+returns integer
+language plpgsql
+set search_path = public
+as $$
+declare
+    n integer;
+begin
+    perform pg_advisory_xact_lock(hashtext('public.apply_kpi_contributions'));
+
+    with new_rows as (
+        select c->>'record_key' as record_key, c->'contribution' as contribution
+        from jsonb_array_elements(changes) c
+    ),
+    old_rows as (
+        select k.contribution
+        from public.kpi_contributions k
+        where k.record_key in (select record_key from new_rows) or k.record_key = any(removed)
+    ),
+    deltas as (
+        select measure, region, label, bucket, sum(value) as delta
+        from (
+            select e->>0 as measure, e->>1 as region, e->>2 as label, e->>3 as bucket, (e->>4)::numeric as value
+            from new_rows, jsonb_array_elements(new_rows.contribution) e
+            union all
+            select e->>0, e->>1, e->>2, e->>3, -((e->>4)::numeric)
+            from old_rows, jsonb_array_elements(old_rows.contribution) e
+        ) d
+        group by measure, region, label, bucket
+        having sum(value) <> 0
+    )
+    insert into public.kpi_cube as s (measure, region, label, bucket, day, value, updated_at)
+    select
+        measure,
+        region,
+        label,
+        bucket,
+        case when bucket = 'undated' then null else bucket::date end,
+        delta,
+        now()
+    from deltas
+    on conflict (measure, region, label, bucket)
+    do update set value = s.value + excluded.value, updated_at = excluded.updated_at;
+    get diagnostics n = row_count;
+
+    delete from public.kpi_cube where value = 0;
+    delete from public.kpi_contributions where record_key = any(removed);
+    insert into public.kpi_contributions (record_key, digest, contribution, links, updated_at)
+    select
+        c->>'record_key',
+        c->>'digest',
+        c->'contribution',
+        array(select jsonb_array_elements_text(coalesce(c->'links', '[]'::jsonb))),
+        now()
+    from jsonb_array_elements(changes) c
+    on conflict (record_key)
+    do update set
+        digest = excluded.digest,
+        contribution = excluded.contribution,
+        links = excluded.links,
+        updated_at = excluded.updated_at;
+    return n;
+end;
+$$;
+
+revoke all on function public.apply_kpi_contributions(jsonb, text[]) from public, anon, authenticated;
+grant execute on function public.apply_kpi_contributions(jsonb, text[]) to service_role;
+
+-- Totals per measure and label for one region (plus region '') over an
+-- inclusive day range; null bounds are open, and with no bounds at all the
+-- undated bucket is included too ("All Time").
+create or replace function public.kpi_cube_totals(p_region text, p_start date default null, p_end date default null)
+returns table (measure text, region text, label text, value numeric)
+language sql
+stable
+set search_path = public
+as $$
+    select c.measure, c.region, c.label, sum(c.value)
+    from public.kpi_cube c
+    where c.region in (p_region, '')
+        and (p_start is null or c.day >= p_start)
+        and (p_end is null or c.day <= p_end)
+    group by c.measure, c.region, c.label
+    having sum(c.value) <> 0;
+$$;
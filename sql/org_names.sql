@@ -0,0 +1,11 @@
+-- Organisation id -> display name, kept up to date by the Beacon sync and the
+-- CSV imports (beacon_sync.upsert_org_names). ref_key is the normalised id
+-- (beacon_utils.entity_ref_key). The app loads the whole table with one narrow
+-- select and reloads it only when max(updated_at) moves.
+create table if not exists public.org_names (
+    ref_key text primary key,
+    name text not null,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists org_names_updated_at_idx on public.org_names (updated_at desc);
@@ -0,0 +1,56 @@
+-- Bulk reset used by "Refresh All Dashboard Data" (clear_dashboard_data_except_users).
+-- Truncates the listed dashboard tables in one statement and returns the row
+-- count each one held. Only tables in the allow-list can be reset; user/auth
+-- tables are never included. The tables derived from the Beacon data
+-- (org_names, funder_income_rollups, kpi_*) are reset with it; any of those
+-- not created yet is skipped.
+create or replace function public.reset_dashboard_data(table_names text[])
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    allowed text[] := array[
+        'beacon_people',
+        'beacon_organisations',
+        'beacon_events',
+        'beacon_event_attendees',
+        'beacon_payments',
+        'beacon_grants',
+        'case_studies',
+        'audit_logs'
+    ];
+    derived text[] := array[
+        'org_names',
+        'funder_income_rollups',
+        'kpi_contributions',
+        'kpi_cube'
+    ];
+    present text[] := '{}';
+    t text;
+    n bigint;
+    counts jsonb := '{}'::jsonb;
+begin
+    foreach t in array table_names loop
+        if not (t = any(allowed || derived)) then
+            raise exception 'Table % is not part of the dashboard reset', t;
+        end if;
+        if t = any(derived) and to_regclass(format('public.%I', t)) is null then
+            continue;
+        end if;
+        execute format('select count(*) from public.%I', t) into n;
+        counts := counts || jsonb_build_object(t, n);
+        present := present || t;
+    end loop;
+    if cardinality(present) > 0 then
+        execute 'truncate table ' || (
+            select string_agg(format('public.%I', name), ', ') from unnest(present) as name
+        );
+    end if;
+    return counts;
+end;
+$$;
+
+revoke all on function public.reset_dashboard_data(text[]) from public, anon, authenticated;
+grant execute on function public.reset_dashboard_data(text[]) to service_role;
@@ -0,0 +1,26 @@
+-- One row per manual Beacon sync job, updated in place by the app.
+-- Status polls read a single row by job_id (or the newest row per user).
+-- Also the queue for sync_worker.py, which claims rows with status = 'queued'.
+-- updated_at is the running job's heartbeat; running rows it has not touched
+-- for sync_job_store.STALE_JOB_SECONDS are marked failed, as are queued rows
+-- no worker claimed within sync_job_store.QUEUED_JOB_SECONDS of created_at.
+create table if not exists public.sync_jobs (
+    job_id text primary key,
+    source text,
+    trigger text,
+    status text not null default 'queued',
+    progress integer not null default 0,
+    message text,
+    user_email text,
+    region text,
+    cancel_requested boolean not null default false,
+    result jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    started_at timestamptz,
+    ended_at timestamptz,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists sync_jobs_user_created_idx on public.sync_jobs (user_email, created_at desc);
+create index if not exists sync_jobs_created_idx on public.sync_jobs (created_at desc);
@@ -0,0 +1,333 @@
+import threading
+import time
+from datetime import datetime, UTC
+
+# Manual sync job state, one row per job. Held in process memory (imported
+# modules survive Streamlit reruns, unlike globals in app.py) and written
+# through to the Supabase sync_jobs table (sql/sync_jobs.sql), so a status
+# poll is a single-row read instead of replaying audit_logs. The same table is
+# the queue for sync_worker.py: the app enqueues a row, a worker claims it.
+
+SYNC_JOBS_TABLE = "sync_jobs"
+ACTIVE_STATUSES = ("queued", "running")
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+PROGRESS_WRITE_INTERVAL_SECONDS = 1.0
+# updated_at is the job's heartbeat: the process running a job writes it with
+# every progress update and at least every HEARTBEAT_INTERVAL_SECONDS while it
+# polls for cancellation. A running row not written for STALE_JOB_SECONDS
+# belongs to a process that died, and is marked failed. Queued rows have no
+# heartbeat (they wait while a worker runs an earlier job), so they only fail
+# once QUEUED_JOB_SECONDS pass after they were created with no worker claiming
+# them.
+HEARTBEAT_INTERVAL_SECONDS = 60.0
+STALE_JOB_SECONDS = 15 * 60
+QUEUED_JOB_SECONDS = 2 * 60 * 60
+
+_COLUMNS = (
+    "job_id",
+    "source",
+    "trigger",
+    "status",
+    "progress",
+    "message",
+    "user_email",
+    "region",
+    "cancel_requested",
+    "result",
+    "error",
+    "created_at",
+    "started_at",
+    "ended_at",
+)
+_TIMESTAMP_COLUMNS = ("created_at", "started_at", "ended_at")
+# Fields that only move a progress bar; everything else is written at once.
+_THROTTLED_FIELDS = {"progress", "message"}
+
+
+def _to_iso(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(float(ts), UTC).isoformat()
+
+
+def _from_iso(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def state_to_row(state):
+    row = {k: state.get(k) for k in _COLUMNS if k in state and k != "job_id"}
+    for k in _TIMESTAMP_COLUMNS:
+        if k in row:
+            row[k] = _to_iso(row[k])
+    row["updated_at"] = datetime.now(UTC).isoformat()
+    return row
+
+
+def row_to_state(row):
+    state = {k: v for k, v in (row or {}).items() if v is not None}
+    for k in _TIMESTAMP_COLUMNS:
+        if k in state:
+            state[k] = _from_iso(state[k])
+    return state
+
+
+def _is_missing_table_error(exc):
+    msg = str(exc).lower()
+    return SYNC_JOBS_TABLE in msg and any(
+        token in msg for token in ("does not exist", "42p01", "pgrst205", "could not find the table")
+    )
+
+
+class SyncJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_factory = None
+        self._table_missing = False
+        self._last_write = {}
+        self._dirty = {}
+        self._last_cancel_check = {}
+
+    def bind(self, client_factory):
+        # The client is created lazily, once per process.
+        if self._client_factory is None:
+            self._client_factory = client_factory
+
+    @property
+    def durable(self):
+        return self._client_factory is not None and not self._table_missing
+
+    def _table(self):
+        if not self.durable:
+            return None
+        if self._client is None:
+            self._client = self._client_factory()
+        if self._client is None:
+            return None
+        return self._client.table(SYNC_JOBS_TABLE)
+
+    def _handle_error(self, action, exc):
+        if _is_missing_table_error(exc):
+            self._table_missing = True
+        else:
+            print(f"Sync job state {action} error: {exc}")
+
+    def _write(self, job_id, state, changed, create=False, force=False):
+        # Only changed columns are written, so a progress update from the
+        # worker never overwrites a cancel request made from the UI.
+        with self._lock:
+            dirty = self._dirty.setdefault(job_id, set())
+            dirty.update(changed)
+            now = time.time()
+            if not (create or force) and dirty <= _THROTTLED_FIELDS and state.get("progress") not in (0, 100):
+                if now - self._last_write.get(job_id, 0) < PROGRESS_WRITE_INTERVAL_SECONDS:
+                    return
+            fields = {k: state.get(k) for k in dirty if k in state}
+            self._dirty[job_id] = set()
+            self._last_write[job_id] = now
+        try:
+            table = self._table()
+            if table is None:
+                return
+            row = state_to_row(fields)
+            if create:
+                table.upsert({**row, "job_id": job_id}, on_conflict="job_id").execute()
+            else:
+                table.update(row).eq("job_id", job_id).execute()
+        except Exception as e:
+            self._handle_error("write", e)
+
+    def _read(self, query):
+        try:
+            table = self._table()
+            if table is None:
+                return None
+            rows = query(table.select("*")).limit(1).execute().data or []
+        except Exception as e:
+            self._handle_error("read", e)
+            return None
+        return row_to_state(rows[0]) if rows else None
+
+    def _active_row(self):
+        self._expire_stale()
+        return self._read(lambda q: q.in_("status", list(ACTIVE_STATUSES)).order("created_at", desc=True))
+
+    def _expire_stale(self):
+        now = time.time()
+        stopped = state_to_row(
+            {
+                "status": "failed",
+                "progress": 100,
+                "message": "Sync job stopped responding.",
+                "error": f"No heartbeat for {STALE_JOB_SECONDS // 60} minutes; the process running it stopped.",
+                "ended_at": now,
+            }
+        )
+        unclaimed = state_to_row(
+            {
+                "status": "failed",
+                "progress": 100,
+                "message": "No worker picked this job up.",
+                "error": f"Queued for {QUEUED_JOB_SECONDS // 3600} hours without a worker claiming it; check sync_worker.py is running.",
+                "ended_at": now,
+            }
+        )
+        try:
+            table = self._table()
+            if table is None:
+                return
+            table.update(stopped).eq("status", "running").lt("updated_at", _to_iso(now - STALE_JOB_SECONDS)).execute()
+            table.update(unclaimed).eq("status", "queued").lt("created_at", _to_iso(now - QUEUED_JOB_SECONDS)).execute()
+        except Exception as e:
+            self._handle_error("expire", e)
+
+    def claim(self, job_id, **fields):
+        # Creates a job that this process will run, unless one is already
+        # active here; returns (job_id, created).
+        with self._lock:
+            for existing_id, state in self._jobs.items():
+                if state.get("status") in ACTIVE_STATUSES:
+                    return existing_id, False
+            state = {"job_id": job_id, **fields}
+            self._jobs[job_id] = state
+            snapshot = dict(state)
+        self._write(job_id, snapshot, set(snapshot), create=True)
+        return job_id, True
+
+    def enqueue(self, job_id, **fields):
+        # Hands a job to an out-of-process worker through the table; nothing
+        # is kept locally so status reads always come from the stored row.
+        if not self.durable:
+            return None, False
+        active = self._active_row()
+        if active:
+            return active.get("job_id"), False
+        state = {"job_id": job_id, **fields}
+        self._write(job_id, state, set(state), create=True)
+        return (job_id, True) if self.durable else (None, False)
+
+    def claim_next(self, **fields):
+        # Worker side: atomically move the oldest queued job to running.
+        # The status filter on the update makes a second worker's claim a no-op.
+        self._expire_stale()
+        queued = self._read(lambda q: q.eq("status", "queued").order("created_at"))
+        if not queued:
+            return None
+        job_id = queued["job_id"]
+        row = state_to_row({"status": "running", **fields})
+        try:
+            claimed = (
+                self._table()
+                .update(row)
+                .eq("job_id", job_id)
+                .eq("status", "queued")
+                .execute()
+                .data
+                or []
+            )
+        except Exception as e:
+            self._handle_error("claim", e)
+            return None
+        if not claimed:
+            return None
+        state = row_to_state(claimed[0])
+        with self._lock:
+            self._jobs[job_id] = state
+        return dict(state)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is not None:
+                state.update(fields)
+                snapshot = dict(state)
+        if state is None:
+            # Job owned by another process: write just these columns.
+            snapshot = {"job_id": job_id, **fields}
+        self._write(job_id, snapshot, set(fields))
+        return snapshot
+
+    def cancel_requested(self, job_id):
+        # Cancel requests may come from another process, so the stored row is
+        # re-read at most once per PROGRESS_WRITE_INTERVAL_SECONDS. Only the
+        # process running the job polls this, so it also sends the heartbeat.
+        state = self.get_local(job_id) or {}
+        if state.get("cancel_requested"):
+            return True
+        if not self.durable:
+            return False
+        now = time.time()
+        if state and now - self._last_write.get(job_id, 0) >= HEARTBEAT_INTERVAL_SECONDS:
+            self._write(job_id, state, set(), force=True)
+        if now - self._last_cancel_check.get(job_id, 0) < PROGRESS_WRITE_INTERVAL_SECONDS:
+            return False
+        self._last_cancel_check[job_id] = now
+        row = self._read(lambda q: q.eq("job_id", job_id))
+        if row and (row.get("cancel_requested") or row.get("status") in TERMINAL_STATUSES):
+            with self._lock:
+                if job_id in self._jobs:
+                    self._jobs[job_id]["cancel_requested"] = True
+            return True
+        return False
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._dirty.pop(job_id, None)
+            self._last_write.pop(job_id, None)
+        self._last_cancel_check.pop(job_id, None)
+
+    def get(self, job_id):
+        if not job_id:
+            return None
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state:
+                return dict(state)
+        return self._read(lambda q: q.eq("job_id", job_id))
+
+    def get_local(self, job_id):
+        with self._lock:
+            state = self._jobs.get(job_id)
+            return dict(state) if state else None
+
+    def recent_local_job_id(self, user_email=None, max_age_seconds=7200):
+        now_ts = time.time()
+        candidates = []
+        with self._lock:
+            for job_id, state in self._jobs.items():
+                created_at = state.get("created_at") or state.get("started_at") or now_ts
+                if (now_ts - created_at) > max_age_seconds:
+                    continue
+                if user_email and state.get("user_email") not in (user_email, "System"):
+                    continue
+                candidates.append((created_at, job_id))
+        if not candidates:
+            return None
+        candidates.sort(reverse=True)
+        return candidates[0][1]
+
+    def latest(self, user_email=None):
+        local_id = self.recent_local_job_id(user_email)
+        local = self.get_local(local_id) if local_id else None
+
+        def _query(q):
+            if user_email:
+                q = q.in_("user_email", [user_email, "System"])
+            return q.order("created_at", desc=True)
+
+        remote = self._read(_query)
+        if local and remote:
+            return local if (local.get("created_at") or 0) >= (remote.get("created_at") or 0) else remote
+        return local or remote
+
+
+SYNC_JOB_STORE = SyncJobStore()
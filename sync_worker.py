@@ -0,0 +1,109 @@
+import os
+import socket
+import sys
+import time
+
+from supabase import create_client
+
+from beacon_sync import SyncCancelledError
+from sync_beacon_to_supabase import (
+    get_env_or_secret,
+    load_secrets,
+    log_system_audit,
+    run_sync_once,
+)
+from sync_job_store import SyncJobStore
+
+# Runs manual syncs queued by the app (SYNC_WORKER_MODE=worker or subprocess)
+# outside the Streamlit server. Jobs, progress and cancel requests all go
+# through the sync_jobs table (sql/sync_jobs.sql).
+#
+#   python sync_worker.py          poll for queued jobs until stopped
+#   python sync_worker.py --once   run queued jobs, then exit
+
+WORKER_POLL_SECONDS = 5
+
+
+def run_job(store, client, job, beacon_key, account_id, beacon_base_url):
+    job_id = job["job_id"]
+    user_email = job.get("user_email") or "System"
+    region = job.get("region") or "Global"
+    context = {"source": "beacon_api", "trigger": job.get("trigger") or "manual_ui", "job_id": job_id}
+    log_system_audit(client, "Data Sync Started", context, region=region, user_email=user_email)
+
+    def _progress(progress, message):
+        store.update(job_id, progress=int(max(0, min(100, progress))), message=message)
+
+    try:
+        summary = run_sync_once(
+            client,
+            beacon_key,
+            account_id,
+            beacon_base_url,
+            progress_callback=_progress,
+            should_cancel=lambda: store.cancel_requested(job_id),
+        )
+        result = {**context, **summary}
+        log_system_audit(client, "Data Sync Completed", result, region=region, user_email=user_email)
+        store.update(
+            job_id,
+            status="completed",
+            progress=100,
+            message="Beacon API sync complete.",
+            ended_at=time.time(),
+            result=result,
+        )
+    except SyncCancelledError:
+        log_system_audit(client, "Data Sync Cancelled", context, region=region, user_email=user_email)
+        store.update(job_id, status="cancelled", progress=100, message="Manual sync cancelled.", ended_at=time.time())
+    except Exception as e:
+        log_system_audit(client, "Data Sync Failed", {**context, "error": str(e)}, region=region, user_email=user_email)
+        store.update(
+            job_id,
+            status="failed",
+            progress=100,
+            message="Beacon API sync failed.",
+            ended_at=time.time(),
+            error=str(e),
+        )
+    finally:
+        store.forget(job_id)
+
+
+def main():
+    secrets = load_secrets()
+    supabase_url = get_env_or_secret(secrets, "SUPABASE_URL") or (secrets.get("supabase") or {}).get("url")
+    supabase_key = get_env_or_secret(secrets, "SUPABASE_SERVICE_ROLE_KEY") or (secrets.get("supabase") or {}).get("key")
+    beacon_key = get_env_or_secret(secrets, "BEACON_API_KEY")
+    account_id = get_env_or_secret(secrets, "BEACON_ACCOUNT_ID")
+    beacon_base_url = get_env_or_secret(secrets, "BEACON_BASE_URL")
+
+    if not supabase_url or not supabase_key:
+        raise SystemExit("Missing Supabase URL or key. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.")
+    if not beacon_key:
+        raise SystemExit("Missing Beacon credentials. Set BEACON_API_KEY.")
+    if not beacon_base_url and not account_id:
+        raise SystemExit("Set BEACON_BASE_URL (preferred) or BEACON_ACCOUNT_ID.")
+
+    client = create_client(supabase_url, supabase_key)
+    store = SyncJobStore()
+    store.bind(lambda: client)
+    run_once = "--once" in sys.argv[1:]
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Sync worker {worker_id} started.")
+
+    while True:
+        job = store.claim_next(progress=0, message="Starting Beacon API sync...", started_at=time.time())
+        if job:
+            print(f"Running sync job {job['job_id']}.")
+            run_job(store, client, job, beacon_key, account_id, beacon_base_url)
+            continue
+        if not store.durable:
+            raise SystemExit("sync_jobs table not found. Apply sql/sync_jobs.sql first.")
+        if run_once:
+            break
+        time.sleep(WORKER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import beacon_sync  # noqa: E402
+from fakes import FakeBeacon, FakeSupabase  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return FakeSupabase()
+
+
+@pytest.fixture
+def beacon(monkeypatch):
+    # Beacon records per entity endpoint, one list per page; tests fill
+    # beacon.pages before running a sync.
+    fake = FakeBeacon({})
+    monkeypatch.setattr(beacon_sync.requests, "get", fake.get)
+    monkeypatch.setattr(beacon_sync.time, "sleep", lambda seconds: None)
+    return fake
@@ -0,0 +1,270 @@
+import copy
+import fnmatch
+from decimal import Decimal
+from urllib.parse import urlparse
+
+
+# In-memory stand-ins for the Supabase client and the Beacon API, covering the
+# calls the sync engine and kpi_state make.
+
+
+class FakeResponse:
+    def __init__(self, data=None, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = None
+        self._values = None
+        self._on_conflict = "id"
+        self._filters = []
+        self._negate = False
+        self._order = None
+        self._limit = None
+        self._range = None
+        self._count = None
+
+    # Operations start a new query, like postgrest's request builders, so a
+    # table handle can be reused.
+    def _start(self, op):
+        query = FakeQuery(self._client, self._table)
+        query._op = op
+        return query
+
+    def select(self, columns="*", count=None):
+        query = self._start("select")
+        query._columns = [c.strip() for c in columns.split(",")] if columns != "*" else None
+        query._count = count
+        return query
+
+    def upsert(self, rows, on_conflict="id"):
+        query = self._start("upsert")
+        query._values = copy.deepcopy(rows if isinstance(rows, list) else [rows])
+        query._on_conflict = on_conflict
+        return query
+
+    def update(self, values):
+        query = self._start("update")
+        query._values = copy.deepcopy(values)
+        return query
+
+    def delete(self, count=None, returning=None):
+        query = self._start("delete")
+        query._count = count
+        return query
+
+    # Filters
+    def _filter(self, test):
+        negate = self._negate
+        self._negate = False
+        self._filters.append((lambda row: not test(row)) if negate else test)
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) < value)
+
+    def in_(self, column, values):
+        values = {str(v) for v in values}
+        return self._filter(lambda row: str(row.get(column)) in values)
+
+    def is_(self, column, value):
+        assert value == "null"
+        return self._filter(lambda row: row.get(column) is None)
+
+    def like(self, column, pattern):
+        pattern = pattern.replace("%", "*")
+        return self._filter(lambda row: fnmatch.fnmatchcase(str(row.get(column)), pattern))
+
+    def overlaps(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: bool(set(row.get(column) or []) & values))
+
+    def contains(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: values <= set(row.get(column) or []))
+
+    # Modifiers
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+
+    def execute(self):
+        self._client.calls.append((self._table, self._op))
+        rows = self._client.tables.setdefault(self._table, [])
+        if self._op == "upsert":
+            error = self._client.next_upsert_error(self._table)
+            if error:
+                raise error
+            keys = [k.strip() for k in self._on_conflict.split(",")]
+            for value in self._values:
+                existing = next((r for r in rows if all(r.get(k) == value.get(k) for k in keys)), None)
+                if existing is None:
+                    rows.append(value)
+                else:
+                    existing.update(value)
+            return FakeResponse(copy.deepcopy(self._values))
+        matched = [row for row in rows if all(test(row) for test in self._filters)]
+        if self._op == "update":
+            for row in matched:
+                row.update(copy.deepcopy(self._values))
+            return FakeResponse(copy.deepcopy(matched))
+        if self._op == "delete":
+            self._client.tables[self._table] = [row for row in rows if row not in matched]
+            return FakeResponse([], count=len(matched))
+        if self._order:
+            column, desc = self._order
+            matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        count = len(matched)
+        if self._range:
+            matched = matched[self._range[0]:self._range[1] + 1]
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        if self._columns is not None:
+            matched = [{c: row.get(c) for c in self._columns} for row in matched]
+        return FakeResponse(copy.deepcopy(matched), count=count if self._count else None)
+
+
+class FakeRpc:
+    def __init__(self, handler, params):
+        self._handler = handler
+        self._params = copy.deepcopy(params)
+
+    def execute(self):
+        return FakeResponse(self._handler(self._params))
+
+
+class FakeSupabase:
+    def __init__(self, tables=None):
+        self.tables = copy.deepcopy(tables or {})
+        self.calls = []
+        self.upsert_errors = {}
+        self.rpcs = {
+            "apply_kpi_contributions": self._apply_kpi_contributions,
+            "kpi_cube_totals": self._kpi_cube_totals,
+        }
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self.rpcs[name], params)
+
+    def next_upsert_error(self, table):
+        errors = self.upsert_errors.get(table)
+        return errors.pop(0) if errors else None
+
+    # sql/kpi_state.sql
+    def _apply_kpi_contributions(self, params):
+        contributions = {row["record_key"]: row for row in self.tables.setdefault("kpi_contributions", [])}
+        cube = {
+            (row["measure"], row["region"], row["label"], row["bucket"]): row
+            for row in self.tables.setdefault("kpi_cube", [])
+        }
+        changes = params.get("changes") or []
+        removed = params.get("removed") or []
+        deltas = {}
+
+        def _add(contribution, sign):
+            for measure, region, label, bucket, value in contribution:
+                key = (measure, region, label, bucket)
+                deltas[key] = deltas.get(key, Decimal(0)) + sign * Decimal(repr(value))
+
+        for change in changes:
+            _add(change["contribution"], 1)
+        for record_key in {c["record_key"] for c in changes} | set(removed):
+            if record_key in contributions:
+                _add(contributions[record_key]["contribution"], -1)
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            row = cube.setdefault(key, {
+                "measure": key[0],
+                "region": key[1],
+                "label": key[2],
+                "bucket": key[3],
+                "day": None if key[3] == "undated" else key[3],
+                "value": Decimal(0),
+            })
+            row["value"] += delta
+        self.tables["kpi_cube"] = [row for row in cube.values() if row["value"]]
+        for record_key in removed:
+            contributions.pop(record_key, None)
+        for change in changes:
+            contributions[change["record_key"]] = {
+                "record_key": change["record_key"],
+                "digest": change["digest"],
+                "contribution": change["contribution"],
+                "links": list(change.get("links") or []),
+            }
+        self.tables["kpi_contributions"] = list(contributions.values())
+        return len(deltas)
+
+    def _kpi_cube_totals(self, params):
+        totals = {}
+        for row in self.tables.get("kpi_cube", []):
+            if row["region"] not in (params["p_region"], ""):
+                continue
+            day = row["day"]
+            if params.get("p_start") and (day is None or day < params["p_start"]):
+                continue
+            if params.get("p_end") and (day is None or day > params["p_end"]):
+                continue
+            key = (row["measure"], row["region"], row["label"])
+            totals[key] = totals.get(key, Decimal(0)) + row["value"]
+        return [
+            {"measure": m, "region": r, "label": l, "value": float(v)}
+            for (m, r, l), v in totals.items()
+            if v
+        ]
+
+
+class FakeHttpResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = str(payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeBeacon:
+    # Serves pages of records per entity endpoint; endpoints with no pages
+    # answer 404, like an attendee endpoint the account doesn't have.
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        endpoint = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+        page = int((params or {}).get("page", 1))
+        self.requests.append((endpoint, page))
+        if endpoint not in self.pages:
+            return FakeHttpResponse(404, {"error": "not found"})
+        pages = self.pages[endpoint]
+        results = pages[page - 1] if page <= len(pages) else []
+        return FakeHttpResponse(200, {"results": results, "meta": {"current_page": page, "total_pages": len(pages)}})
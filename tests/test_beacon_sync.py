@@ -0,0 +1,159 @@
+import beacon_sync
+from beacon_sync import run_beacon_sync
+
+
+BASE_URL = "https://beacon.example/v1/account/1"
+
+
+def beacon_pages(**pages):
+    # Every main endpoint answers; the attendee endpoints 404 unless given.
+    return {endpoint: [] for endpoint in ("person", "organization", "event", "payment", "subscription", "grant")} | pages
+
+
+def test_funder_rollups_keep_payments_this_fetch_did_not_return(client, beacon):
+    # A payment imported from CSV earlier, which the API fetch doesn't return.
+    client.tables["beacon_payments"] = [
+        {
+            "id": "csv-1",
+            "payload": {"id": "csv-1", "amount": 40, "payment_date": "2024-01-10"},
+            "payment_date": "2024-01-10",
+            "funder_key": "northernwalkingfoundation",
+            "funder_name": "Northern Walking Foundation",
+        }
+    ]
+    beacon.pages = beacon_pages(payment=[[{"entity": {"id": "api-1", "amount": 60, "payment_date": "2024-01-11"}}]])
+
+    summary = run_beacon_sync(client, "key", beacon_base_url=BASE_URL)
+
+    rollups = client.tables[beacon_sync.FUNDER_ROLLUPS_TABLE]
+    assert summary["funder_rollups"] == 2
+    assert sorted((r["bucket"], r["amount"]) for r in rollups) == [("2024-01-10", 40.0), ("2024-01-11", 60.0)]
+
+
+def test_run_beacon_sync_transforms_records_and_links_attendees(client, beacon):
+    beacon.pages = beacon_pages(
+        person=[[
+            {"entity": {"id": 1, "name": "Ann", "type": "Volunteer", "c_region": ["Wales"]}},
+            {"entity": {"id": 2, "name": "Bo", "created_at": "2024-01-02T10:00:00Z"}},
+            {"entity": {"name": "No id"}},
+        ]],
+        organization=[[{"entity": {"id": 7, "name": "Northern Walking Foundation", "type": ["Charity", "Funder"]}}]],
+        event=[[{"entity": {"id": 3, "event_type": "Walk", "date": "2024-02-01", "c_region": ["Wales"]}}]],
+        payment=[[{"entity": {"id": 5, "value": 100, "date": "2024-02-02", "organization": {"id": 7}}}]],
+        # Already returned as a payment: kept once.
+        subscription=[[{"entity": {"id": 5, "amount": 999}}]],
+        grant=[[{"entity": {"id": 9, "amount_granted": "2,000", "status": "Won", "award_date": "2024-03-01"}}]],
+        event_attendee=[[
+            {"entity": {"id": 11, "event": {"id": 3}, "person": {"id": 1}}},
+            {"entity": {"id": 12, "event_id": 3, "name": "Guest"}},
+            {"entity": {"id": 13, "person_id": 2}},
+        ]],
+    )
+    progress = []
+
+    summary = run_beacon_sync(client, "key", beacon_base_url=BASE_URL, progress_callback=lambda pct, text: progress.append(pct))
+
+    assert {k: summary[k] for k in ("people", "organisations", "events", "event_attendees", "payments", "grants")} == {
+        "people": 2,
+        "organisations": 1,
+        "events": 1,
+        "event_attendees": 2,
+        "payments": 1,
+        "grants": 1,
+    }
+    assert summary["org_names"] == 1
+    assert summary["kpi_state"] == 0
+    assert progress[-1] == 100
+
+    tables = client.tables
+    assert tables["beacon_organisations"][0]["payload"]["type"] == "Charity, Funder"
+    assert tables["beacon_people"][1]["created_at"] == "2024-01-02T10:00:00Z"
+    event = tables["beacon_events"][0]
+    assert (event["start_date"], event["region"], event["payload"]["type"]) == ("2024-02-01", "Wales", "Walk")
+    assert event["payload"]["participant_list"] == ["Ann", "Guest"]
+    assert event["payload"]["participant_ids"] == ["1"]
+    assert event["payload"]["number_of_attendees"] == 2
+    assert [(a["id"], a["event_id"], a["person_id"]) for a in tables["beacon_event_attendees"]] == [("11", "3", "1"), ("12", "3", None)]
+    payment = tables["beacon_payments"][0]
+    assert (payment["payload"]["amount"], payment["payment_date"], payment["funder_name"]) == (100, "2024-02-02", "Northern Walking Foundation")
+    grant = tables["beacon_grants"][0]
+    assert (grant["payload"]["amount"], grant["payload"]["stage"], grant["close_date"]) == ("2,000", "Won", "2024-03-01")
+
+
+def test_run_beacon_sync_passes_written_rows_to_kpi_refresh(client, beacon):
+    beacon.pages = beacon_pages(person=[[{"entity": {"id": 1, "name": "Ann"}}]])
+    refreshed = []
+
+    summary = run_beacon_sync(client, "key", beacon_base_url=BASE_URL, kpi_refresh=lambda rows: refreshed.append(rows) or 4)
+
+    assert summary["kpi_state"] == 4
+    assert [row["id"] for row in refreshed[0]["beacon_people"]] == [1]
+    assert refreshed[0]["beacon_events"] == []
+
+
+def test_upsert_in_batches_halves_the_chunk_on_statement_timeout(client, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(beacon_sync.time, "sleep", sleeps.append)
+    client.upsert_errors["t"] = [Exception("canceling statement due to statement timeout (57014)")] * 2
+    rows = [{"id": i} for i in range(100)]
+    batches = []
+
+    total = beacon_sync.upsert_in_batches(client, "t", rows, default_chunk_size=80, min_chunk_size=20, batch_progress_callback=lambda done, total: batches.append(done))
+
+    assert total == 100
+    assert sorted(row["id"] for row in client.tables["t"]) == list(range(100))
+    # 80 -> 40 -> 20 at the same offset, then back to 80 for the rest.
+    assert batches == [20, 100]
+    assert sleeps == [1, 1]
+
+
+def test_upsert_in_batches_raises_once_at_the_minimum_chunk(client, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(beacon_sync.time, "sleep", sleeps.append)
+    client.upsert_errors["t"] = [Exception("statement timeout")] * 3
+
+    try:
+        beacon_sync.upsert_in_batches(client, "t", [{"id": i} for i in range(50)], default_chunk_size=50, min_chunk_size=25)
+    except Exception as e:
+        assert "statement timeout" in str(e)
+    else:
+        raise AssertionError("expected the timeout to propagate")
+    assert sleeps == [1, 2]
+    assert client.tables["t"] == []
+
+
+def test_upsert_in_batches_drops_an_unmigrated_optional_column(client, monkeypatch):
+    column = beacon_sync.OPTIONAL_COLUMNS[0]
+    client.upsert_errors["t"] = [Exception(f"Could not find the '{column}' column of 't' in the schema cache (PGRST204)")]
+
+    beacon_sync.upsert_in_batches(client, "t", [{"id": 1, column: "x"}, {"id": 2, column: "y"}])
+
+    assert client.tables["t"] == [{"id": 1}, {"id": 2}]
+
+
+def test_upsert_in_batches_raises_other_errors_without_retrying(client):
+    client.upsert_errors["t"] = [Exception("permission denied for table t")]
+
+    try:
+        beacon_sync.upsert_in_batches(client, "t", [{"id": 1}])
+    except Exception as e:
+        assert "permission denied" in str(e)
+    else:
+        raise AssertionError("expected the error to propagate")
+    assert client.calls == [("t", "upsert")]
+
+
+def test_attendee_ids_read_direct_and_relationship_references():
+    assert beacon_sync._attendee_ids({"event_id": 3, "person_id": 1}) == ("3", "1")
+    assert beacon_sync._attendee_ids({"event": {"id": 3}, "contact": {"id": 1}}) == ("3", "1")
+    assert beacon_sync._attendee_ids({
+        "relationships": {"events": {"data": [{"id": "e9"}]}, "person": {"data": {"id": "p4"}}},
+    }) == ("e9", "p4")
+
+
+def test_attendee_ids_fall_back_to_nested_ids():
+    att = {"details": {"session": {"meta": {"id": "s12"}}, "attendee": {"ref": {"id": "p7"}}}}
+    assert beacon_sync._attendee_ids(att) == ("s12", "p7")
+    # The shortest candidate wins when several ids are nested.
+    assert beacon_sync._attendee_ids({"x": {"event": {"id": "long-id", "other": {"id": "e1"}}}})[0] == "e1"
+    assert beacon_sync._attendee_ids({"name": "Nobody"}) == (None, None)
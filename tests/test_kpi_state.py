@@ -0,0 +1,174 @@
+import copy
+import random
+
+import pytest
+
+from fakes import FakeSupabase
+from kpi_state import (
+    KPI_CUBE_TABLE,
+    KPI_REGIONS,
+    build_event_attendee_records,
+    compute_kpis,
+    kpi_summary,
+    load_changed_kpi_rows,
+    refresh_kpi_state,
+    rows_to_payloads,
+)
+
+REGION_TAGS = ["North of England", "South of England", "Midlands", "Wales", "Other", "north of england, Wales", "Scotland"]
+DAYS = ["2024-01-05", "2024-01-31T23:10:00Z", "2024-02-15T08:00:00+00:00", None]
+
+
+def beacon_tables(seed, n=40):
+    # A mixed dataset in the shape of the beacon_* tables: region tags in
+    # several forms, people linked to events both ways, attendees with and
+    # without ages, and amounts and stages the dashboard has to coerce.
+    rng = random.Random(seed)
+    event_ids = [f"E{i}" for i in range(n // 2)]
+    people = []
+    for i in range(n):
+        p = {"id": f"P{i}", "name": rng.choice([f"Person {i}", f"Person {i % 7}", None])}
+        p["type"] = rng.sample(["Volunteer", "Steering Committee", "Youth", "Carer", "Veteran", "Parent", "female"], rng.randint(0, 3))
+        if rng.random() < 0.8:
+            p["c_region"] = [rng.choice(REGION_TAGS)]
+        if rng.random() < 0.4:
+            p["age"] = rng.choice([17, 25, 33, 41, 50, 70, 80, "34 years", "n/a"])
+        elif rng.random() < 0.3:
+            p["dob"] = rng.choice(["1990-05-01", "01/02/1960", "bad"])
+        if rng.random() < 0.5:
+            p["events"] = [{"id": rng.choice(event_ids)} for _ in range(rng.randint(1, 3))]
+        people.append({"id": p["id"], "payload": p, "created_at": rng.choice(DAYS)})
+    organisations = []
+    for i in range(n // 2):
+        o = {"id": f"O{i}", "name": f"Org {i}", "type": rng.choice(["NHS Trust", "University", "Charity", "Corporate partner", "", "Media"])}
+        if rng.random() < 0.8:
+            o["c_region"] = [rng.choice(REGION_TAGS)]
+        organisations.append({"id": o["id"], "payload": o, "created_at": rng.choice(DAYS)})
+    events = []
+    for event_id in event_ids:
+        e = {"id": event_id, "type": rng.choice(["Walk", "Hike", "Meeting", "", "Wellbeing Session", "Training"]), "name": f"Event {event_id}"}
+        if rng.random() < 0.7:
+            e["c_region"] = [rng.choice(REGION_TAGS)]
+        if rng.random() < 0.3:
+            e["number_of_attendees"] = rng.choice([3, "12", "", None])
+        if rng.random() < 0.4:
+            e["participant_list"] = rng.sample([f"Person {i}" for i in range(10)], rng.randint(0, 4))
+        if rng.random() < 0.3:
+            e["participants"] = [{"id": f"P{rng.randrange(n)}"} for _ in range(rng.randint(1, 3))]
+        region = rng.choice(REGION_TAGS) if rng.random() < 0.5 else None
+        events.append({"id": event_id, "payload": e, "start_date": rng.choice(DAYS), "region": region})
+    attendees = []
+    for i in range(n):
+        event_id = rng.choice(event_ids)
+        a = {"id": f"A{i}", "event_id": event_id, "person_id": f"P{rng.randrange(n)}", "gender": rng.choice(["Male", "f", "", "Non-binary"])}
+        if rng.random() < 0.3:
+            a["age"] = rng.choice([20, 35, 44, 60, 70, 90])
+        attendees.append({"id": a["id"], "payload": a, "event_id": event_id, "person_id": a["person_id"], "created_at": None})
+    payments = []
+    for i in range(n // 2):
+        day = rng.choice(DAYS)
+        payments.append({"id": f"Y{i}", "payload": {"id": f"Y{i}", "amount": rng.choice([100, "£1,234.50", None, 7.25]), "payment_date": day}, "payment_date": day})
+    grants = []
+    for i in range(n // 3):
+        day = rng.choice(DAYS)
+        g = {"id": f"G{i}", "amount": rng.choice([500, "2,000", None]), "stage": rng.choice(["Won", "won", "Submitted", "Pending", "Lost", None]), "close_date": day}
+        grants.append({"id": g["id"], "payload": g, "close_date": day})
+    return {
+        "beacon_people": people,
+        "beacon_organisations": organisations,
+        "beacon_events": events,
+        "beacon_event_attendees": attendees,
+        "beacon_payments": payments,
+        "beacon_grants": grants,
+    }
+
+
+def raw_kpis(tables, region):
+    result = compute_kpis(
+        region,
+        rows_to_payloads(copy.deepcopy(tables["beacon_people"]), date_field="created_at"),
+        rows_to_payloads(copy.deepcopy(tables["beacon_organisations"]), date_field="created_at"),
+        rows_to_payloads(copy.deepcopy(tables["beacon_events"]), date_field="start_date", region_field="region"),
+        rows_to_payloads(copy.deepcopy(tables["beacon_payments"]), date_field="payment_date"),
+        rows_to_payloads(copy.deepcopy(tables["beacon_grants"]), date_field="close_date"),
+        event_attendee_records=build_event_attendee_records(copy.deepcopy(tables["beacon_event_attendees"])),
+        include_details=False,
+    )
+    for key in ("last_updated", "_raw_kpi", "_raw_income"):
+        result.pop(key)
+    return result
+
+
+def cube_kpis(client, region):
+    totals = client.rpc("kpi_cube_totals", {"p_region": region, "p_start": None, "p_end": None}).execute().data
+    result = kpi_summary(totals, region)
+    for key in ("last_updated", "_raw_kpi", "_income_rows"):
+        result.pop(key)
+    return result
+
+
+def rounded(value):
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {k: rounded(v) for k, v in value.items()}
+    return value
+
+
+def cube_state(client):
+    return sorted((r["measure"], r["region"], r["label"], r["bucket"], r["value"]) for r in client.tables.get(KPI_CUBE_TABLE, []))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_kpi_summary_of_contributions_matches_compute_kpis(seed):
+    tables = beacon_tables(seed)
+    client = FakeSupabase(tables)
+    assert refresh_kpi_state(client) > 0
+    for region in KPI_REGIONS:
+        assert rounded(cube_kpis(client, region)) == rounded(raw_kpis(tables, region)), region
+
+
+def test_changed_person_rebuilds_linked_events_and_attendees():
+    tables = {
+        "beacon_people": [
+            {"id": "P1", "payload": {"id": "P1", "name": "Ann", "c_region": ["Wales"], "events": [{"id": "E1"}]}, "created_at": "2024-01-01"},
+            {"id": "P2", "payload": {"id": "P2", "name": "Bo", "c_region": ["Wales"]}, "created_at": "2024-01-01"},
+        ],
+        "beacon_events": [
+            {"id": "E1", "payload": {"id": "E1", "type": "Walk", "c_region": ["Wales"]}, "start_date": "2024-02-01", "region": "Wales"},
+            {"id": "E2", "payload": {"id": "E2", "type": "Walk", "c_region": ["Wales"], "participants": [{"id": "P1"}]}, "start_date": "2024-02-02", "region": "Wales"},
+            {"id": "E3", "payload": {"id": "E3", "type": "Walk", "c_region": ["Wales"]}, "start_date": "2024-02-03", "region": "Wales"},
+            {"id": "E4", "payload": {"id": "E4", "type": "Walk", "c_region": ["Wales"], "participants": [{"id": "P2"}]}, "start_date": "2024-02-04", "region": "Wales"},
+        ],
+        "beacon_event_attendees": [
+            {"id": "A1", "payload": {"id": "A1", "event_id": "E3", "person_id": "P1"}, "event_id": "E3", "person_id": "P1", "created_at": None},
+            {"id": "A2", "payload": {"id": "A2", "event_id": "E4", "person_id": "P2"}, "event_id": "E4", "person_id": "P2", "created_at": None},
+        ],
+    }
+    client = FakeSupabase(tables)
+    refresh_kpi_state(client)
+
+    _, rebuild = load_changed_kpi_rows(client, {"beacon_people": ["P1"]})
+
+    # Linked from the person (E1), listing the person (E2), attended (A1).
+    assert rebuild == {"person:P1", "event:E1", "event:E2", "attendee:A1"}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_refresh_matches_a_full_rebuild(seed):
+    rng = random.Random(seed)
+    tables = beacon_tables(seed)
+    client = FakeSupabase(tables)
+    refresh_kpi_state(client)
+
+    # Move people between regions, change their ages and event links.
+    changed = rng.sample(client.tables["beacon_people"], 5)
+    for row in changed:
+        row["payload"]["c_region"] = [rng.choice(REGION_TAGS)]
+        row["payload"]["age"] = rng.choice([22, 48, 77])
+        row["payload"]["events"] = [{"id": f"E{rng.randrange(20)}"}]
+    assert refresh_kpi_state(client, {"beacon_people": [row["id"] for row in changed]}) > 0
+
+    rebuilt = FakeSupabase({table: client.tables[table] for table in tables})
+    refresh_kpi_state(rebuilt)
+    assert cube_state(client) == cube_state(rebuilt)
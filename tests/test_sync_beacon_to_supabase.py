@@ -0,0 +1,22 @@
+from sync_beacon_to_supabase import run_sync_once
+
+
+def test_run_sync_once_returns_the_sync_summary(client, beacon, monkeypatch):
+    monkeypatch.delenv("BEACON_EVENT_ATTENDEES_ENDPOINT", raising=False)
+    beacon.pages = {
+        "person": [[{"entity": {"id": 1, "name": "Ann", "type": "Volunteer", "c_region": ["Wales"]}}]],
+        "organization": [[{"entity": {"id": 7, "name": "Trail Trust"}}]],
+        "event": [[{"entity": {"id": 3, "type": "Walk", "start_date": "2024-02-01", "c_region": ["Wales"]}}]],
+        "payment": [[{"entity": {"id": 5, "amount": 100, "payment_date": "2024-02-02", "organization": {"id": 7}}}]],
+        "subscription": [],
+        "grant": [[{"entity": {"id": 9, "amount": "2,000", "stage": "Won", "close_date": "2024-03-01"}}]],
+    }
+
+    summary = run_sync_once(client, "key", None, "https://beacon.example/v1/account/1")
+
+    assert isinstance(summary, dict)
+    assert summary["people"] == 1
+    assert summary["payments"] == 1
+    assert summary["grants"] == 1
+    assert summary["kpi_state"] > 0
+    assert [row["id"] for row in client.tables["beacon_people"]] == [1]
@@ -0,0 +1,35 @@
+import time
+
+import sync_job_store
+from sync_job_store import QUEUED_JOB_SECONDS, STALE_JOB_SECONDS, SyncJobStore, _to_iso
+
+
+def job(job_id, status, created_ago, updated_ago):
+    now = time.time()
+    return {"job_id": job_id, "status": status, "created_at": _to_iso(now - created_ago), "updated_at": _to_iso(now - updated_ago)}
+
+
+def test_expire_stale_fails_silent_running_jobs_and_long_unclaimed_queued_jobs(client):
+    client.tables[sync_job_store.SYNC_JOBS_TABLE] = [
+        job("running-live", "running", 3600, 30),
+        job("running-dead", "running", 3600, STALE_JOB_SECONDS + 60),
+        # Waiting behind a long sync: past the heartbeat window, not the queue one.
+        job("queued-waiting", "queued", STALE_JOB_SECONDS + 60, STALE_JOB_SECONDS + 60),
+        job("queued-abandoned", "queued", QUEUED_JOB_SECONDS + 60, QUEUED_JOB_SECONDS + 60),
+        job("done", "completed", QUEUED_JOB_SECONDS + 60, QUEUED_JOB_SECONDS + 60),
+    ]
+    store = SyncJobStore()
+    store.bind(lambda: client)
+
+    store._expire_stale()
+
+    rows = {row["job_id"]: row for row in client.tables[sync_job_store.SYNC_JOBS_TABLE]}
+    assert {job_id: row["status"] for job_id, row in rows.items()} == {
+        "running-live": "running",
+        "running-dead": "failed",
+        "queued-waiting": "queued",
+        "queued-abandoned": "failed",
+        "done": "completed",
+    }
+    assert rows["running-dead"]["message"] == "Sync job stopped responding."
+    assert rows["queued-abandoned"]["message"] == "No worker picked this job up."